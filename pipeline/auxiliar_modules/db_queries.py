@@ -1,6 +1,7 @@
 import psycopg2 as db;
 from dotenv import load_dotenv
 import os
+from auxiliar_modules.trip_cache import is_trip_cache_available, is_trip_cached, read_cached_measurements, cache_measurements, write_cached_measurements;
 
 
 #<-------------- CONNECTION METHODS ------------->
@@ -71,18 +72,107 @@ def connect_to_main_db():
 
 
 
-def get_raw_measurements_from_main_db(trip):
-    cur, conn = connect_to_main_db();
-    sql = """
-        SELECT * FROM "Measurements" WHERE "FK_Trip"='{}' AND "T" IN ('obd.trac_cons', 'acc.xyz', 'obd.spd_veh', 'obd.rpm')
+# Types ("T") of the raw measurements retrieved from the LiRA database
+RAW_MEASUREMENT_TYPES = ['obd.trac_cons', 'acc.xyz', 'obd.spd_veh', 'obd.rpm'];
+
+
+def get_types_string(types) -> str:
+    """
+    Returns the types of measurements formatted as a list for an IN clause.
+
+    :param types: Types ("T") of the measurements
+    :type types: List[str]
+    """
+    return '(' + ', '.join("'{}'".format(type) for type in types) + ')';
+
+
+def get_raw_measurements_query(trip, types = RAW_MEASUREMENT_TYPES) -> str:
+    """
+    Returns the query that retrieves the raw measurements of a trip from the LiRA database.
+
+    :param trip: Id of the trip
+    :type trip: str
+    :param types: Types ("T") of the measurements to retrieve
+    :type types: List[str]
+    """
+    return """
+        SELECT * FROM "Measurements" WHERE "FK_Trip"='{}' AND "T" IN {}
         ORDER BY "Created_Date" ASC
-        """.format(trip);
-    cur.execute(sql);
+        """.format(trip, get_types_string(types));
+
+
+def get_raw_measurements_from_main_db(trip, batch_size = None, types = RAW_MEASUREMENT_TYPES, use_cache = True, refresh_cache = False):
+    """
+    Returns the raw measurements of a trip from the LiRA database. If a batch size is passed as parameter,
+    the measurements are streamed through a server-side cursor and a generator of batches is returned instead
+    of a list, so the memory used depends on the size of the batch and not on the length of the trip.
+
+    Trips are stored in a local cache the first time they are retrieved, and later calls read them from the
+    cache instead of the LiRA database.
+
+    :param trip: Id of the trip
+    :type trip: str
+    :param batch_size: Number of rows to fetch from the server at a time.
+    :type batch_size: int
+    :param types: Types ("T") of the measurements to retrieve
+    :type types: List[str]
+    :param use_cache: If False, the local cache is neither read nor written.
+    :type use_cache: bool
+    :param refresh_cache: If True, the trip is retrieved from the LiRA database and the local cache is overwritten.
+    :type refresh_cache: bool
+    """
+    use_cache = use_cache and is_trip_cache_available();
+
+    if use_cache and not refresh_cache and is_trip_cached(trip, types):
+        batches = read_cached_measurements(trip, types, batch_size or 10000);
+        if batch_size != None:
+            return batches;
+        return [row for batch in batches for row in batch];
+
+    if batch_size != None:
+        batches = stream_raw_measurements_from_main_db(trip, batch_size, types);
+        if use_cache:
+            return cache_measurements(trip, types, batches);
+        return batches;
+
+    cur, conn = connect_to_main_db();
+    cur.execute(get_raw_measurements_query(trip, types));
     rows = cur.fetchall();
     conn.close();
+    if use_cache:
+        write_cached_measurements(trip, types, rows);
     return rows;
 
 
+def stream_raw_measurements_from_main_db(trip, batch_size = 10000, types = RAW_MEASUREMENT_TYPES):
+    """
+    Yields the raw measurements of a trip from the LiRA database in batches. It uses a named (server-side) cursor
+    so that only one batch of rows is held in memory at the same time.
+
+    :param trip: Id of the trip
+    :type trip: str
+    :param batch_size: Number of rows to fetch from the server at a time.
+    :type batch_size: int
+    :param types: Types ("T") of the measurements to retrieve
+    :type types: List[str]
+    """
+    cur, conn = connect_to_main_db();
+    cur.close();
+
+    stream = conn.cursor(name='raw_measurements_' + trip.replace('-', '_'));
+    stream.itersize = batch_size;
+    try:
+        stream.execute(get_raw_measurements_query(trip, types));
+        while True:
+            rows = stream.fetchmany(batch_size);
+            if len(rows) == 0:
+                break;
+            yield rows;
+    finally:
+        stream.close();
+        conn.close();
+
+
 def get_segments_from_ways(ways):
 
     if len(ways) == 0:
@@ -0,0 +1,557 @@
+import contextlib;
+import glob;
+import json;
+import os;
+import sqlite3;
+import threading;
+import numpy as np
+import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from typing import List, Tuple
+
+from auxiliar_modules.http_client import HTTPClient, SERVICES;
+
+try:
+    import rasterio;
+    import rasterio.enums;
+    import rasterio.vrt;
+except ImportError:
+    rasterio = None;
+
+
+def request_elevation(point: List[float]) -> float:
+    """
+    Returns the elevation in meters of a geographical point using the elevation service of Datafordeler.
+
+    :param point: Latitude and longitude of the point
+    :type point: List[float]
+    """
+    url = 'https://services.datafordeler.dk/DHMTerraen/DHMKoter/1.0.0/GEOREST/HentKoter?format=json&username={id}&password={pwd}&geop=POINT({lat} {lon})&georef=EPSG:4326'.format(
+        id=os.getenv('KOTER_USER'),
+        pwd = os.getenv('KOTER_PWD'),
+        lat = point[0],
+        lon= point[1]);
+    response = HTTPClient().get('elevation', url);
+    response.raise_for_status();
+    resJSON = response.json();
+    return resJSON['HentKoterRespons']['data'][0]['kote']
+
+def request_elevations(points: List[List[float]]) -> List[float]:
+    """
+    Returns the elevations in meters of many geographical points with a single MULTIPOINT request to the elevation
+    service of Datafordeler.
+
+    :param points: Latitude and longitude of the points
+    :type points: List[List[float]]
+    """
+    url = 'https://services.datafordeler.dk/DHMTerraen/DHMKoter/1.0.0/GEOREST/HentKoter?format=json&username={id}&password={pwd}&geop=MULTIPOINT({points})&georef=EPSG:4326'.format(
+        id=os.getenv('KOTER_USER'),
+        pwd = os.getenv('KOTER_PWD'),
+        points = ','.join('({} {})'.format(point[0], point[1]) for point in points));
+    response = HTTPClient().get('elevation', url);
+    response.raise_for_status();
+    resJSON = response.json();
+    return [data['kote'] for data in resJSON['HentKoterRespons']['data']];
+
+
+#<-------------- ELEVATION PROVIDERS ------------->
+
+
+class ElevationProvider:
+    """This is a conceptual class representation of a source of elevations. Subclasses implement the lookup of the
+    elevations of many geographical points at once.
+    """
+
+    def get_elevations(self, points: List[List[float]]) -> np.ndarray:
+        """
+        Returns the elevations in meters of geographical points, with NaN for the points whose elevation is unknown.
+        This method needs to be overridden by any subclass.
+
+        :param points: Latitude and longitude of the points
+        :type points: List[List[float]]
+        """
+        pass;
+
+
+class DatafordelerElevationProvider(ElevationProvider):
+    """Elevation provider that requests the elevations to the elevation service of Datafordeler. Points are requested
+    in batches by a pool of workers as large as the maximum concurrency of the service. Batches of one point are sent
+    as POINT requests and larger batches as MULTIPOINT requests. If a MULTIPOINT request fails, the points of its batch
+    are requested one by one, so a failed batch does not lose the elevations of all its points.
+
+    :param batch_size: Number of points of each request. It can be set with the ELEVATION_REQUEST_BATCH_SIZE environment
+        variable. By default it is BATCH_SIZE.
+    :type batch_size: int
+    """
+
+    # Default number of points of each request. The points of a MULTIPOINT request go in its URL, which stays below
+    # 3 KB with 100 points
+    BATCH_SIZE = 100;
+
+    def __init__(self, batch_size: int = None):
+        if batch_size == None:
+            batch_size = int(os.getenv('ELEVATION_REQUEST_BATCH_SIZE', str(self.BATCH_SIZE)));
+        self.batch_size: int = max(1, batch_size);
+
+    def request_batch(self, points: List[List[float]]) -> List[float]:
+        """
+        Returns the elevations of a batch of points. If the request of a batch of many points fails, they are requested
+        one by one, and the points whose request fails get NaN.
+
+        :param points: Latitude and longitude of the points
+        :type points: List[List[float]]
+        """
+        try:
+            if len(points) == 1:
+                return [request_elevation(points[0])];
+            elevations = request_elevations(points);
+            if len(elevations) != len(points):
+                raise ValueError('Expected {} elevations, got {}'.format(len(points), len(elevations)));
+            return elevations;
+        except (requests.exceptions.RequestException, ValueError, KeyError, IndexError) as e:
+            print("Elevation request of {} points failed: {}".format(len(points), e));
+            if len(points) > 1:
+                return [self.request_batch([point])[0] for point in points];
+            return [np.nan];
+
+    def get_elevations(self, points: List[List[float]]) -> np.ndarray:
+        """
+        Returns the elevations in meters of geographical points, with NaN for the points whose request failed.
+
+        :param points: Latitude and longitude of the points
+        :type points: List[List[float]]
+        """
+        batches = [points[x:x + self.batch_size] for x in range(0, len(points), self.batch_size)];
+        with ThreadPoolExecutor(max_workers=SERVICES['elevation']['max_concurrency']) as executor:
+            results = list(executor.map(self.request_batch, batches));
+        return np.array([elevation for result in results for elevation in result], dtype=np.float64);
+
+
+class DEMTile:
+    """This is a conceptual class representation of a tile of a Digital Elevation Model. The geographical position of
+    the cell in row r and column c is given by the affine transform (lon_0, lon_step, lat_0, lat_step): its center is at
+    longitude lon_0 + (c + 0.5) * lon_step and latitude lat_0 + (r + 0.5) * lat_step. Tiles must be in EPSG:4326, so
+    GeoTIFF tiles in other coordinate reference systems are reprojected when they are converted.
+
+    :param elevations: Elevations in meters of the cells of the tile.
+    :type elevations: np.ndarray
+    :param transform: Affine transform (lon_0, lon_step, lat_0, lat_step) of the tile.
+    :type transform: Tuple[float, float, float, float]
+    :param nodata: Value of the cells without elevation, if any. Cells with NaN have no elevation either.
+    :type nodata: float
+    """
+    def __init__(self, elevations: np.ndarray, transform: Tuple[float, float, float, float], nodata: float = None):
+        self.elevations: np.ndarray = elevations;
+        self.transform: Tuple[float, float, float, float] = transform;
+        self.nodata: float = nodata;
+
+    def sample(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """
+        Returns the elevations at geographical points interpolated bilinearly between the centers of the four
+        closest cells, with NaN for the points outside the tile and for the points where any of the four cells
+        has no elevation.
+
+        :param lat: Latitudes of the points
+        :type lat: np.ndarray
+        :param lon: Longitudes of the points
+        :type lon: np.ndarray
+        """
+        lon_0, lon_step, lat_0, lat_step = self.transform;
+        rows, columns = self.elevations.shape;
+        row = (lat - lat_0) / lat_step - 0.5;
+        column = (lon - lon_0) / lon_step - 0.5;
+
+        res = np.full(len(lat), np.nan);
+        inside = (row >= -0.5) & (row <= rows - 0.5) & (column >= -0.5) & (column <= columns - 0.5);
+        if not np.any(inside):
+            return res;
+
+        row = np.clip(row[inside], 0, rows - 1);
+        column = np.clip(column[inside], 0, columns - 1);
+        row_0 = np.minimum(np.floor(row).astype(np.int64), max(rows - 2, 0));
+        column_0 = np.minimum(np.floor(column).astype(np.int64), max(columns - 2, 0));
+        row_1 = np.minimum(row_0 + 1, rows - 1);
+        column_1 = np.minimum(column_0 + 1, columns - 1);
+        row_fraction = row - row_0;
+        column_fraction = column - column_0;
+
+        corners = [self.get_cells(row_0, column_0), self.get_cells(row_0, column_1), self.get_cells(row_1, column_0), self.get_cells(row_1, column_1)];
+        top = corners[0] * (1 - column_fraction) + corners[1] * column_fraction;
+        bottom = corners[2] * (1 - column_fraction) + corners[3] * column_fraction;
+        res[inside] = top * (1 - row_fraction) + bottom * row_fraction;
+        return res;
+
+    def get_cells(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        """
+        Returns the elevations of cells of the tile, with NaN for the cells without elevation.
+
+        :param rows: Rows of the cells
+        :type rows: np.ndarray
+        :param columns: Columns of the cells
+        :type columns: np.ndarray
+        """
+        res = np.asarray(self.elevations[rows, columns], dtype=np.float64);
+        if self.nodata != None and not np.isnan(self.nodata):
+            res = np.where(res == self.nodata, np.nan, res);
+        return res;
+
+
+class DEMElevationProvider(ElevationProvider):
+    """Elevation provider that samples a local Digital Elevation Model split in tiles. Elevations of all the points
+    are interpolated in a single vectorized call per tile, without using the network.
+
+    :param tiles: Tiles of the Digital Elevation Model.
+    :type tiles: List[DEMTile]
+    """
+    def __init__(self, tiles: List[DEMTile]):
+        self.tiles: List[DEMTile] = tiles;
+
+    @classmethod
+    def from_directory(cls, path: str, cache_path: str = None):
+        """
+        Returns a provider over the tiles of a directory. All the tiles are memory mapped, so only the cells that are
+        sampled are read from disk. Tiles can be:
+
+        - .npy arrays, with a .json file with the same name that contains either their affine transform
+          (lon_0, lon_step, lat_0, lat_step) or an object with that "transform" and their "nodata" value.
+        - GeoTIFF files (.tif), which need the rasterio package. They are converted block by block the first time
+          into .npy arrays in the cache directory, and the GDAL_NODATA value of their first band is kept. Tiles in
+          other coordinate reference systems than EPSG:4326, such as the EPSG:25832 of the Danish elevation model,
+          are reprojected to EPSG:4326.
+
+        :param path: Path of the directory
+        :type path: str
+        :param cache_path: Directory of the converted GeoTIFF tiles. It can also be set with the ELEVATION_DEM_CACHE_DIRECTORY
+            environment variable. By default it is cache/dem.
+        :type cache_path: str
+        """
+        tiles = [];
+        for tile_path in sorted(glob.glob(os.path.join(path, '*.npy'))):
+            tiles.append(load_npy_tile(tile_path));
+
+        tif_paths = sorted(glob.glob(os.path.join(path, '*.tif')));
+        if len(tif_paths) > 0:
+            if cache_path == None:
+                cache_path = os.getenv('ELEVATION_DEM_CACHE_DIRECTORY', os.path.join('cache', 'dem'));
+            os.makedirs(cache_path, exist_ok=True);
+            for tile_path in tif_paths:
+                npy_path = os.path.join(cache_path, os.path.splitext(os.path.basename(tile_path))[0] + '.npy');
+                if not os.path.exists(npy_path) or os.path.getmtime(npy_path) < os.path.getmtime(tile_path):
+                    convert_geotiff_tile(tile_path, npy_path);
+                tiles.append(load_npy_tile(npy_path));
+        return cls(tiles);
+
+    def get_elevations(self, points: List[List[float]]) -> np.ndarray:
+        """
+        Returns the elevations in meters of geographical points, with NaN for the points outside all the tiles.
+
+        :param points: Latitude and longitude of the points
+        :type points: List[List[float]]
+        """
+        lat = np.array([float(point[0]) for point in points], dtype=np.float64);
+        lon = np.array([float(point[1]) for point in points], dtype=np.float64);
+        res = np.full(len(points), np.nan);
+        for tile in self.tiles:
+            missing = np.isnan(res);
+            if not np.any(missing):
+                break;
+            res[missing] = tile.sample(lat[missing], lon[missing]);
+        return res;
+
+
+def load_npy_tile(path: str) -> DEMTile:
+    """
+    Returns a memory mapped .npy tile, with the transform and nodata value of the .json file with the same name.
+
+    :param path: Path of the .npy tile
+    :type path: str
+    """
+    with open(os.path.splitext(path)[0] + '.json', 'r') as file:
+        metadata = json.load(file);
+    if isinstance(metadata, dict):
+        return DEMTile(np.load(path, mmap_mode='r'), tuple(metadata['transform']), metadata.get('nodata'));
+    return DEMTile(np.load(path, mmap_mode='r'), tuple(metadata));
+
+
+def convert_geotiff_tile(path: str, npy_path: str):
+    """
+    Converts the first band of a GeoTIFF tile into a .npy array that can be memory mapped, with its transform and
+    nodata value in a .json file with the same name. The tile is copied block by block, so it is never fully in memory.
+    Tiles in other coordinate reference systems than EPSG:4326 are reprojected to it while they are copied.
+
+    :param path: Path of the GeoTIFF tile
+    :type path: str
+    :param npy_path: Path of the .npy array
+    :type npy_path: str
+    """
+    if rasterio == None:
+        raise ImportError('The rasterio package is needed to load GeoTIFF tiles');
+
+    # The array is written under a temporary name, so an interrupted conversion is not taken as a converted tile
+    temporary_path = npy_path + '.tmp';
+    with rasterio.open(path) as source, open_in_wgs84(source, path) as dataset:
+        affine = dataset.transform;
+        elevations = np.lib.format.open_memmap(temporary_path, mode='w+', dtype=np.dtype(dataset.dtypes[0]), shape=(dataset.height, dataset.width));
+        for _, window in dataset.block_windows(1):
+            elevations[window.row_off:window.row_off + window.height, window.col_off:window.col_off + window.width] = dataset.read(1, window=window);
+        elevations.flush();
+        del elevations;
+        metadata = {'transform': [affine.c, affine.a, affine.f, affine.e], 'nodata': dataset.nodata};
+
+    with open(os.path.splitext(npy_path)[0] + '.json', 'w') as file:
+        json.dump(metadata, file);
+    os.replace(temporary_path, npy_path);
+
+
+def open_in_wgs84(dataset, path: str):
+    """
+    Returns a GeoTIFF dataset in EPSG:4326: the dataset itself if it is already in EPSG:4326, or a virtual dataset
+    that reprojects it on the fly with bilinear resampling otherwise. The cells of the reprojected dataset that are
+    outside the original one get its nodata value, or NaN if it has none. Raises a ValueError if the dataset has
+    no coordinate reference system.
+
+    :param dataset: GeoTIFF dataset opened with rasterio
+    :type dataset: rasterio.io.DatasetReader
+    :param path: Path of the GeoTIFF tile, for the error message
+    :type path: str
+    """
+    if dataset.crs == None:
+        raise ValueError('The GeoTIFF tile {} has no coordinate reference system, so its cells cannot be located'.format(path));
+    if dataset.crs.to_epsg() == 4326:
+        return contextlib.nullcontext(dataset);
+
+    if dataset.nodata != None:
+        return rasterio.vrt.WarpedVRT(dataset, crs='EPSG:4326', resampling=rasterio.enums.Resampling.bilinear);
+    return rasterio.vrt.WarpedVRT(dataset, crs='EPSG:4326', resampling=rasterio.enums.Resampling.bilinear, nodata=np.nan, dtype='float32');
+
+
+_elevation_provider: ElevationProvider = None;
+
+def set_elevation_provider(provider: ElevationProvider):
+    """
+    Sets the provider used to look up the elevations that are not cached.
+
+    :param provider: Elevation provider to use
+    :type provider: ElevationProvider
+    """
+    global _elevation_provider;
+    _elevation_provider = provider;
+
+def get_elevation_provider() -> ElevationProvider:
+    """
+    Returns the provider used to look up the elevations that are not cached. By default it is the elevation service
+    of Datafordeler, unless the ELEVATION_DEM_DIRECTORY environment variable points to a directory of DEM tiles,
+    in which case they are sampled locally.
+    """
+    global _elevation_provider;
+    if _elevation_provider == None:
+        load_dotenv();
+        dem_directory = os.getenv('ELEVATION_DEM_DIRECTORY');
+        if dem_directory:
+            _elevation_provider = DEMElevationProvider.from_directory(dem_directory);
+        else:
+            _elevation_provider = DatafordelerElevationProvider();
+    return _elevation_provider;
+
+
+class ElevationCache(object):
+    """This is a conceptual class representation of the cache of elevations. Elevations are keyed by the coordinates of the
+    point rounded to 6 decimals (about 0.1 meters), so the nodes shared by consecutive segments and the nodes seen in previous
+    trips are only requested once. Recently used elevations are kept in memory in front of a persistent SQLite store.
+    It is programmed as a Singleton so one instance exists at the same time and so it can be accessed from any point
+    in the pipeline.
+    """
+
+    # Number of decimals of the coordinates of the keys, and maximum number of elevations kept in memory
+    DECIMALS = 6;
+    MEMORY_SIZE = 100000;
+
+    # Maximum number of keys looked up in the persistent store with a single query, below the limit of 999 parameters
+    # of old SQLite versions
+    LOOKUP_BATCH_SIZE = 400;
+
+    #### SINGLETON ####
+
+    _instance = None
+    # Creates the instance only once when many threads ask for it at the same time
+    _instance_lock = threading.Lock()
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._instance_lock:
+                if not cls._instance:
+                    instance = super(ElevationCache, cls).__new__(cls, *args, **kwargs)
+                    instance.memory = OrderedDict();
+                    instance.connection = None;
+                    instance.lock = threading.Lock();
+                    cls._instance = instance;
+        return cls._instance
+
+
+    #### DATABASE ####
+
+    def get_path(self) -> str:
+        """
+        Returns the path of the SQLite database. It can be set with the ELEVATION_CACHE_PATH environment variable.
+        """
+        return os.getenv('ELEVATION_CACHE_PATH', os.path.join('cache', 'elevation.sqlite'));
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Returns the connection to the SQLite database, creating the database and its table the first time.
+        """
+        if self.connection == None:
+            path = self.get_path();
+            if os.path.dirname(path) != '':
+                os.makedirs(os.path.dirname(path), exist_ok=True);
+            self.connection = sqlite3.connect(path, check_same_thread=False);
+            self.connection.execute('CREATE TABLE IF NOT EXISTS "elevations" ("lat" REAL, "lon" REAL, "elevation" REAL, PRIMARY KEY ("lat", "lon"))');
+            self.connection.commit();
+        return self.connection;
+
+
+    #### ELEVATIONS ####
+
+    def get_key(self, point: List[float]) -> Tuple[float, float]:
+        """
+        Returns the key of a geographical point in the cache.
+
+        :param point: Latitude and longitude of the point
+        :type point: List[float]
+        """
+        return (round(float(point[0]), self.DECIMALS), round(float(point[1]), self.DECIMALS));
+
+    def get_cached_elevation(self, point: List[float]) -> float:
+        """
+        Returns the cached elevation of a geographical point, or None if it is not cached.
+
+        :param point: Latitude and longitude of the point
+        :type point: List[float]
+        """
+        return self.get_cached_elevations([point])[0];
+
+    def get_cached_elevations(self, points: List[List[float]]) -> List[float]:
+        """
+        Returns the cached elevations of geographical points, with None for the points that are not cached. The points
+        that are not in memory are looked up in the persistent store in chunks of LOOKUP_BATCH_SIZE keys per query.
+
+        :param points: Latitude and longitude of the points
+        :type points: List[List[float]]
+        """
+        keys = [self.get_key(point) for point in points];
+        res = [None] * len(points);
+        with self.lock:
+            missing = {};
+            for i in range(len(keys)):
+                if keys[i] in self.memory:
+                    self.memory.move_to_end(keys[i]);
+                    res[i] = self.memory[keys[i]];
+                else:
+                    missing.setdefault(keys[i], []).append(i);
+            if len(missing) == 0:
+                return res;
+
+            connection = self.connect();
+            missing_keys = list(missing.keys());
+            for start in range(0, len(missing_keys), self.LOOKUP_BATCH_SIZE):
+                chunk = missing_keys[start:start + self.LOOKUP_BATCH_SIZE];
+                query = 'SELECT "lat", "lon", "elevation" FROM "elevations" WHERE ("lat", "lon") IN (VALUES {})'.format(', '.join(['(?, ?)'] * len(chunk)));
+                for lat, lon, elevation in connection.execute(query, [value for key in chunk for value in key]):
+                    key = (lat, lon);
+                    if key not in missing:
+                        continue;
+                    self.remember(key, elevation);
+                    for i in missing[key]:
+                        res[i] = elevation;
+        return res;
+
+    def set_elevation(self, point: List[float], elevation: float):
+        """
+        Stores the elevation of a geographical point in memory and in the persistent store.
+
+        :param point: Latitude and longitude of the point
+        :type point: List[float]
+        :param elevation: Elevation of the point in meters
+        :type elevation: float
+        """
+        key = self.get_key(point);
+        with self.lock:
+            self.remember(key, elevation);
+            connection = self.connect();
+            connection.execute('INSERT OR REPLACE INTO "elevations" VALUES (?, ?, ?)', (key[0], key[1], elevation));
+            connection.commit();
+
+    def set_elevations(self, points: List[List[float]], elevations: List[float]):
+        """
+        Stores the elevations of many geographical points in memory and in the persistent store in a single transaction.
+
+        :param points: Latitude and longitude of the points
+        :type points: List[List[float]]
+        :param elevations: Elevations of the points in meters
+        :type elevations: List[float]
+        """
+        rows = [];
+        with self.lock:
+            for point, elevation in zip(points, elevations):
+                key = self.get_key(point);
+                self.remember(key, elevation);
+                rows.append((key[0], key[1], elevation));
+            connection = self.connect();
+            connection.executemany('INSERT OR REPLACE INTO "elevations" VALUES (?, ?, ?)', rows);
+            connection.commit();
+
+    def remember(self, key: Tuple[float, float], elevation: float):
+        """
+        Keeps an elevation in memory, forgetting the least recently used one if the memory is full.
+
+        :param key: Key of the point
+        :type key: Tuple[float, float]
+        :param elevation: Elevation of the point in meters
+        :type elevation: float
+        """
+        self.memory[key] = elevation;
+        self.memory.move_to_end(key);
+        if len(self.memory) > self.MEMORY_SIZE:
+            self.memory.popitem(last=False);
+
+    def get_elevations(self, points: List[List[float]]) -> List[float]:
+        """
+        Returns the elevations of geographical points, with None for the points whose elevation is unknown. The points
+        that are not cached are looked up all at once with the elevation provider.
+
+        :param points: Latitude and longitude of the points
+        :type points: List[List[float]]
+        """
+        res = self.get_cached_elevations(points);
+
+        missing = {};
+        for i in range(len(points)):
+            if res[i] == None:
+                missing.setdefault(self.get_key(points[i]), []).append(i);
+        if len(missing) == 0:
+            return res;
+
+        keys = list(missing.keys());
+        elevations = get_elevation_provider().get_elevations(keys);
+        found_keys = [];
+        found_elevations = [];
+        for key, elevation in zip(keys, elevations):
+            if np.isnan(elevation):
+                continue;
+            found_keys.append(key);
+            found_elevations.append(float(elevation));
+            for i in missing[key]:
+                res[i] = float(elevation);
+        self.set_elevations(found_keys, found_elevations);
+        return res;
+
+    def get_elevation(self, point: List[float]) -> float:
+        """
+        Returns the elevation of a geographical point, or None if it is unknown. It is only looked up with the elevation
+        provider if it is not cached.
+
+        :param point: Latitude and longitude of the point
+        :type point: List[float]
+        """
+        return self.get_elevations([point])[0];
@@ -0,0 +1,92 @@
+import math;
+import numpy as np
+from typing import Tuple
+
+
+# Mean radius of the Earth in meters (IUGG)
+EARTH_RADIUS = 6371008.8;
+
+
+def haversine_distances(lat_a, lon_a, lat_b, lon_b) -> np.ndarray:
+    """
+    Returns the great-circle distances in meters between pairs of geographical points, computed over whole arrays at
+    once with the haversine formula on a sphere of radius EARTH_RADIUS. Compared with the geodesic distances on the
+    WGS-84 ellipsoid computed by geopy, the relative error is below 0.6% anywhere on Earth, and below 0.35% in Denmark
+    south of 57.5 degrees of latitude. It reaches 0.351% for distances along the parallel of Skagen.
+
+    :param lat_a: Latitudes of the first points
+    :type lat_a: np.ndarray
+    :param lon_a: Longitudes of the first points
+    :type lon_a: np.ndarray
+    :param lat_b: Latitudes of the second points
+    :type lat_b: np.ndarray
+    :param lon_b: Longitudes of the second points
+    :type lon_b: np.ndarray
+    """
+    lat_a = np.radians(np.asarray(lat_a, dtype=np.float64));
+    lon_a = np.radians(np.asarray(lon_a, dtype=np.float64));
+    lat_b = np.radians(np.asarray(lat_b, dtype=np.float64));
+    lon_b = np.radians(np.asarray(lon_b, dtype=np.float64));
+
+    h = np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2;
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(h, 0, 1)));
+
+
+def haversine_distance(point_a, point_b) -> float:
+    """
+    Returns the great-circle distance in meters between two geographical points.
+
+    :param point_a: Latitude and longitude of the first point
+    :type point_a: List[float]
+    :param point_b: Latitude and longitude of the second point
+    :type point_b: List[float]
+    """
+    return float(haversine_distances(float(point_a[0]), float(point_a[1]), float(point_b[0]), float(point_b[1])));
+
+
+def get_consecutive_distances(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """
+    Returns the distances in meters between consecutive geographical points, using a local equirectangular approximation.
+
+    :param lat: Latitudes of the points
+    :type lat: np.ndarray
+    :param lon: Longitudes of the points
+    :type lon: np.ndarray
+    """
+    lat_radians = np.radians(lat);
+    lon_radians = np.radians(lon);
+    x = np.diff(lon_radians) * np.cos((lat_radians[1:] + lat_radians[:-1]) / 2);
+    y = np.diff(lat_radians);
+    return EARTH_RADIUS * np.sqrt(x * x + y * y);
+
+
+def get_distance_along_polyline(lat: np.ndarray, lon: np.ndarray, point) -> Tuple[float, float]:
+    """
+    Returns the distance in meters from the first vertex of a polyline, measured along the polyline, to the projection
+    of a geographical point on it, and the distance in meters from the point to the polyline. Distances are computed
+    in local equirectangular coordinates, so they are consistent with get_consecutive_distances.
+
+    :param lat: Latitudes of the vertices of the polyline
+    :type lat: np.ndarray
+    :param lon: Longitudes of the vertices of the polyline
+    :type lon: np.ndarray
+    :param point: Latitude and longitude of the point
+    :type point: List[float]
+    """
+    cos_origin = math.cos(math.radians(float(point[0])));
+    x = np.radians(lon - float(point[1])) * EARTH_RADIUS * cos_origin;
+    y = np.radians(lat - float(point[0])) * EARTH_RADIUS;
+    if len(x) < 2:
+        return 0.0, float(np.hypot(x[0], y[0]));
+
+    dx = np.diff(x);
+    dy = np.diff(y);
+    squared_length = dx * dx + dy * dy;
+    t = np.divide(-x[:-1] * dx - y[:-1] * dy, squared_length, out=np.zeros(len(dx)), where=squared_length > 0);
+    t = np.clip(t, 0, 1);
+    distances = np.hypot(x[:-1] + t * dx, y[:-1] + t * dy);
+
+    nearest = int(np.argmin(distances));
+    cumulative = np.concatenate(([0.0], np.cumsum(get_consecutive_distances(lat, lon))));
+    length = cumulative[nearest + 1] - cumulative[nearest];
+    return float(cumulative[nearest] + t[nearest] * length), float(distances[nearest]);
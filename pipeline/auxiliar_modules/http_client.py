@@ -0,0 +1,197 @@
+import gzip;
+import threading;
+import time;
+from typing import Dict
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Configuration of the external services used by the pipeline:
+# - timeout: seconds to wait for a response.
+# - retries: number of times a request is retried after a connection error or a 429/5xx response.
+# - retry_reads: if False, requests that time out or fail while reading the response are not retried. Map matching
+#   requests that time out are split in smaller chunks instead, so retrying them would only delay the split.
+# - backoff: base delay in seconds of the exponential backoff between retries.
+# - max_concurrency: maximum number of requests sent at the same time to the host of the service.
+# - compress_requests: if True, request bodies are sent gzip encoded. Only for servers that accept it.
+SERVICES: Dict = {
+    'valhalla': {'timeout': 120, 'retries': 2, 'retry_reads': False, 'backoff': 1.0, 'max_concurrency': 4, 'compress_requests': False},
+    'overpass': {'timeout': 180, 'retries': 3, 'retry_reads': True, 'backoff': 2.0, 'max_concurrency': 2, 'compress_requests': False},
+    'elevation': {'timeout': 30, 'retries': 3, 'retry_reads': True, 'backoff': 0.5, 'max_concurrency': 8, 'compress_requests': False}
+};
+
+
+class HTTPClient(object):
+    """This is a conceptual class representation of the HTTP client used for all the external services of the pipeline.
+    It keeps a pool of connections for each host so connections are reused between requests, retries failed requests
+    with exponential backoff, limits the number of concurrent requests to each host and counts the requests, their
+    latency and the bytes sent and received on the wire for each service.
+    It is programmed as a Singleton so one instance exists at the same time and so it can be accessed from any point
+    in the pipeline.
+    """
+
+    #### SINGLETON ####
+
+    _instance = None
+    # Creates the instance only once when many threads ask for it at the same time
+    _instance_lock = threading.Lock()
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._instance_lock:
+                if not cls._instance:
+                    instance = super(HTTPClient, cls).__new__(cls, *args, **kwargs)
+                    instance.lock = threading.Lock();
+                    instance.sessions = {};
+                    instance.limiters = {};
+                    instance.statistics = {};
+                    cls._instance = instance;
+        return cls._instance
+
+
+    #### CONNECTIONS ####
+
+    def get_session(self, service: str, host: str) -> requests.Session:
+        """
+        Returns the session that keeps the connection pool of a host, creating it the first time.
+
+        :param service: Name of the service in SERVICES
+        :type service: str
+        :param host: Host of the service
+        :type host: str
+        """
+        with self.lock:
+            if host not in self.sessions:
+                configuration = SERVICES[service];
+                # read=False raises read errors such as timeouts as they are, instead of retrying them
+                retry = Retry(
+                    total=configuration['retries'],
+                    read=None if configuration['retry_reads'] else False,
+                    backoff_factor=configuration['backoff'],
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=['GET', 'POST'],
+                    raise_on_status=False
+                );
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=configuration['max_concurrency'], max_retries=retry);
+                session = requests.Session();
+                session.mount('http://', adapter);
+                session.mount('https://', adapter);
+                session.headers.update({'Accept-Encoding': 'gzip, deflate'});
+                self.sessions[host] = session;
+                self.limiters[host] = threading.BoundedSemaphore(configuration['max_concurrency']);
+            return self.sessions[host];
+
+
+    #### REQUESTS ####
+
+    def request(self, service: str, method: str, url: str, data = None, headers: Dict = None) -> requests.Response:
+        """
+        Sends a request to a service and returns its response. Responses with error status codes are returned,
+        it is up to the caller to check them.
+
+        :param service: Name of the service in SERVICES
+        :type service: str
+        :param method: HTTP method
+        :type method: str
+        :param url: Url of the request
+        :type url: str
+        :param data: Body of the request
+        :type data: str
+        :param headers: Headers of the request
+        :type headers: Dict
+        """
+        configuration = SERVICES[service];
+        host = urlparse(url).netloc;
+        session = self.get_session(service, host);
+
+        headers = dict(headers or {});
+        if data != None:
+            if type(data) is str:
+                data = data.encode('utf-8');
+            if configuration['compress_requests']:
+                data = gzip.compress(data);
+                headers['Content-Encoding'] = 'gzip';
+
+        start = time.perf_counter();
+        try:
+            with self.limiters[host]:
+                response = session.request(method, url, data=data, headers=headers, timeout=configuration['timeout']);
+        except requests.exceptions.RequestException:
+            self.count(service, time.perf_counter() - start, len(data or b''), 0, True);
+            raise;
+
+        # The whole body has already been read, so the raw response knows how many bytes were received on the wire
+        self.count(service, time.perf_counter() - start, len(data or b''), response.raw.tell(), response.status_code >= 400);
+        return response;
+
+    def get(self, service: str, url: str, headers: Dict = None) -> requests.Response:
+        """
+        Sends a GET request to a service and returns its response.
+
+        :param service: Name of the service in SERVICES
+        :type service: str
+        :param url: Url of the request
+        :type url: str
+        :param headers: Headers of the request
+        :type headers: Dict
+        """
+        return self.request(service, 'GET', url, headers=headers);
+
+    def post(self, service: str, url: str, data, headers: Dict = None) -> requests.Response:
+        """
+        Sends a POST request to a service and returns its response.
+
+        :param service: Name of the service in SERVICES
+        :type service: str
+        :param url: Url of the request
+        :type url: str
+        :param data: Body of the request
+        :type data: str
+        :param headers: Headers of the request
+        :type headers: Dict
+        """
+        return self.request(service, 'POST', url, data=data, headers=headers);
+
+
+    #### STATISTICS ####
+
+    def count(self, service: str, latency: float, bytes_sent: int, bytes_received: int, error: bool):
+        """
+        Adds a request to the statistics of a service.
+
+        :param service: Name of the service
+        :type service: str
+        :param latency: Seconds the request took
+        :type latency: float
+        :param bytes_sent: Bytes of the body of the request, after compression
+        :type bytes_sent: int
+        :param bytes_received: Bytes of the body of the response as received, before decompression
+        :type bytes_received: int
+        :param error: If the request failed
+        :type error: bool
+        """
+        with self.lock:
+            statistics = self.statistics.setdefault(service, {'requests': 0, 'errors': 0, 'latency': 0.0, 'bytes_sent': 0, 'bytes_received': 0});
+            statistics['requests'] += 1;
+            statistics['errors'] += 1 if error else 0;
+            statistics['latency'] += latency;
+            statistics['bytes_sent'] += bytes_sent;
+            statistics['bytes_received'] += bytes_received;
+
+    def get_statistics(self) -> Dict:
+        """
+        Returns the number of requests and errors, the total latency in seconds and the bytes sent and received for each service.
+        """
+        with self.lock:
+            return {service: dict(statistics) for service, statistics in self.statistics.items()};
+
+    def print_statistics(self):
+        """
+        Prints the statistics of the requests to each service.
+        """
+        for service, statistics in self.get_statistics().items():
+            average = statistics['latency'] / statistics['requests'] if statistics['requests'] > 0 else 0;
+            print("{}: {} requests ({} errors), {:.3f} s average latency, {} bytes sent, {} bytes received".format(
+                service, statistics['requests'], statistics['errors'], average, statistics['bytes_sent'], statistics['bytes_received']));
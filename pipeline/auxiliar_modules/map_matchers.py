@@ -0,0 +1,367 @@
+import math;
+import numpy as np
+from typing import Dict, List
+
+from auxiliar_modules.auxiliar_classes import Node, Way;
+from auxiliar_modules.geodesy import EARTH_RADIUS;
+from auxiliar_modules.osm_extract import load_osm_extract;
+
+
+class MapMatcher:
+    """This is a conceptual class representation of a map matching backend. Subclasses implement the map matching of
+    a chunk of data points and return the result with the same shape as the Valhalla trace_attributes service:
+
+    - "edges": list of traversed edges, each one with the "way_id" of the OSM way it belongs to. Edges can also give
+      the positions [lat, lon] where they begin and end in "begin" and "end", and all their positions in "positions",
+      or, as Valhalla does, the positions of their ends in the encoded "shape" of the result with "begin_shape_index"
+      and "end_shape_index".
+    - "matched_points": one entry per data point with its "type" ("matched" or "unmatched") and, for matched points,
+      its "lat", "lon", "edge_index" and "distance_along_edge".
+    """
+
+    def match(self, points: List) -> Dict:
+        """
+        Returns the map matching of a chunk of data points. This method needs to be overridden by any subclass.
+
+        :param points: Chunk of data points to be map matched.
+        :type points: List[[float, float, int]]
+        """
+        pass;
+
+    def get_cache_key(self, points: List) -> str:
+        """
+        Returns the key under which the map matching of a chunk is cached, or None if the results of the
+        matcher must not be cached.
+
+        :param points: Chunk of data points to be map matched.
+        :type points: List[[float, float, int]]
+        """
+        return None;
+
+    def get_nodes_and_ways(self, way_ids: List[int]):
+        """
+        Returns the nodes and ways with the ids passed as parameter from the road network of the matcher, or None
+        if the matcher has no road network of its own and they must be retrieved from OSM.
+
+        :param way_ids: Ids of the ways
+        :type way_ids: List[int]
+        """
+        return None;
+
+
+class HMMMapMatcher(MapMatcher):
+    """Offline map matcher that runs a Hidden Markov Model (Newson and Krumm) over the roads of a local OSM extract.
+    Candidate road segments of each point are found with a uniform grid index. Emission probabilities follow
+    the distance from the point to the candidate, and transition probabilities follow the difference between
+    the distance travelled along the roads and the straight line distance between consecutive points.
+
+    :param nodes: Nodes of the road network.
+    :type nodes: List[Node]
+    :param ways: Ways of the road network.
+    :type ways: List[Way]
+    :param search_radius: Maximum distance in meters from a point to its candidate segments.
+    :type search_radius: float
+    :param sigma: Standard deviation in meters of the GPS noise.
+    :type sigma: float
+    :param beta: Scale in meters of the difference between route and straight line distances.
+    :type beta: float
+    :param max_candidates: Maximum number of candidate segments per point.
+    :type max_candidates: int
+    """
+
+    def __init__(self, nodes: List[Node], ways: List[Way], search_radius: float = 30, sigma: float = 5, beta: float = 10, max_candidates: int = 8):
+        self.search_radius: float = search_radius;
+        self.sigma: float = sigma;
+        self.beta: float = beta;
+        self.max_candidates: int = max_candidates;
+        self.build_road_network(nodes, ways);
+
+    @classmethod
+    def from_osm_extract(cls, path: str, **kwargs):
+        """
+        Returns a matcher over the roads of a local OSM extract.
+
+        :param path: Path of the OSM extract
+        :type path: str
+        """
+        nodes, ways = load_osm_extract(path);
+        return cls(nodes, ways, **kwargs);
+
+
+    #### ROAD NETWORK ####
+
+    def build_road_network(self, nodes: List[Node], ways: List[Way]):
+        """
+        Builds the arrays of road segments in local metric coordinates and the grid index over them.
+
+        :param nodes: Nodes of the road network.
+        :type nodes: List[Node]
+        :param ways: Ways of the road network.
+        :type ways: List[Way]
+        """
+        self.nodes_per_id: Dict = {node.id: node for node in nodes};
+        self.ways_per_id: Dict = {way.id: way for way in ways};
+        coordinates = {node.id: (float(node.lat), float(node.lon)) for node in nodes};
+        latitudes = [lat for lat, _ in coordinates.values()];
+        self.origin_lat = float(np.mean(latitudes)) if len(latitudes) > 0 else 0.0;
+        self.cos_origin = math.cos(math.radians(self.origin_lat));
+
+        self.way_ids = [];
+        self.way_lengths = [];
+        self.way_node_offsets: List[Dict] = [];
+        self.way_positions: List = [];
+
+        segment_way = [];
+        segment_start = [];
+        ax = [];
+        ay = [];
+        bx = [];
+        by = [];
+        for way in ways:
+            way_nodes = [node_id for node_id in way.nodes if node_id in coordinates];
+            if len(way_nodes) < 2:
+                continue;
+
+            way_index = len(self.way_ids);
+            xs, ys = self.project(np.array([coordinates[n][0] for n in way_nodes]), np.array([coordinates[n][1] for n in way_nodes]));
+            lengths = np.hypot(np.diff(xs), np.diff(ys));
+            offsets = np.concatenate(([0.0], np.cumsum(lengths)));
+
+            self.way_ids.append(way.id);
+            self.way_lengths.append(float(offsets[-1]));
+            self.way_node_offsets.append({way_nodes[i]: float(offsets[i]) for i in range(len(way_nodes))});
+            self.way_positions.append([list(coordinates[node_id]) for node_id in way_nodes]);
+
+            segment_way.extend([way_index] * len(lengths));
+            segment_start.extend(offsets[:-1]);
+            ax.extend(xs[:-1]);
+            ay.extend(ys[:-1]);
+            bx.extend(xs[1:]);
+            by.extend(ys[1:]);
+
+        self.segment_way = np.array(segment_way, dtype=np.int64);
+        self.segment_start = np.array(segment_start, dtype=np.float64);
+        self.ax = np.array(ax, dtype=np.float64);
+        self.ay = np.array(ay, dtype=np.float64);
+        self.bx = np.array(bx, dtype=np.float64);
+        self.by = np.array(by, dtype=np.float64);
+
+        self.cell_size = max(self.search_radius, 1.0);
+        self.grid: Dict = {};
+        min_cx = np.floor(np.minimum(self.ax, self.bx) / self.cell_size).astype(np.int64);
+        max_cx = np.floor(np.maximum(self.ax, self.bx) / self.cell_size).astype(np.int64);
+        min_cy = np.floor(np.minimum(self.ay, self.by) / self.cell_size).astype(np.int64);
+        max_cy = np.floor(np.maximum(self.ay, self.by) / self.cell_size).astype(np.int64);
+        for segment in range(len(self.segment_way)):
+            for cx in range(min_cx[segment], max_cx[segment] + 1):
+                for cy in range(min_cy[segment], max_cy[segment] + 1):
+                    self.grid.setdefault((cx, cy), []).append(segment);
+
+    def project(self, lat, lon):
+        """
+        Returns the local equirectangular coordinates in meters of geographical points.
+
+        :param lat: Latitudes of the points
+        :type lat: np.ndarray
+        :param lon: Longitudes of the points
+        :type lon: np.ndarray
+        """
+        x = np.radians(lon) * EARTH_RADIUS * self.cos_origin;
+        y = np.radians(lat) * EARTH_RADIUS;
+        return x, y;
+
+    def unproject(self, x, y):
+        """
+        Returns the latitude and longitude of points in local equirectangular coordinates.
+
+        :param x: X coordinates of the points in meters
+        :type x: float
+        :param y: Y coordinates of the points in meters
+        :type y: float
+        """
+        lat = math.degrees(y / EARTH_RADIUS);
+        lon = math.degrees(x / (EARTH_RADIUS * self.cos_origin));
+        return lat, lon;
+
+    def get_nodes_and_ways(self, way_ids: List[int]):
+        """
+        Returns the nodes and ways with the ids passed as parameter from the OSM extract of the matcher, so the
+        ways of its results never need to be requested to the Overpass server.
+
+        :param way_ids: Ids of the ways
+        :type way_ids: List[int]
+        """
+        ways = [self.ways_per_id[way_id] for way_id in dict.fromkeys(way_ids) if way_id in self.ways_per_id];
+        node_ids = dict.fromkeys(node_id for way in ways for node_id in way.nodes);
+        nodes = [self.nodes_per_id[node_id] for node_id in node_ids if node_id in self.nodes_per_id];
+        return nodes, ways;
+
+
+    #### CANDIDATES ####
+
+    def get_candidates(self, x: float, y: float):
+        """
+        Returns the closest candidate segments of a point, the position along each segment (from 0 to 1)
+        of the projection of the point and the distance from the point to each of them.
+
+        :param x: X coordinate of the point in meters
+        :type x: float
+        :param y: Y coordinate of the point in meters
+        :type y: float
+        """
+        cx = int(math.floor(x / self.cell_size));
+        cy = int(math.floor(y / self.cell_size));
+        segments = set();
+        for i in range(cx - 1, cx + 2):
+            for j in range(cy - 1, cy + 2):
+                segments.update(self.grid.get((i, j), []));
+
+        if len(segments) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0);
+
+        segments = np.fromiter(segments, dtype=np.int64);
+        dx = self.bx[segments] - self.ax[segments];
+        dy = self.by[segments] - self.ay[segments];
+        squared_length = dx * dx + dy * dy;
+        t = np.where(squared_length > 0, ((x - self.ax[segments]) * dx + (y - self.ay[segments]) * dy) / np.where(squared_length > 0, squared_length, 1), 0);
+        t = np.clip(t, 0, 1);
+        distances = np.hypot(self.ax[segments] + t * dx - x, self.ay[segments] + t * dy - y);
+
+        within = distances <= self.search_radius;
+        segments, t, distances = segments[within], t[within], distances[within];
+        order = np.argsort(distances)[:self.max_candidates];
+        return segments[order], t[order], distances[order];
+
+    def get_route_distances(self, previous, current) -> np.ndarray:
+        """
+        Returns the matrix of distances along the roads between the candidates of two consecutive points.
+        Candidates on the same way are connected along the way, candidates on ways that share a node are
+        connected through that node, and otherwise the straight line distance is doubled as a penalty.
+
+        :param previous: Way indexes, way offsets, positions and distances of the candidates of the previous point
+        :type previous: Tuple
+        :param current: Way indexes, way offsets, positions and distances of the candidates of the current point
+        :type current: Tuple
+        """
+        previous_ways, previous_offsets, previous_x, previous_y = previous[:4];
+        current_ways, current_offsets, current_x, current_y = current[:4];
+
+        straight = np.hypot(current_x[None, :] - previous_x[:, None], current_y[None, :] - previous_y[:, None]);
+        distances = 2 * straight;
+
+        same_way = previous_ways[:, None] == current_ways[None, :];
+        distances = np.where(same_way, np.abs(current_offsets[None, :] - previous_offsets[:, None]), distances);
+
+        for i in range(len(previous_ways)):
+            for j in range(len(current_ways)):
+                if same_way[i, j]:
+                    continue;
+                previous_nodes = self.way_node_offsets[previous_ways[i]];
+                current_nodes = self.way_node_offsets[current_ways[j]];
+                for node_id in previous_nodes.keys() & current_nodes.keys():
+                    through_node = abs(previous_nodes[node_id] - previous_offsets[i]) + abs(current_nodes[node_id] - current_offsets[j]);
+                    distances[i, j] = min(distances[i, j], through_node);
+        return distances;
+
+
+    #### MATCHING ####
+
+    def match(self, points: List) -> Dict:
+        """
+        Returns the map matching of a chunk of data points, computed with the Viterbi algorithm. The trace is
+        broken and started again at points that have no candidate segments, which are returned as unmatched.
+
+        :param points: Chunk of data points to be map matched.
+        :type points: List[[float, float, int]]
+        """
+        lat = np.array([float(p[0]) for p in points], dtype=np.float64);
+        lon = np.array([float(p[1]) for p in points], dtype=np.float64);
+        xs, ys = self.project(lat, lon);
+
+        states = [];
+        scores = [];
+        backpointers = [];
+        for k in range(len(points)):
+            segments, t, distances = self.get_candidates(xs[k], ys[k]);
+            if len(segments) == 0:
+                states.append(None);
+                scores.append(None);
+                backpointers.append(None);
+                continue;
+
+            ways = self.segment_way[segments];
+            offsets = self.segment_start[segments] + t * np.hypot(self.bx[segments] - self.ax[segments], self.by[segments] - self.ay[segments]);
+            candidate_x = self.ax[segments] + t * (self.bx[segments] - self.ax[segments]);
+            candidate_y = self.ay[segments] + t * (self.by[segments] - self.ay[segments]);
+            state = (ways, offsets, candidate_x, candidate_y, distances);
+            emission = -0.5 * (distances / self.sigma) ** 2;
+
+            if k == 0 or states[k - 1] == None:
+                score = emission;
+                backpointer = np.full(len(segments), -1, dtype=np.int64);
+            else:
+                straight = math.hypot(xs[k] - xs[k - 1], ys[k] - ys[k - 1]);
+                transition = -np.abs(self.get_route_distances(states[k - 1], state) - straight) / self.beta;
+                total = scores[k - 1][:, None] + transition;
+                backpointer = np.argmax(total, axis=0);
+                score = total[backpointer, np.arange(len(segments))] + emission;
+
+            states.append(state);
+            scores.append(score);
+            backpointers.append(backpointer);
+
+        chosen = [None] * len(points);
+        k = len(points) - 1;
+        while k >= 0:
+            if states[k] == None:
+                k = k - 1;
+                continue;
+            best = int(np.argmax(scores[k]));
+            while k >= 0 and states[k] != None:
+                chosen[k] = best;
+                best = int(backpointers[k][best]);
+                k = k - 1;
+
+        return self.format_result(states, chosen);
+
+    def format_result(self, states, chosen) -> Dict:
+        """
+        Returns the chosen candidates of every point with the shape of the Valhalla trace_attributes service.
+        Consecutive points on the same way share the same edge. Every edge spans its whole way, its first and last
+        positions are given in "begin" and "end", and the positions of all the nodes of the way in "positions".
+
+        :param states: Candidates of every point
+        :type states: List[Tuple]
+        :param chosen: Position of the chosen candidate of every point
+        :type chosen: List[int]
+        """
+        edges = [];
+        matched_points = [];
+        for k in range(len(states)):
+            if chosen[k] == None:
+                matched_points.append({'type': 'unmatched'});
+                continue;
+
+            ways, offsets, candidate_x, candidate_y, distances = states[k];
+            way_index = int(ways[chosen[k]]);
+            if len(edges) == 0 or edges[-1]['way_id'] != self.way_ids[way_index]:
+                edges.append({
+                    'way_id': self.way_ids[way_index],
+                    'length': self.way_lengths[way_index] / 1000,
+                    'begin': self.way_positions[way_index][0],
+                    'end': self.way_positions[way_index][-1],
+                    'positions': self.way_positions[way_index]
+                });
+
+            lat, lon = self.unproject(candidate_x[chosen[k]], candidate_y[chosen[k]]);
+            way_length = self.way_lengths[way_index];
+            matched_points.append({
+                'type': 'matched',
+                'lat': lat,
+                'lon': lon,
+                'edge_index': len(edges) - 1,
+                'distance_along_edge': float(offsets[chosen[k]]) / way_length if way_length > 0 else 0.0,
+                'distance_from_trace_point': float(distances[chosen[k]])
+            });
+
+        return {'edges': edges, 'matched_points': matched_points};
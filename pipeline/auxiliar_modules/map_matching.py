@@ -2,13 +2,46 @@ import numpy as np
 import requests
 import json 
 import pandas as pd;
-import requests
-from tables.measurements import filter_measurements, format_measurements, format_for_map_matching;
+import time;
+import math;
+import os;
+import threading;
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from typing import Dict, List
+from tables.measurements import MeasurementColumns, filter_measurements, format_measurements, format_for_map_matching, stream_formatted_measurements, get_consecutive_distances;
+from auxiliar_modules.geodesy import EARTH_RADIUS, get_distance_along_polyline;
 from auxiliar_modules.db_queries import get_computed_ways;
+from auxiliar_modules.http_client import HTTPClient;
+from auxiliar_modules.map_matchers import MapMatcher, HMMMapMatcher;
+from auxiliar_modules.osm_store import OSMStore;
+from auxiliar_modules.trace_simplification import simplify_trace, reproject_dropped_points;
+from auxiliar_modules.map_matching_cache import get_map_matching_cache_key, read_cached_map_matching, write_cached_map_matching;
 
 from auxiliar_modules.auxiliar_classes import Node;
 from auxiliar_modules.auxiliar_classes import Way;
 
+# Maximum number of chunks of a trip that are map matched at the same time
+MAP_MATCHING_WORKERS = 4;
+
+# Maximum number of measurements of a chunk, and time (seconds) and distance (meters) gaps at which a trace is split
+CHUNK_MAX_SIZE = 15000;
+CHUNK_MAX_TIME_GAP = 60;
+CHUNK_MAX_DISTANCE_GAP = 500;
+# Number of measurements added on each side of a split, and minimum size of the halves of a chunk split after an error
+CHUNK_OVERLAP = 20;
+CHUNK_MIN_SIZE = 50;
+
+# Error codes of the Valhalla Service for requests that are too big: too many shape points (153) and
+# path distance exceeding the maximum (154)
+VALHALLA_SIZE_ERROR_CODES = (153, 154);
+
+# Tolerance in meters of the simplification of the chunks before map matching them. None disables the simplification.
+SIMPLIFICATION_TOLERANCE = None;
+
+# Maximum distance in meters between a map matched point and its position derived from its edge. Points farther
+# away get no node offset, and their segment is searched geometrically.
+EDGE_POSITION_MAX_ERROR = 10;
 
 
 def overpass_query(query):
@@ -20,13 +53,55 @@ def overpass_query(query):
 
     """
     url = "http://lira-osm.compute.dtu.dk/api/interpreter?data=[timeout:180][out:json];"
-    result = requests.get(url + query, headers={'Content-type': 'application/json'})
+    result = HTTPClient().get('overpass', url + query, headers={'Content-type': 'application/json'})
+    result.raise_for_status();
     return json.loads(result.text)
 
 def get_nodes_and_ways_from_way_ids(way_ids):
 
+    """
+    Gets OSM Ways and Nodes based on the list of way ids passed as a parameter. If the current map matcher has a road
+    network of its own, such as the offline HMM map matcher, they are taken from it. Otherwise they are read from the
+    local OSM store, and only the ways and nodes missing from it are requested to the LiRA Overpass server and stored.
+
+    :param way_ids: Ids of the ways and its nodes to get.
+    :type way_ids: List[int]
+
+    """
+    from_matcher = get_map_matcher().get_nodes_and_ways(way_ids);
+    if from_matcher != None:
+        return from_matcher;
+
+    store = OSMStore();
+    ways, missing_way_ids = store.get_ways(way_ids);
+
+    if len(missing_way_ids) > 0:
+        fetched_nodes, fetched_ways, complete = query_nodes_and_ways_from_way_ids(missing_way_ids);
+        # Ways missing from a truncated result may still be roads, so they are only stored as not being roads
+        # when the result is complete
+        not_road_way_ids = [];
+        if complete:
+            fetched_way_ids = set(way.id for way in fetched_ways);
+            not_road_way_ids = [way_id for way_id in missing_way_ids if way_id not in fetched_way_ids];
+        store.insert(fetched_nodes, fetched_ways, not_road_way_ids);
+        ways = ways + fetched_ways;
+
+    nodes, missing_node_ids = store.get_nodes([node_id for way in ways for node_id in way.nodes]);
+
+    if len(missing_node_ids) > 0:
+        fetched_nodes = query_nodes_from_node_ids(missing_node_ids);
+        store.insert(fetched_nodes, []);
+        nodes = nodes + fetched_nodes;
+
+    return nodes, ways;
+
+
+def query_nodes_and_ways_from_way_ids(way_ids):
+
     """
     Gets OSM Ways and Nodes based on the list of way ids passed as a parameter using the LiRA Overpass server.
+    Also returns whether the result is complete, which it is not when the server adds a remark to it,
+    for instance because the query timed out or ran out of memory.
 
     :param way_ids: Ids of the ways and its nodes to get.
     :type way_ids: List[int]
@@ -52,17 +127,35 @@ def get_nodes_and_ways_from_way_ids(way_ids):
         elif element["type"] == "way":
             way = Way(element["id"], element["nodes"]);
             ways.append(way);
-    return nodes, ways;
+    return nodes, ways, "remark" not in result;
+
+
+def query_nodes_from_node_ids(node_ids):
 
-def req_valhalla_service(chunk):
     """
-    Requests the use of the Valhalla Service which performs the map matching.
+    Gets OSM Nodes based on the list of node ids passed as a parameter using the LiRA Overpass server.
+
+    :param node_ids: Ids of the nodes to get.
+    :type node_ids: List[int]
+
+    """
+
+    ids = ','.join([str(id) for id in node_ids])
+    query = f"""node(id:{ids});
+    out;"""
+
+    result = overpass_query(query);
+    return [Node(element["id"], element["lat"], element["lon"]) for element in result["elements"] if element["type"] == "node"];
+
+
+def get_valhalla_request(chunk):
+    """
+    Returns the body of the request to the Valhalla Service for a chunk of data points.
 
     :param chunk: Chunk of data points to be map matched.
     :type chunk: List[[float, float, int]]
 
     """
-    url = 'https://valhalla1.openstreetmap.de/trace_attributes' 
     df = pd.DataFrame(data={
         "lon": [float(p[1]) for p in chunk], 
         "lat": [float(p[0]) for p in chunk],
@@ -70,43 +163,277 @@ def req_valhalla_service(chunk):
     })
     
     coords = df.to_json(orient='records')
-    data = '{"shape":' + str(coords) + ""","shape_match":"map_snap", "use_timestamps": "true","costing":"auto", "format":"osrm", "trace_options":{"search_radius":20}}"""
-    res = requests.post(url, data=data, headers={'Content-type': 'application/json'})
+    return '{"shape":' + str(coords) + ""","shape_match":"map_snap", "use_timestamps": "true","costing":"auto", "format":"osrm", "trace_options":{"search_radius":20}}"""
+
+
+def req_valhalla_service(chunk):
+    """
+    Requests the use of the Valhalla Service which performs the map matching.
+
+    :param chunk: Chunk of data points to be map matched.
+    :type chunk: List[[float, float, int]]
+
+    """
+    return post_valhalla_request(get_valhalla_request(chunk));
+
+
+def post_valhalla_request(data):
+    """
+    Sends a request to the Valhalla Service and returns its result.
+
+    :param data: Body of the request.
+    :type data: str
+
+    """
+    url = 'https://valhalla1.openstreetmap.de/trace_attributes' 
+    res = HTTPClient().post('valhalla', url, data=data, headers={'Content-type': 'application/json'})
     print(res);
+    res.raise_for_status();
     return json.loads(res.text)
 
 
 
-def map_match(data: np.ndarray):
+class ValhallaMapMatcher(MapMatcher):
+    """Map matcher that uses the public Valhalla Service. Its results are cached by the hash of the request.
+    """
+
+    def match(self, points: List) -> Dict:
+        """
+        Returns the map matching of a chunk of data points computed by the Valhalla Service.
+
+        :param points: Chunk of data points to be map matched.
+        :type points: List[[float, float, int]]
+        """
+        return req_valhalla_service(points);
+
+    def get_cache_key(self, points: List) -> str:
+        """
+        Returns the hash of the request to the Valhalla Service for a chunk of data points.
+
+        :param points: Chunk of data points to be map matched.
+        :type points: List[[float, float, int]]
+        """
+        return get_map_matching_cache_key(get_valhalla_request(points));
+
+
+_map_matcher: MapMatcher = None;
+_map_matcher_lock = threading.Lock();
+
+def set_map_matcher(matcher: MapMatcher):
+    """
+    Sets the map matcher used to map match all the chunks of measurements.
+
+    :param matcher: Map matcher to use
+    :type matcher: MapMatcher
+    """
+    global _map_matcher;
+    with _map_matcher_lock:
+        _map_matcher = matcher;
+
+def get_map_matcher() -> MapMatcher:
+    """
+    Returns the map matcher used to map match all the chunks of measurements. By default it is the Valhalla Service,
+    unless the MAP_MATCHING_OSM_EXTRACT environment variable points to a local OSM extract, in which case an
+    offline HMM map matcher over that extract is used. The matcher is created once, even if several chunks
+    ask for it at the same time.
+    """
+    global _map_matcher;
+    with _map_matcher_lock:
+        if _map_matcher == None:
+            load_dotenv();
+            osm_extract = os.getenv('MAP_MATCHING_OSM_EXTRACT');
+            if osm_extract:
+                _map_matcher = HMMMapMatcher.from_osm_extract(osm_extract);
+            else:
+                _map_matcher = ValhallaMapMatcher();
+        return _map_matcher;
+
+
+def decode_polyline(encoded: str, precision: int = 6) -> List[List[float]]:
+    """
+    Returns the positions [lat, lon] of an encoded polyline, as returned by the Valhalla Service.
+
+    :param encoded: Encoded polyline
+    :type encoded: str
+    :param precision: Number of decimals of the encoded coordinates
+    :type precision: int
+    """
+    res = [];
+    factor = 10 ** precision;
+    index = 0;
+    lat = 0;
+    lon = 0;
+    while index < len(encoded):
+        values = [];
+        for _ in range(2):
+            shift = 0;
+            value = 0;
+            while True:
+                byte = ord(encoded[index]) - 63;
+                index += 1;
+                value |= (byte & 0x1f) << shift;
+                shift += 5;
+                if byte < 0x20:
+                    break;
+            values.append(~(value >> 1) if value & 1 else value >> 1);
+        lat += values[0];
+        lon += values[1];
+        res.append([lat / factor, lon / factor]);
+    return res;
+
+
+def get_edge_shapes(result: Dict) -> List:
+    """
+    Returns the positions [lat, lon] along every edge of a map matching result, from its first to its last position,
+    or None for the edges whose positions are not given. Edges that only give their first and last positions are
+    straight lines between them.
+
+    :param result: Result of a map matcher
+    :type result: Dict
+    """
+    shape = decode_polyline(result['shape']) if 'shape' in result else None;
+    res = [];
+    for edge in result['edges']:
+        if 'positions' in edge:
+            res.append(edge['positions']);
+        elif 'begin' in edge and 'end' in edge:
+            res.append([edge['begin'], edge['end']]);
+        elif shape != None and 'begin_shape_index' in edge and 'end_shape_index' in edge:
+            res.append(shape[edge['begin_shape_index']:edge['end_shape_index'] + 1]);
+        else:
+            res.append(None);
+    return res;
+
+
+def map_match(data: np.ndarray, use_cache = True):
+    """
+    Map matches a chunk of data points with the current map matcher. Results of matchers that support it are cached
+    on disk by the hash of the request, so the same trace with the same options is only map matched once.
+    Returns the way ids of the edges, the map matched points and the positions along the edges.
+
+    :param data: Chunk of data points to be map matched.
+    :type data: List[[float, float, int]]
+    :param use_cache: If False, the map matching cache is neither read nor written.
+    :type use_cache: bool
+
+    """
     print(len(data));
-    chunk = req_valhalla_service(data)
+    matcher = get_map_matcher();
+    key = matcher.get_cache_key(data) if use_cache else None;
+
+    if key != None:
+        cached = read_cached_map_matching(key);
+        if cached != None:
+            # Results cached before the shapes of the edges were stored only have their first and last positions
+            edge_shapes = cached.get('edge_shapes') or cached.get('edge_bounds');
+            return cached['way_ids'], cached['matched_points'], edge_shapes or [None] * len(cached['way_ids']);
+
+    chunk = matcher.match(data)
     way_ids = [edge['way_id'] for edge in chunk['edges']]
     map_matched_points = chunk['matched_points'];
+    edge_shapes = get_edge_shapes(chunk);
+
+    if key != None:
+        write_cached_map_matching(key, way_ids, map_matched_points, edge_shapes);
         
-    return way_ids, map_matched_points
+    return way_ids, map_matched_points, edge_shapes
+
+
+def get_way_node_offsets(way: Way, nodes_per_id: Dict, shape: List, points: List) -> List:
+    """
+    Returns, for map matched points on the same edge, the position in the nodes of the way of the first node of the
+    segment where each point lies and the distance in meters along that segment, or None for the points whose
+    position derived from the edge is farther than EDGE_POSITION_MAX_ERROR from their map matched position.
+    The first and last positions of the edge are located on the way, and every point is placed between them
+    at the fraction of the edge given by its distance along the edge.
+
+    :param way: Way of the edge
+    :type way: Way
+    :param nodes_per_id: Nodes of the way, by id
+    :type nodes_per_id: Dict
+    :param shape: Positions [lat, lon] along the edge
+    :type shape: List[List[float]]
+    :param points: Map matched points on the edge
+    :type points: List[Dict]
+    """
+    if any(node_id not in nodes_per_id for node_id in way.nodes) or len(way.nodes) < 2:
+        return [None] * len(points);
+
+    lat = np.array([float(nodes_per_id[node_id].lat) for node_id in way.nodes], dtype=np.float64);
+    lon = np.array([float(nodes_per_id[node_id].lon) for node_id in way.nodes], dtype=np.float64);
+    cumulative = np.concatenate(([0.0], np.cumsum(get_consecutive_distances(lat, lon))));
+
+    begin, begin_error = get_distance_along_polyline(lat, lon, shape[0]);
+    end, end_error = get_distance_along_polyline(lat, lon, shape[-1]);
+    if begin_error > EDGE_POSITION_MAX_ERROR or end_error > EDGE_POSITION_MAX_ERROR:
+        return [None] * len(points);
+
+    fractions = np.array([float(point['distance_along_edge']) for point in points], dtype=np.float64);
+    way_distances = begin + np.clip(fractions, 0, 1) * (end - begin);
+    offsets = np.clip(np.searchsorted(cumulative, way_distances, side='right') - 1, 0, len(way.nodes) - 2);
+    distances_along = way_distances - cumulative[offsets];
+
+    # The derived positions are checked against the map matched ones
+    segment_lengths = cumulative[offsets + 1] - cumulative[offsets];
+    t = np.divide(distances_along, segment_lengths, out=np.zeros(len(points)), where=segment_lengths > 0);
+    derived_lat = lat[offsets] + t * (lat[offsets + 1] - lat[offsets]);
+    derived_lon = lon[offsets] + t * (lon[offsets + 1] - lon[offsets]);
+    matched_lat = np.array([float(point['lat']) for point in points], dtype=np.float64);
+    matched_lon = np.array([float(point['lon']) for point in points], dtype=np.float64);
+    errors = EARTH_RADIUS * np.hypot(np.radians(derived_lat - matched_lat), np.radians(derived_lon - matched_lon) * np.cos(np.radians(matched_lat)));
+
+    res = [];
+    for k in range(len(points)):
+        res.append((int(offsets[k]), float(distances_along[k])) if errors[k] <= EDGE_POSITION_MAX_ERROR else None);
+    return res;
 
 
-def map_match_chunk(measurements):
+def map_match_chunk(measurements, core_start = 0, core_end = None, tolerance = SIMPLIFICATION_TOLERANCE, points = None):
     """
-    Map matches a chunk of measurements.
+    Map matches a chunk of measurements. All the measurements of the chunk are sent to the map matcher, but only
+    the ones in its core are updated and returned, so the measurements that overlap with neighbouring chunks
+    just give context to the map matcher and are not duplicated.
+
+    The map matcher is sent the points passed as parameter, not the positions of the measurements, because the
+    measurements that overlap with a neighbouring chunk may be updated by that chunk at the same time.
+
+    If a tolerance is passed, the chunk is simplified with the Douglas-Peucker algorithm before map matching it,
+    and the dropped measurements are projected onto the shapes of the matched edges between their matched neighbours.
 
     :param measurements: List of measurements to be map matched.
     :type measurements: List[Measurement]
+    :param core_start: Position in the chunk of the first measurement of its core.
+    :type core_start: int
+    :param core_end: Position in the chunk after the last measurement of its core. By default the end of the chunk.
+    :type core_end: int
+    :param tolerance: Tolerance in meters of the simplification of the chunk. If None, the chunk is not simplified.
+    :type tolerance: float
+    :param points: Raw positions and timestamps of the measurements of the chunk, as returned by format_for_map_matching
+        before any measurement is map matched. By default they are formatted from the measurements.
+    :type points: List[[float, float, int]]
 
     """
-    measurements_for_map_matching = format_for_map_matching(measurements);
-    map_matched_way_ids, map_matched_measurements = map_match(measurements_for_map_matching);
+    if core_end == None:
+        core_end = len(measurements);
+
+    measurements_for_map_matching = points if points != None else format_for_map_matching(measurements);
+    if tolerance != None:
+        kept = simplify_trace(measurements_for_map_matching, tolerance);
+        map_matched_way_ids, map_matched_kept, edge_shapes = map_match([measurements_for_map_matching[k] for k in kept]);
+        map_matched_measurements = reproject_dropped_points(measurements_for_map_matching, kept, map_matched_kept, edge_shapes);
+    else:
+        map_matched_way_ids, map_matched_measurements, edge_shapes = map_match(measurements_for_map_matching);
    
     nodes, ways = get_nodes_and_ways_from_way_ids(map_matched_way_ids);
-    way_ids = [way.id for way in ways];
+    ways_per_id = {way.id: way for way in ways};
+    nodes_per_id = {node.id: node for node in nodes};
 
     res = [];
+    points_per_edge: Dict = {};
     last_edge_index = 0;
-    i = 0;
-    for measurement in measurements:
+    for i in range(len(measurements)):
         matched_measurement = map_matched_measurements[i]
         if matched_measurement['type'] == 'unmatched':
-                i = i + 1;
                 continue;
 
         edge_index = matched_measurement['edge_index'];
@@ -117,13 +444,29 @@ def map_match_chunk(measurements):
         else:
             last_edge_index = cur_edge_index;
 
-        measurement.position = [float(matched_measurement['lat']), float(matched_measurement['lon'])];
-        measurement.way = map_matched_way_ids[cur_edge_index];
+        if i < core_start or i >= core_end:
+            continue;
 
-        if measurement.way not in way_ids:
+        way = map_matched_way_ids[cur_edge_index];
+        if way not in ways_per_id:
             continue;
+
+        measurement = measurements[i];
+        measurement.position = [float(matched_measurement['lat']), float(matched_measurement['lon'])];
+        measurement.way = way;
+        measurement.way_node_offset = None;
         res.append(measurement)
-        i = i + 1;
+
+        if cur_edge_index == edge_index and edge_shapes[edge_index] != None:
+            points_per_edge.setdefault(edge_index, []).append((measurement, matched_measurement));
+
+    # Position of each measurement in the nodes of its way, derived from its edge
+    for edge_index, points in points_per_edge.items():
+        way = ways_per_id[map_matched_way_ids[edge_index]];
+        offsets = get_way_node_offsets(way, nodes_per_id, edge_shapes[edge_index], [point for _, point in points]);
+        for (measurement, _), offset in zip(points, offsets):
+            if offset != None:
+                measurement.way_node_offset, measurement.distance_along_segment = offset;
 
     return res, ways, nodes;
 
@@ -137,19 +480,190 @@ def format_and_map_match_measurements(measurements_from_db):
 
     """
     formatted_measurements = format_measurements(filter_measurements(measurements_from_db));
+    return map_match_measurements(formatted_measurements);
+
+
+def stream_and_map_match_measurements(batches_from_db):
+    """
+    Filters and formats the batches of measurements streamed from the LiRA database as they arrive, so the raw
+    rows of just one batch are kept in memory, and map matches the resulting measurements in chunks. The columns
+    of the batches are concatenated into the columns of the trip.
+
+    :param batches_from_db: Batches of measurements to be map matched.
+    :type batches_from_db: Iterable[List[[]]]
+
+    """
+    formatted_batches = list(stream_formatted_measurements(batches_from_db));
+    return map_match_measurements(MeasurementColumns.concatenate(formatted_batches));
+
+
+def split_in_chunks(measurements, max_size = CHUNK_MAX_SIZE, max_time_gap = CHUNK_MAX_TIME_GAP, max_distance_gap = CHUNK_MAX_DISTANCE_GAP, overlap = CHUNK_OVERLAP):
+    """
+    Splits a trace of measurements in chunks for map matching. The trace is first split where there is a time gap
+    or a distance gap between consecutive measurements, except where the split would leave a single measurement
+    alone, and then every part is split in chunks of similar size that are not bigger than the maximum size. Chunks of the same part overlap by some measurements on each side
+    of the split.
+
+    Every chunk is returned as a tuple (start, end, core_start, core_end) of positions in the trace: the chunk contains
+    the measurements from start to end, and its core, the ones from core_start to core_end. Cores do not overlap.
+
+    :param measurements: Trace of measurements sorted by time.
+    :type measurements: List[Measurement]
+    :param max_size: Maximum number of measurements of a chunk, including the overlap.
+    :type max_size: int
+    :param max_time_gap: Time in seconds between consecutive measurements from which the trace is split.
+    :type max_time_gap: int
+    :param max_distance_gap: Distance in meters between consecutive measurements from which the trace is split.
+    :type max_distance_gap: float
+    :param overlap: Number of measurements added on each side of a split.
+    :type overlap: int
+
+    """
+    if len(measurements) == 0:
+        return [];
+
+    columns = MeasurementColumns.from_measurements(measurements);
+    gaps = (np.diff(columns.timestamps) > max_time_gap) | (get_consecutive_distances(columns.lat, columns.lon) > max_distance_gap);
+    boundaries = [0] + (np.flatnonzero(gaps) + 1).tolist() + [len(measurements)];
+
+    # A part of a single measurement cannot be map matched alone, so it is merged into the next part,
+    # or into the previous one if it is the last part
+    parts = [];
+    for part_start, part_end in zip(boundaries[:-1], boundaries[1:]):
+        if len(parts) > 0 and parts[-1][1] - parts[-1][0] < 2:
+            parts[-1] = (parts[-1][0], part_end);
+        else:
+            parts.append((part_start, part_end));
+    if len(parts) > 1 and parts[-1][1] - parts[-1][0] < 2:
+        parts[-2:] = [(parts[-2][0], parts[-1][1])];
+
+    core_size = max(1, max_size - 2 * overlap);
+    chunks = [];
+    for part_start, part_end in parts:
+        number_of_chunks = math.ceil((part_end - part_start) / core_size);
+        size = math.ceil((part_end - part_start) / number_of_chunks);
+        for core_start in range(part_start, part_end, size):
+            core_end = min(core_start + size, part_end);
+            chunks.append((max(part_start, core_start - overlap), min(part_end, core_end + overlap), core_start, core_end));
+    return chunks;
+
+
+def is_chunk_too_big_error(error: requests.exceptions.RequestException) -> bool:
+    """
+    Returns whether an error of the map matching service means that the chunk was too big for it: the response
+    timed out, or the request was rejected because of its size (413, or 400 with one of VALHALLA_SIZE_ERROR_CODES).
+    Other errors, such as connection errors or 429 and 5xx responses, would happen for smaller chunks too.
+
+    :param error: Error raised by the request to the map matching service
+    :type error: requests.exceptions.RequestException
+    """
+    if isinstance(error, requests.exceptions.ReadTimeout):
+        return True;
+
+    response = error.response;
+    if response == None:
+        return False;
+    if response.status_code == 413:
+        return True;
+    if response.status_code == 400:
+        try:
+            return json.loads(response.text).get('error_code') in VALHALLA_SIZE_ERROR_CODES;
+        except (ValueError, AttributeError):
+            return False;
+    return False;
+
+
+def map_match_chunk_or_split(measurements, chunk, overlap = CHUNK_OVERLAP, points = None):
+    """
+    Map matches a chunk of a trace. If the map matching service times out or rejects the chunk because of its
+    size, the chunk is split in two halves, which overlap as any other split, and they are map matched separately.
+    Any other error is raised.
+
+    :param measurements: Trace of measurements.
+    :type measurements: List[Measurement]
+    :param chunk: Positions (start, end, core_start, core_end) of the chunk in the trace.
+    :type chunk: Tuple[int, int, int, int]
+    :param overlap: Number of measurements added on each side of a split.
+    :type overlap: int
+    :param points: Raw positions and timestamps of the measurements of the trace, as returned by format_for_map_matching.
+        By default they are formatted from the measurements.
+    :type points: List[[float, float, int]]
+
+    """
+    if points == None:
+        points = format_for_map_matching(measurements);
+
+    start, end, core_start, core_end = chunk;
+    # split_in_chunks only leaves a single measurement alone when it is the whole trace
+    if end - start < 2:
+        print("Skipping trace with {} measurement, which cannot be map matched alone".format(end - start));
+        return [], [], [];
+
+    try:
+        return map_match_chunk(measurements[start:end], core_start - start, core_end - start, points=points[start:end]);
+    except requests.exceptions.RequestException as error:
+        if not is_chunk_too_big_error(error) or core_end - core_start < 2 * CHUNK_MIN_SIZE:
+            raise;
+        print("Splitting chunk of {} measurements after error: {}".format(end - start, error));
+
+    middle = (core_start + core_end) // 2;
+    first_half = (max(start, core_start - overlap), min(end, middle + overlap), core_start, middle);
+    second_half = (max(start, middle - overlap), min(end, core_end + overlap), middle, core_end);
+
+    measurements_of_chunk, ways_of_chunk, nodes_of_chunk = map_match_chunk_or_split(measurements, first_half, overlap, points);
+    measurements_of_half, ways_of_half, nodes_of_half = map_match_chunk_or_split(measurements, second_half, overlap, points);
+    measurements_of_chunk.extend(measurements_of_half);
+    return measurements_of_chunk, get_unique_ways(ways_of_chunk + ways_of_half), get_unique_nodes(nodes_of_chunk + nodes_of_half);
+
+
+def timed_map_match_chunk(chunk_index, measurements, chunk, points = None):
+    """
+    Map matches a chunk of a trace and prints how long it took.
+
+    :param chunk_index: Position of the chunk in the trip.
+    :type chunk_index: int
+    :param measurements: Trace of measurements.
+    :type measurements: List[Measurement]
+    :param chunk: Positions (start, end, core_start, core_end) of the chunk in the trace.
+    :type chunk: Tuple[int, int, int, int]
+    :param points: Raw positions and timestamps of the measurements of the trace, as returned by format_for_map_matching.
+    :type points: List[[float, float, int]]
+
+    """
+    start = time.perf_counter();
+    res = map_match_chunk_or_split(measurements, chunk, points=points);
+    print("Chunk {} with {} measurements map matched in {:.2f} s".format(chunk_index, chunk[1] - chunk[0], time.perf_counter() - start));
+    return res;
+
+
+def map_match_measurements(formatted_measurements, workers = MAP_MATCHING_WORKERS):
+    """
+    Separates formatted measurements in chunks and map matches them separately. Up to as many chunks as workers
+    are map matched at the same time, and the results are put back in the order of the chunks. The points sent
+    to the map matcher are formatted once for the whole trace before any chunk is map matched, so the chunks
+    always see the raw positions of the measurements they share, whatever the order in which they finish.
+
+    :param formatted_measurements: Measurements to be map matched, as columns or as a list of views.
+    :type formatted_measurements: MeasurementColumns
+    :param workers: Maximum number of chunks that are map matched concurrently.
+    :type workers: int
+
+    """
     measurements = []
-    nodes = [];
-    ways = [];
-    chunks = [formatted_measurements[x:x+15000] for x in range(0, len(formatted_measurements), 15000)]
+    nodes = {};
+    ways = {};
+    chunks = split_in_chunks(formatted_measurements);
+    points = format_for_map_matching(formatted_measurements);
 
-    for chunk in chunks: 
-        measurements_of_chunk, ways_of_chunk, nodes_of_chunk = map_match_chunk(chunk);
-        
-        measurements = measurements + measurements_of_chunk;
-        nodes = nodes + nodes_of_chunk;
-        ways = ways + ways_of_chunk;
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = executor.map(timed_map_match_chunk, range(len(chunks)), [formatted_measurements] * len(chunks), chunks, [points] * len(chunks));
+
+        for measurements_of_chunk, ways_of_chunk, nodes_of_chunk in results: 
+            measurements.extend(measurements_of_chunk);
+            add_unique_by_id(nodes, nodes_of_chunk);
+            add_unique_by_id(ways, ways_of_chunk);
 
-    return measurements, get_unique_nodes(nodes), get_unique_ways(ways);
+    return measurements, list(nodes.values()), list(ways.values());
 
 
 def classify_ways(way_ids):
@@ -174,20 +688,25 @@ def classify_ways(way_ids):
     return computed_ways, not_computed_ways;
 
 
+def add_unique_by_id(elements_per_id: Dict, elements: List):
+    """
+    Adds elements to a dictionary keyed by their id, keeping the first element added for every id.
+
+    :param elements_per_id: Dictionary of elements by id
+    :type elements_per_id: Dict
+    :param elements: Elements to add, such as Nodes or Ways
+    :type elements: List
+    """
+    for element in elements:
+        if element.id not in elements_per_id:
+            elements_per_id[element.id] = element;
+
 def get_unique_nodes(nodes):
-    res = [];
-    nodes_ids = [];
-    for node in nodes:
-        if node.id not in nodes_ids:
-            nodes_ids.append(node.id);
-            res.append(node);
-    return res;
+    res = {};
+    add_unique_by_id(res, nodes);
+    return list(res.values());
 
 def get_unique_ways(ways):
-    res = [];
-    ways_ids = [];
-    for way in ways:
-        if way.id not in ways_ids:
-            ways_ids.append(way.id);
-            res.append(way);
-    return res;
+    res = {};
+    add_unique_by_id(res, ways);
+    return list(res.values());
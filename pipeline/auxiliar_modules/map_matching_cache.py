@@ -0,0 +1,117 @@
+import hashlib;
+import json;
+import os;
+import threading;
+from typing import Dict
+
+
+#<-------------- MAP MATCHING CACHE ------------->
+
+# Results of the map matching service are stored in JSON files named after the hash of the request that produced them.
+# The request contains the coordinates, the timestamps and the options of the trace, so any change on them changes the key.
+
+_eviction_lock = threading.Lock();
+
+
+def get_map_matching_cache_directory() -> str:
+    """
+    Returns the directory where the map matching results are stored. It can be set with the MAP_MATCHING_CACHE_DIR environment variable.
+    """
+    return os.getenv('MAP_MATCHING_CACHE_DIR', os.path.join('cache', 'map_matching'));
+
+
+def get_map_matching_cache_max_size() -> int:
+    """
+    Returns the maximum size in bytes of the map matching cache. It can be set with the MAP_MATCHING_CACHE_MAX_BYTES environment variable.
+    """
+    return int(os.getenv('MAP_MATCHING_CACHE_MAX_BYTES', 512 * 1024 * 1024));
+
+
+def get_map_matching_cache_key(request: str) -> str:
+    """
+    Returns the key of a map matching request in the cache.
+
+    :param request: Body of the request sent to the map matching service
+    :type request: str
+    """
+    return hashlib.sha256(request.encode('utf-8')).hexdigest();
+
+
+def get_map_matching_cache_path(key: str) -> str:
+    """
+    Returns the path of the file that stores the result of a map matching request.
+
+    :param key: Key of the request in the cache
+    :type key: str
+    """
+    return os.path.join(get_map_matching_cache_directory(), key + '.json');
+
+
+def read_cached_map_matching(key: str) -> Dict:
+    """
+    Returns the cached result of a map matching request, with the way ids of its edges in "way_ids",
+    its matched points in "matched_points" and the positions along its edges in "edge_shapes",
+    or None if the request is not cached.
+
+    :param key: Key of the request in the cache
+    :type key: str
+    """
+    path = get_map_matching_cache_path(key);
+    try:
+        with open(path, 'r') as file:
+            result = json.load(file);
+        os.utime(path);
+        return result;
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None;
+
+
+def write_cached_map_matching(key: str, way_ids, matched_points, edge_shapes = None):
+    """
+    Stores the result of a map matching request in the cache and evicts the least recently used results
+    if the cache exceeds its maximum size.
+
+    :param key: Key of the request in the cache
+    :type key: str
+    :param way_ids: Way ids of the edges of the map matched trace
+    :type way_ids: List[int]
+    :param matched_points: Map matched points of the trace
+    :type matched_points: List[Dict]
+    :param edge_shapes: Positions along the edges of the map matched trace, or None for unknown edges
+    :type edge_shapes: List[List[List[float]]]
+    """
+    path = get_map_matching_cache_path(key);
+    os.makedirs(os.path.dirname(path), exist_ok=True);
+
+    temporary_path = '{}.{}.tmp'.format(path, threading.get_ident());
+    with open(temporary_path, 'w') as file:
+        json.dump({'way_ids': way_ids, 'matched_points': matched_points, 'edge_shapes': edge_shapes}, file);
+    os.replace(temporary_path, path);
+
+    evict_map_matching_cache(get_map_matching_cache_max_size());
+
+
+def evict_map_matching_cache(max_size: int):
+    """
+    Deletes the least recently used results of the cache until its size is below the maximum size.
+
+    :param max_size: Maximum size of the cache in bytes
+    :type max_size: int
+    """
+    with _eviction_lock:
+        directory = get_map_matching_cache_directory();
+        entries = [];
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.endswith('.json'):
+                stat = entry.stat();
+                entries.append((stat.st_mtime, stat.st_size, entry.path));
+
+        size = sum(entry[1] for entry in entries);
+        for _, entry_size, entry_path in sorted(entries):
+            if size <= max_size:
+                break;
+            try:
+                os.remove(entry_path);
+            except FileNotFoundError:
+                pass;
+            size = size - entry_size;
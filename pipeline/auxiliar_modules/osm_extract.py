@@ -0,0 +1,94 @@
+import xml.etree.ElementTree as ElementTree;
+from typing import List, Tuple
+
+from auxiliar_modules.auxiliar_classes import Node, Way;
+
+try:
+    import osmium;
+except ImportError:
+    osmium = None;
+
+
+#<-------------- OSM EXTRACTS ------------->
+
+
+def load_osm_extract(path: str) -> Tuple[List[Node], List[Way]]:
+    """
+    Loads the roads (ways with a highway tag) and their nodes from a local OSM extract. XML extracts (.osm, .xml)
+    are parsed incrementally with the standard library, while PBF extracts (.pbf) need the osmium package.
+
+    :param path: Path of the OSM extract
+    :type path: str
+    """
+    if path.endswith('.pbf'):
+        return load_osm_pbf_extract(path);
+    return load_osm_xml_extract(path);
+
+
+def load_osm_xml_extract(path: str) -> Tuple[List[Node], List[Way]]:
+    """
+    Loads the roads (ways with a highway tag) and their nodes from a local OSM XML extract.
+
+    :param path: Path of the OSM XML extract
+    :type path: str
+    """
+    coordinates = {};
+    ways = [];
+
+    for _, element in ElementTree.iterparse(path, events=('end',)):
+        if element.tag == 'node':
+            coordinates[int(element.get('id'))] = (float(element.get('lat')), float(element.get('lon')));
+            element.clear();
+        elif element.tag == 'way':
+            is_road = any(tag.get('k') == 'highway' for tag in element.iter('tag'));
+            if is_road:
+                way_nodes = [int(nd.get('ref')) for nd in element.iter('nd')];
+                ways.append(Way(int(element.get('id')), way_nodes));
+            element.clear();
+
+    return get_nodes_of_ways(coordinates, ways), ways;
+
+
+def load_osm_pbf_extract(path: str) -> Tuple[List[Node], List[Way]]:
+    """
+    Loads the roads (ways with a highway tag) and their nodes from a local OSM PBF extract.
+
+    :param path: Path of the OSM PBF extract
+    :type path: str
+    """
+    if osmium == None:
+        raise ImportError('The osmium package is needed to load OSM PBF extracts');
+
+    coordinates = {};
+    ways = [];
+
+    class RoadsHandler(osmium.SimpleHandler):
+        def node(self, node):
+            coordinates[node.id] = (node.location.lat, node.location.lon);
+
+        def way(self, way):
+            if 'highway' in way.tags:
+                ways.append(Way(way.id, [nd.ref for nd in way.nodes]));
+
+    RoadsHandler().apply_file(path);
+    return get_nodes_of_ways(coordinates, ways), ways;
+
+
+def get_nodes_of_ways(coordinates, ways: List[Way]) -> List[Node]:
+    """
+    Returns the nodes referenced by the ways passed as parameter. Ways that reference nodes missing
+    from the extract keep only the nodes that are present.
+
+    :param coordinates: Latitude and longitude of every node of the extract, by id
+    :type coordinates: Dict
+    :param ways: Ways of the extract
+    :type ways: List[Way]
+    """
+    nodes = {};
+    for way in ways:
+        way.nodes = [node_id for node_id in way.nodes if node_id in coordinates];
+        for node_id in way.nodes:
+            if node_id not in nodes:
+                lat, lon = coordinates[node_id];
+                nodes[node_id] = Node(node_id, lat, lon);
+    return list(nodes.values());
@@ -0,0 +1,189 @@
+import json;
+import os;
+import sqlite3;
+import sys;
+import threading;
+import time;
+from typing import Dict, List, Tuple
+
+from auxiliar_modules.auxiliar_classes import Node, Way;
+from auxiliar_modules.osm_extract import load_osm_extract;
+
+
+class OSMStore(object):
+    """This is a conceptual class representation of the local store of OSM ways and nodes. It keeps in a SQLite database
+    the node lists of the ways and the coordinates of the nodes retrieved from the Overpass server or loaded from
+    an OSM extract, so they are only requested once. Ways that the Overpass server did not return in a complete result
+    (because they are not roads) are stored without nodes and with the time they were checked, so they are not
+    requested again until NOT_ROAD_TTL has passed.
+    It is programmed as a Singleton so one instance exists at the same time and so it can be accessed from any point
+    in the pipeline.
+    """
+
+    # Maximum number of ids in a single SQLite query
+    QUERY_SIZE = 900;
+
+    # Seconds during which a way stored as not being a road is not requested again
+    NOT_ROAD_TTL = 30 * 24 * 3600;
+
+    #### SINGLETON ####
+
+    _instance = None
+    # Creates the instance only once when many threads ask for it at the same time
+    _instance_lock = threading.Lock()
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._instance_lock:
+                if not cls._instance:
+                    instance = super(OSMStore, cls).__new__(cls, *args, **kwargs)
+                    instance.connection = None;
+                    instance.lock = threading.Lock();
+                    cls._instance = instance;
+        return cls._instance
+
+
+    #### DATABASE ####
+
+    def get_path(self) -> str:
+        """
+        Returns the path of the SQLite database. It can be set with the OSM_STORE_PATH environment variable.
+        """
+        return os.getenv('OSM_STORE_PATH', os.path.join('cache', 'osm.sqlite'));
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Returns the connection to the SQLite database, creating the database and its tables the first time.
+        """
+        if self.connection == None:
+            path = self.get_path();
+            if os.path.dirname(path) != '':
+                os.makedirs(os.path.dirname(path), exist_ok=True);
+            self.connection = sqlite3.connect(path, check_same_thread=False);
+            self.connection.execute('CREATE TABLE IF NOT EXISTS "ways" ("id" INTEGER PRIMARY KEY, "nodes" TEXT, "checked_at" REAL)');
+            self.connection.execute('CREATE TABLE IF NOT EXISTS "nodes" ("id" INTEGER PRIMARY KEY, "lat" REAL, "lon" REAL)');
+            # Stores created before ways not being roads expired have no "checked_at" column
+            columns = [row[1] for row in self.connection.execute('PRAGMA table_info("ways")').fetchall()];
+            if 'checked_at' not in columns:
+                self.connection.execute('ALTER TABLE "ways" ADD COLUMN "checked_at" REAL');
+            self.connection.commit();
+        return self.connection;
+
+    def select_by_ids(self, table: str, columns: str, ids: List[int]) -> List[Tuple]:
+        """
+        Returns the rows of a table whose id is in the list of ids passed as parameter.
+
+        :param table: Name of the table
+        :type table: str
+        :param columns: Columns to select
+        :type columns: str
+        :param ids: Ids of the rows
+        :type ids: List[int]
+        """
+        rows = [];
+        ids = list(ids);
+        with self.lock:
+            connection = self.connect();
+            for x in range(0, len(ids), self.QUERY_SIZE):
+                chunk = ids[x:x + self.QUERY_SIZE];
+                sql = 'SELECT {} FROM "{}" WHERE "id" IN ({})'.format(columns, table, ','.join('?' * len(chunk)));
+                rows.extend(connection.execute(sql, chunk).fetchall());
+        return rows;
+
+
+    #### WAYS AND NODES ####
+
+    def get_ways(self, way_ids: List[int]) -> Tuple[List[Way], List[int]]:
+        """
+        Returns the stored ways with the ids passed as parameter, and the ids that are not in the store.
+        Ways stored as not being roads are neither returned nor missing, unless they were checked more than
+        NOT_ROAD_TTL seconds ago, in which case they are missing so they are checked again.
+
+        :param way_ids: Ids of the ways
+        :type way_ids: List[int]
+        """
+        rows = self.select_by_ids('ways', '"id", "nodes", "checked_at"', way_ids);
+        found: Dict = {row[0]: row for row in rows};
+        expiration = time.time() - self.NOT_ROAD_TTL;
+
+        ways = [];
+        missing = [];
+        for way_id in dict.fromkeys(way_ids):
+            row = found.get(way_id);
+            if row == None:
+                missing.append(way_id);
+            elif row[1] != None:
+                ways.append(Way(way_id, json.loads(row[1])));
+            elif row[2] == None or row[2] < expiration:
+                missing.append(way_id);
+        return ways, missing;
+
+    def get_nodes(self, node_ids: List[int]) -> Tuple[List[Node], List[int]]:
+        """
+        Returns the stored nodes with the ids passed as parameter, and the ids that are not in the store.
+
+        :param node_ids: Ids of the nodes
+        :type node_ids: List[int]
+        """
+        rows = self.select_by_ids('nodes', '"id", "lat", "lon"', node_ids);
+        found: Dict = {row[0]: Node(row[0], row[1], row[2]) for row in rows};
+
+        nodes = [];
+        missing = [];
+        for node_id in dict.fromkeys(node_ids):
+            if node_id in found:
+                nodes.append(found[node_id]);
+            else:
+                missing.append(node_id);
+        return nodes, missing;
+
+    def insert(self, nodes: List[Node], ways: List[Way], not_road_way_ids: List[int] = []):
+        """
+        Stores ways and nodes. Existing ways and nodes with the same ids are replaced.
+
+        :param nodes: Nodes to store
+        :type nodes: List[Node]
+        :param ways: Ways to store
+        :type ways: List[Way]
+        :param not_road_way_ids: Ids of ways that are stored without nodes because they are not roads. Only the
+            time they were checked is updated for the ones already stored, and stored roads are kept.
+        :type not_road_way_ids: List[int]
+        """
+        checked_at = time.time();
+        with self.lock:
+            connection = self.connect();
+            connection.executemany('INSERT OR REPLACE INTO "nodes" VALUES (?, ?, ?)', [(node.id, float(node.lat), float(node.lon)) for node in nodes]);
+            connection.executemany('INSERT OR REPLACE INTO "ways" VALUES (?, ?, NULL)', [(way.id, json.dumps(way.nodes)) for way in ways]);
+            connection.executemany('INSERT INTO "ways" VALUES (?, NULL, ?) ON CONFLICT("id") DO UPDATE SET "checked_at" = excluded."checked_at" WHERE "nodes" IS NULL',
+                [(way_id, checked_at) for way_id in not_road_way_ids]);
+            connection.commit();
+
+    def forget_not_road_ways(self):
+        """
+        Deletes all the ways stored as not being roads, so they are requested again the next time they are needed.
+        """
+        with self.lock:
+            connection = self.connect();
+            connection.execute('DELETE FROM "ways" WHERE "nodes" IS NULL');
+            connection.commit();
+
+    def seed_from_osm_extract(self, path: str):
+        """
+        Stores all the roads and their nodes of a local OSM extract.
+
+        :param path: Path of the OSM extract
+        :type path: str
+        """
+        nodes, ways = load_osm_extract(path);
+        self.insert(nodes, ways);
+        print("Stored {} ways and {} nodes from {}".format(len(ways), len(nodes), path));
+
+
+if __name__ == "__main__":
+
+    # Seeds the store from the OSM extracts passed as arguments: python -m auxiliar_modules.osm_store extract.osm
+    # With --forget-not-roads, the ways stored as not being roads are deleted first.
+    for argument in sys.argv[1:]:
+        if argument == '--forget-not-roads':
+            OSMStore().forget_not_road_ways();
+        else:
+            OSMStore().seed_from_osm_extract(argument);
@@ -0,0 +1,243 @@
+import math;
+import numpy as np
+from typing import Dict, List, Tuple
+
+from auxiliar_modules.geodesy import EARTH_RADIUS;
+
+
+class SegmentsIndex:
+    """This is a conceptual class representation of a spatial index of road segments by way. Segments are projected to
+    local equirectangular coordinates in meters once, and stored in the cells of a uniform grid covered by their
+    bounding box, with a separate grid per way. The candidates of a point are the segments of its way in the cells
+    around it, and the nearest one is found with an exact point to segment distance.
+
+    :param segments: Segments to index. They need the attributes id, position_a, position_b and way.
+    :type segments: List[Segment]
+    :param cell_size: Side of the cells of the grid in meters.
+    :type cell_size: float
+    """
+
+    # Maximum number of point and segment pairs compared at once by get_nearest_segments_in_way
+    BLOCK_SIZE = 1000000;
+
+    def __init__(self, segments: List, cell_size: float = 50):
+        self.cell_size: float = cell_size;
+        self.ids: np.ndarray = np.array([segment.id for segment in segments], dtype=np.int64);
+        self.segments_per_way: Dict = {};
+        for segment in range(len(segments)):
+            self.segments_per_way.setdefault(segments[segment].way, []).append(segment);
+        self.segments_per_way = {way: np.array(positions, dtype=np.int64) for way, positions in self.segments_per_way.items()};
+
+        lat_a = np.array([float(segment.position_a[0]) for segment in segments], dtype=np.float64);
+        lon_a = np.array([float(segment.position_a[1]) for segment in segments], dtype=np.float64);
+        lat_b = np.array([float(segment.position_b[0]) for segment in segments], dtype=np.float64);
+        lon_b = np.array([float(segment.position_b[1]) for segment in segments], dtype=np.float64);
+        self.cos_origin: float = math.cos(math.radians(float(np.mean(lat_a)))) if len(segments) > 0 else 1.0;
+        self.ax, self.ay = self.project(lat_a, lon_a);
+        self.bx, self.by = self.project(lat_b, lon_b);
+        self.build_grid();
+
+    def build_grid(self):
+        """
+        Stores the segments in the cells covered by their bounding box. Every cell of every way gets an integer key,
+        and the positions of the segments are kept sorted by the keys of their cells, so the segments of a cell are
+        found with a binary search.
+        """
+        self.way_indexes: Dict = {way: index for index, way in enumerate(self.segments_per_way.keys())};
+        segment_ways = np.zeros(len(self.ids), dtype=np.int64);
+        for way, positions in self.segments_per_way.items():
+            segment_ways[positions] = self.way_indexes[way];
+
+        min_cx = np.floor(np.minimum(self.ax, self.bx) / self.cell_size).astype(np.int64);
+        max_cx = np.floor(np.maximum(self.ax, self.bx) / self.cell_size).astype(np.int64);
+        min_cy = np.floor(np.minimum(self.ay, self.by) / self.cell_size).astype(np.int64);
+        max_cy = np.floor(np.maximum(self.ay, self.by) / self.cell_size).astype(np.int64);
+        self.origin_cx: int = int(np.min(min_cx)) - 1 if len(self.ids) > 0 else 0;
+        self.origin_cy: int = int(np.min(min_cy)) - 1 if len(self.ids) > 0 else 0;
+        self.columns: int = int(np.max(max_cx)) - self.origin_cx + 2 if len(self.ids) > 0 else 1;
+        self.rows: int = int(np.max(max_cy)) - self.origin_cy + 2 if len(self.ids) > 0 else 1;
+
+        # One entry per segment and cell covered by its bounding box
+        widths = max_cx - min_cx + 1;
+        heights = max_cy - min_cy + 1;
+        counts = widths * heights;
+        segments = np.repeat(np.arange(len(self.ids), dtype=np.int64), counts);
+        cells = np.arange(int(np.sum(counts)), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts);
+        cx = min_cx[segments] + cells % widths[segments];
+        cy = min_cy[segments] + cells // widths[segments];
+
+        keys = self.get_cell_keys(segment_ways[segments], cx, cy);
+        order = np.argsort(keys, kind='stable');
+        self.cell_keys: np.ndarray = keys[order];
+        self.cell_segments: np.ndarray = segments[order];
+
+    def get_cell_keys(self, way_indexes: np.ndarray, cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+        """
+        Returns the keys of cells of the grids of the ways.
+
+        :param way_indexes: Positions of the ways in the index
+        :type way_indexes: np.ndarray
+        :param cx: Columns of the cells
+        :type cx: np.ndarray
+        :param cy: Rows of the cells
+        :type cy: np.ndarray
+        """
+        return (way_indexes * self.rows + (cy - self.origin_cy)) * self.columns + (cx - self.origin_cx);
+
+    def project(self, lat, lon):
+        """
+        Returns the local equirectangular coordinates in meters of geographical points.
+
+        :param lat: Latitudes of the points
+        :type lat: np.ndarray
+        :param lon: Longitudes of the points
+        :type lon: np.ndarray
+        """
+        x = np.radians(lon) * EARTH_RADIUS * self.cos_origin;
+        y = np.radians(lat) * EARTH_RADIUS;
+        return x, y;
+
+    def get_nearest_segments_in_way(self, lat: np.ndarray, lon: np.ndarray, way_id: int, max_distance: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns, for many geographical points of the same way, the id of the nearest segment of the way, the distance
+        in meters to it and the distance in meters from the first position of the segment to the projection of the point.
+        Points farther than the maximum distance from every segment get the id -1 and NaN distances.
+
+        The candidates of every point are the segments of the way in the cells of the grid that are closer than the
+        maximum distance. If these cells are more than the segments of the way, as for an infinite maximum distance,
+        every point is compared with all the segments of the way instead, which gives the same result.
+
+        :param lat: Latitudes of the points
+        :type lat: np.ndarray
+        :param lon: Longitudes of the points
+        :type lon: np.ndarray
+        :param way_id: Id of the way
+        :type way_id: int
+        :param max_distance: Maximum distance in meters from a point to its segment
+        :type max_distance: float
+        """
+        segment_ids = np.full(len(lat), -1, dtype=np.int64);
+        distances = np.full(len(lat), np.nan);
+        distances_along = np.full(len(lat), np.nan);
+        candidates = self.segments_per_way.get(way_id);
+        if candidates is None or len(lat) == 0:
+            return segment_ids, distances, distances_along;
+
+        x, y = self.project(np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64));
+        span = math.floor(2 * max_distance / self.cell_size) + 2 if math.isfinite(max_distance) else math.inf;
+        if span * span >= len(candidates):
+            nearest, nearest_distances, nearest_distances_along = self.get_nearest_segments(x, y, candidates);
+        else:
+            nearest, nearest_distances, nearest_distances_along = self.get_nearest_segments_in_grid(x, y, self.way_indexes[way_id], max_distance, span);
+
+        found = (nearest >= 0) & (nearest_distances <= max_distance);
+        segment_ids[found] = self.ids[nearest[found]];
+        distances[found] = nearest_distances[found];
+        distances_along[found] = nearest_distances_along[found];
+        return segment_ids, distances, distances_along;
+
+    def get_nearest_segments(self, x: np.ndarray, y: np.ndarray, candidates: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns, for many points, the position in the index of the nearest of some segments, the distance in meters
+        to it and the distance in meters from the first position of the segment to the projection of the point.
+        All the points are projected onto all the segments at once.
+
+        :param x: X coordinates of the points in meters
+        :type x: np.ndarray
+        :param y: Y coordinates of the points in meters
+        :type y: np.ndarray
+        :param candidates: Positions of the segments in the index
+        :type candidates: np.ndarray
+        """
+        res = np.full(len(x), -1, dtype=np.int64);
+        distances = np.full(len(x), np.nan);
+        distances_along = np.full(len(x), np.nan);
+
+        ax = self.ax[candidates];
+        ay = self.ay[candidates];
+        dx = self.bx[candidates] - ax;
+        dy = self.by[candidates] - ay;
+        squared_length = dx * dx + dy * dy;
+        length = np.sqrt(squared_length);
+
+        block = max(1, self.BLOCK_SIZE // len(candidates));
+        for start in range(0, len(x), block):
+            end = min(start + block, len(x));
+            px = x[start:end, None] - ax[None, :];
+            py = y[start:end, None] - ay[None, :];
+            t = np.divide(px * dx + py * dy, squared_length, out=np.zeros(px.shape), where=squared_length > 0);
+            t = np.clip(t, 0, 1);
+            block_distances = np.hypot(px - t * dx, py - t * dy);
+
+            nearest = np.argmin(block_distances, axis=1);
+            rows = np.arange(end - start);
+            res[start:end] = candidates[nearest];
+            distances[start:end] = block_distances[rows, nearest];
+            distances_along[start:end] = t[rows, nearest] * length[nearest];
+
+        return res, distances, distances_along;
+
+    def get_nearest_segments_in_grid(self, x: np.ndarray, y: np.ndarray, way_index: int, max_distance: float, span: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns, for many points of the same way, the position in the index of the nearest segment of the way among the
+        segments in the cells closer than the maximum distance, the distance in meters to it and the distance in meters
+        from the first position of the segment to the projection of the point. Points without candidates get -1.
+
+        :param x: X coordinates of the points in meters
+        :type x: np.ndarray
+        :param y: Y coordinates of the points in meters
+        :type y: np.ndarray
+        :param way_index: Position of the way in the index
+        :type way_index: int
+        :param max_distance: Maximum distance in meters from a point to its segment
+        :type max_distance: float
+        :param span: Number of cells per side of the square of cells searched around every point
+        :type span: int
+        """
+        res = np.full(len(x), -1, dtype=np.int64);
+        distances = np.full(len(x), np.nan);
+        distances_along = np.full(len(x), np.nan);
+
+        block = max(1, self.BLOCK_SIZE // (span * span));
+        offsets = np.arange(span, dtype=np.int64);
+        for start in range(0, len(x), block):
+            end = min(start + block, len(x));
+            # Cells of the square around every point, without the ones beyond the maximum distance
+            first_cx = np.floor((x[start:end] - max_distance) / self.cell_size).astype(np.int64);
+            first_cy = np.floor((y[start:end] - max_distance) / self.cell_size).astype(np.int64);
+            last_cx = np.floor((x[start:end] + max_distance) / self.cell_size).astype(np.int64);
+            last_cy = np.floor((y[start:end] + max_distance) / self.cell_size).astype(np.int64);
+            cx = (first_cx[:, None, None] + offsets[None, None, :]) + np.zeros((1, span, 1), dtype=np.int64);
+            cy = (first_cy[:, None, None] + offsets[None, :, None]) + np.zeros((1, 1, span), dtype=np.int64);
+            valid = (cx <= last_cx[:, None, None]) & (cy <= last_cy[:, None, None]);
+            valid &= (cx >= self.origin_cx) & (cx < self.origin_cx + self.columns) & (cy >= self.origin_cy) & (cy < self.origin_cy + self.rows);
+            points = np.broadcast_to(np.arange(start, end)[:, None, None], cx.shape)[valid];
+            keys = self.get_cell_keys(way_index, cx[valid], cy[valid]);
+
+            # Point and segment pairs of the segments in the cells of every point
+            first = np.searchsorted(self.cell_keys, keys, side='left');
+            counts = np.searchsorted(self.cell_keys, keys, side='right') - first;
+            pair_points = np.repeat(points, counts);
+            pair_segments = self.cell_segments[np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(int(np.sum(counts)), dtype=np.int64)];
+            if len(pair_points) == 0:
+                continue;
+
+            ax = self.ax[pair_segments];
+            ay = self.ay[pair_segments];
+            dx = self.bx[pair_segments] - ax;
+            dy = self.by[pair_segments] - ay;
+            px = x[pair_points] - ax;
+            py = y[pair_points] - ay;
+            squared_length = dx * dx + dy * dy;
+            t = np.divide(px * dx + py * dy, squared_length, out=np.zeros(len(px)), where=squared_length > 0);
+            t = np.clip(t, 0, 1);
+            pair_distances = np.hypot(px - t * dx, py - t * dy);
+
+            # The nearest segment of every point, the first of the way if many are as near
+            order = np.lexsort((pair_segments, pair_distances, pair_points));
+            nearest = order[np.concatenate(([True], pair_points[order][1:] != pair_points[order][:-1]))];
+            res[pair_points[nearest]] = pair_segments[nearest];
+            distances[pair_points[nearest]] = pair_distances[nearest];
+            distances_along[pair_points[nearest]] = t[nearest] * np.sqrt(squared_length[nearest]);
+
+        return res, distances, distances_along;
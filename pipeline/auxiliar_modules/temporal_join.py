@@ -0,0 +1,32 @@
+import numpy as np
+
+
+def get_nearest_in_time(sorted_timestamps: np.ndarray, timestamps: np.ndarray, max_gap: float = None) -> np.ndarray:
+    """
+    Returns, for every timestamp, the position of the nearest timestamp in a sorted array, as pandas merge_asof does
+    with direction 'nearest'. When both neighbours are equally close, the earlier one is chosen. Timestamps without
+    a neighbour closer than the maximum gap get the position -1.
+
+    :param sorted_timestamps: Timestamps to join, sorted in increasing order
+    :type sorted_timestamps: np.ndarray
+    :param timestamps: Timestamps of reference, in any order
+    :type timestamps: np.ndarray
+    :param max_gap: Maximum difference between joined timestamps. If None, there is no maximum.
+    :type max_gap: float
+    """
+    timestamps = np.asarray(timestamps);
+    if len(sorted_timestamps) == 0:
+        return np.full(len(timestamps), -1, dtype=np.int64);
+
+    next = np.searchsorted(sorted_timestamps, timestamps, side='left');
+    previous = np.searchsorted(sorted_timestamps, timestamps, side='right') - 1;
+    has_next = next < len(sorted_timestamps);
+    has_previous = previous >= 0;
+
+    next_gap = np.where(has_next, sorted_timestamps[np.minimum(next, len(sorted_timestamps) - 1)] - timestamps, np.inf);
+    previous_gap = np.where(has_previous, timestamps - sorted_timestamps[np.maximum(previous, 0)], np.inf);
+
+    res = np.where(next_gap < previous_gap, next, previous).astype(np.int64);
+    if max_gap != None:
+        res[np.minimum(next_gap, previous_gap) > max_gap] = -1;
+    return res;
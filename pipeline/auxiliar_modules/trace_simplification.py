@@ -0,0 +1,199 @@
+import math;
+import numpy as np
+from collections import namedtuple
+from typing import Dict, List
+
+from auxiliar_modules.geodesy import EARTH_RADIUS;
+from auxiliar_modules.spatial_index import SegmentsIndex;
+
+# Segment of the shape of an edge of a map matched trace, indexed by the position of the edge as its way
+EdgeSegment = namedtuple('EdgeSegment', ['id', 'position_a', 'position_b', 'way']);
+
+
+def simplify_trace(points: List, tolerance: float) -> List[int]:
+    """
+    Returns the positions of the points of a trace that are kept by the Douglas-Peucker algorithm. The first and the
+    last points are always kept, and any point farther than the tolerance from the simplified trace is kept too.
+
+    :param points: Trace of data points.
+    :type points: List[[float, float, int]]
+    :param tolerance: Maximum distance in meters from a dropped point to the simplified trace.
+    :type tolerance: float
+    """
+    if len(points) < 3:
+        return list(range(len(points)));
+
+    lat = np.array([float(p[0]) for p in points], dtype=np.float64);
+    lon = np.array([float(p[1]) for p in points], dtype=np.float64);
+    x = np.radians(lon) * EARTH_RADIUS * math.cos(math.radians(float(np.mean(lat))));
+    y = np.radians(lat) * EARTH_RADIUS;
+
+    keep = np.zeros(len(points), dtype=bool);
+    keep[0] = True;
+    keep[-1] = True;
+    stack = [(0, len(points) - 1)];
+    while len(stack) > 0:
+        first, last = stack.pop();
+        if last - first < 2:
+            continue;
+
+        dx = x[last] - x[first];
+        dy = y[last] - y[first];
+        px = x[first + 1:last] - x[first];
+        py = y[first + 1:last] - y[first];
+        squared_length = dx * dx + dy * dy;
+        if squared_length > 0:
+            t = np.clip((px * dx + py * dy) / squared_length, 0, 1);
+            distances = np.hypot(px - t * dx, py - t * dy);
+        else:
+            distances = np.hypot(px, py);
+
+        farthest = int(np.argmax(distances));
+        if distances[farthest] > tolerance:
+            middle = first + 1 + farthest;
+            keep[middle] = True;
+            stack.append((first, middle));
+            stack.append((middle, last));
+
+    return np.flatnonzero(keep).tolist();
+
+
+def get_edges_index(edge_shapes: List):
+    """
+    Returns an index of the segments of the shapes of the edges of a map matched trace, where the way of every
+    segment is the position of its edge, with the segments, the distance in meters from the start of its edge to
+    the start of every segment and the length in meters of every edge.
+
+    :param edge_shapes: Positions [lat, lon] along every edge, or None for the edges whose positions are not known.
+    :type edge_shapes: List[List[List[float]]]
+    """
+    segments = [];
+    for edge_index in range(len(edge_shapes)):
+        shape = edge_shapes[edge_index];
+        if shape == None:
+            continue;
+        for k in range(len(shape) - 1):
+            segments.append(EdgeSegment(len(segments), shape[k], shape[k + 1], edge_index));
+
+    index = SegmentsIndex(segments);
+    lengths = np.hypot(index.bx - index.ax, index.by - index.ay);
+    starts = np.zeros(len(segments));
+    edge_lengths = np.zeros(len(edge_shapes));
+    for segment in segments:
+        starts[segment.id] = edge_lengths[segment.way];
+        edge_lengths[segment.way] += lengths[segment.id];
+    return index, segments, starts, edge_lengths;
+
+
+def reproject_dropped_points(points: List, kept: List[int], matched_points: List[Dict], edge_shapes: List = None) -> List[Dict]:
+    """
+    Returns the map matched points of the whole trace from the map matched points of the simplified trace. Every
+    dropped point is projected onto the nearest shape of the edges between the edges of its kept neighbours, with
+    the same projection as the SegmentsIndex, so the dropped points of curved roads stay on the road. If none of
+    these edges has a known shape, the point is placed between its kept neighbours by interpolating in time, and
+    it takes the edge of the closest neighbour in time. Dropped points next to an unmatched neighbour are unmatched.
+
+    :param points: Trace of data points.
+    :type points: List[[float, float, int]]
+    :param kept: Positions of the points kept in the simplified trace.
+    :type kept: List[int]
+    :param matched_points: Map matched points of the simplified trace.
+    :type matched_points: List[Dict]
+    :param edge_shapes: Positions [lat, lon] along every edge of the map matched trace, or None for the edges whose
+        positions are not known. By default no shape is known.
+    :type edge_shapes: List[List[List[float]]]
+    """
+    if edge_shapes == None:
+        edge_shapes = [];
+    index, segments, starts, edge_lengths = get_edges_index(edge_shapes);
+
+    res: List[Dict] = [None] * len(points);
+    for k in range(len(kept)):
+        res[kept[k]] = matched_points[k];
+
+    for k in range(len(kept) - 1):
+        previous = matched_points[k];
+        next = matched_points[k + 1];
+        first = kept[k];
+        last = kept[k + 1];
+        if last - first < 2:
+            continue;
+
+        if previous['type'] == 'unmatched' or next['type'] == 'unmatched':
+            for i in range(first + 1, last):
+                res[i] = {'type': 'unmatched'};
+            continue;
+
+        lowest_edge = min(previous['edge_index'], next['edge_index']);
+        highest_edge = max(previous['edge_index'], next['edge_index']);
+        edges = [edge for edge in range(lowest_edge, min(highest_edge, len(edge_shapes) - 1) + 1) if edge_shapes[edge] != None];
+        if len(edges) == 0:
+            for i in range(first + 1, last):
+                res[i] = interpolate_dropped_point(points, first, last, i, previous, next);
+            continue;
+
+        # The dropped points are projected onto every candidate edge, and the nearest projection is kept
+        lat = np.array([float(points[i][0]) for i in range(first + 1, last)], dtype=np.float64);
+        lon = np.array([float(points[i][1]) for i in range(first + 1, last)], dtype=np.float64);
+        best_segments = np.full(len(lat), -1, dtype=np.int64);
+        best_distances = np.full(len(lat), np.inf);
+        best_distances_along = np.zeros(len(lat));
+        for edge in edges:
+            segment_ids, distances, distances_along = index.get_nearest_segments_in_way(lat, lon, edge, np.inf);
+            closer = (segment_ids >= 0) & (distances < best_distances);
+            best_segments[closer] = segment_ids[closer];
+            best_distances[closer] = distances[closer];
+            best_distances_along[closer] = distances_along[closer];
+
+        for j in range(len(lat)):
+            segment = segments[best_segments[j]];
+            edge = segment.way;
+            length = math.hypot(index.bx[segment.id] - index.ax[segment.id], index.by[segment.id] - index.ay[segment.id]);
+            t = best_distances_along[j] / length if length > 0 else 0.0;
+            res[first + 1 + j] = {
+                'type': 'interpolated',
+                'lat': float(segment.position_a[0]) + t * (float(segment.position_b[0]) - float(segment.position_a[0])),
+                'lon': float(segment.position_a[1]) + t * (float(segment.position_b[1]) - float(segment.position_a[1])),
+                'edge_index': edge,
+                'distance_along_edge': (starts[segment.id] + best_distances_along[j]) / edge_lengths[edge] if edge_lengths[edge] > 0 else 0.0
+            };
+    return res;
+
+
+def interpolate_dropped_point(points: List, first: int, last: int, i: int, previous: Dict, next: Dict) -> Dict:
+    """
+    Returns the map matched point of a dropped point placed between its kept neighbours by interpolating in time.
+    It takes the edge of the closest neighbour in time.
+
+    :param points: Trace of data points.
+    :type points: List[[float, float, int]]
+    :param first: Position in the trace of the previous kept point.
+    :type first: int
+    :param last: Position in the trace of the next kept point.
+    :type last: int
+    :param i: Position in the trace of the dropped point.
+    :type i: int
+    :param previous: Map matched point of the previous kept point.
+    :type previous: Dict
+    :param next: Map matched point of the next kept point.
+    :type next: Dict
+    """
+    elapsed = float(points[last][2]) - float(points[first][2]);
+    if elapsed > 0:
+        fraction = (float(points[i][2]) - float(points[first][2])) / elapsed;
+    else:
+        fraction = (i - first) / (last - first);
+
+    closest = previous if fraction <= 0.5 else next;
+    if previous['edge_index'] == next['edge_index']:
+        distance_along_edge = previous['distance_along_edge'] + fraction * (next['distance_along_edge'] - previous['distance_along_edge']);
+    else:
+        distance_along_edge = closest['distance_along_edge'];
+
+    return {
+        'type': 'interpolated',
+        'lat': float(previous['lat']) + fraction * (float(next['lat']) - float(previous['lat'])),
+        'lon': float(previous['lon']) + fraction * (float(next['lon']) - float(previous['lon'])),
+        'edge_index': closest['edge_index'],
+        'distance_along_edge': distance_along_edge
+    };
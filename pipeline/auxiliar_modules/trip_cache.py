@@ -0,0 +1,149 @@
+import hashlib;
+import os;
+from typing import Iterable, Iterator, List
+
+try:
+    import pyarrow as pa;
+    import pyarrow.ipc;
+except ImportError:
+    pa = None;
+
+
+#<-------------- TRIP CACHE ------------->
+
+# Raw measurements of trips are stored in Arrow IPC files, one per trip and set of measurement types.
+# Columns are named after their position in the rows of the LiRA database, and rows are read back as tuples.
+
+
+def is_trip_cache_available() -> bool:
+    """
+    Returns if the local trip cache can be used. It needs the pyarrow package to be installed.
+    """
+    return pa != None;
+
+
+def get_trip_cache_directory() -> str:
+    """
+    Returns the directory where the cached trips are stored. It can be set with the TRIP_CACHE_DIR environment variable.
+    """
+    return os.getenv('TRIP_CACHE_DIR', os.path.join('cache', 'trips'));
+
+
+def get_trip_cache_path(trip: str, types: List[str]) -> str:
+    """
+    Returns the path of the cache file of a trip and a set of measurement types.
+
+    :param trip: Id of the trip
+    :type trip: str
+    :param types: Types ("T") of the measurements of the trip
+    :type types: List[str]
+    """
+    types_hash = hashlib.sha1(','.join(sorted(types)).encode('utf-8')).hexdigest()[:12];
+    return os.path.join(get_trip_cache_directory(), 'trip-{}-{}.arrow'.format(trip, types_hash));
+
+
+def is_trip_cached(trip: str, types: List[str]) -> bool:
+    """
+    Returns if the raw measurements of a trip are stored in the local cache.
+
+    :param trip: Id of the trip
+    :type trip: str
+    :param types: Types ("T") of the measurements of the trip
+    :type types: List[str]
+    """
+    return is_trip_cache_available() and os.path.exists(get_trip_cache_path(trip, types));
+
+
+def read_cached_measurements(trip: str, types: List[str], batch_size: int) -> Iterator[List[tuple]]:
+    """
+    Yields the raw measurements of a cached trip in batches. The cache file is memory mapped, so only
+    the batch being converted to rows is materialized in memory.
+
+    :param trip: Id of the trip
+    :type trip: str
+    :param types: Types ("T") of the measurements of the trip
+    :type types: List[str]
+    :param batch_size: Number of rows of each batch
+    :type batch_size: int
+    """
+    with pa.memory_map(get_trip_cache_path(trip, types), 'r') as source:
+        table = pa.ipc.open_file(source).read_all();
+        for batch in table.to_batches(max_chunksize=batch_size):
+            yield list(zip(*[column.to_pylist() for column in batch.columns]));
+
+
+def cache_measurements(trip: str, types: List[str], batches: Iterable[List[tuple]]) -> Iterator[List[tuple]]:
+    """
+    Yields the batches of raw measurements passed as parameter while writing them into the cache file of the trip.
+    The file is only made visible once all the batches have been written. If a batch can not be stored with
+    the schema of the first batch, the cache file is discarded but the batches keep being yielded.
+
+    :param trip: Id of the trip
+    :type trip: str
+    :param types: Types ("T") of the measurements of the trip
+    :type types: List[str]
+    :param batches: Batches of raw measurements from the LiRA database
+    :type batches: Iterable[List[tuple]]
+    """
+    path = get_trip_cache_path(trip, types);
+    temporary_path = path + '.tmp';
+    os.makedirs(os.path.dirname(path), exist_ok=True);
+
+    writer = None;
+    schema = None;
+    completed = False;
+    try:
+        for batch in batches:
+            if len(batch) > 0 and (writer != None or schema == None):
+                try:
+                    columns = [list(column) for column in zip(*batch)];
+                    if schema == None:
+                        schema = get_schema(columns);
+                        writer = pa.ipc.new_file(temporary_path, schema);
+                    writer.write_batch(pa.record_batch(columns, schema=schema));
+                except (pa.ArrowInvalid, pa.ArrowTypeError) as error:
+                    print('Trip {} can not be cached: {}'.format(trip, error));
+                    if writer != None:
+                        writer.close();
+                    writer = None;
+            yield batch;
+        completed = True;
+    finally:
+        if writer != None:
+            writer.close();
+            if completed:
+                os.replace(temporary_path, path);
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path);
+
+
+def write_cached_measurements(trip: str, types: List[str], rows: List[tuple]):
+    """
+    Writes the raw measurements of a trip into its cache file.
+
+    :param trip: Id of the trip
+    :type trip: str
+    :param types: Types ("T") of the measurements of the trip
+    :type types: List[str]
+    :param rows: Raw measurements from the LiRA database
+    :type rows: List[tuple]
+    """
+    for batch in cache_measurements(trip, types, [rows]):
+        pass;
+
+
+def get_schema(columns: List[List]):
+    """
+    Returns the schema of the cache file based on the columns of the first batch. Columns whose type
+    can not be inferred because all their values are null are stored as strings.
+
+    :param columns: Columns of the first batch of raw measurements
+    :type columns: List[List]
+    """
+    fields = [];
+    for i in range(len(columns)):
+        column_type = pa.array(columns[i]).type;
+        if column_type == pa.null():
+            column_type = pa.string();
+        fields.append(pa.field(str(i), column_type));
+    return pa.schema(fields);
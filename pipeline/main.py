@@ -6,7 +6,8 @@ from tables.computed_values import ComputedValues;
 from tables.aggregated_values import AggregatedValues;
 from tables.computed_values_types import ComputedValuesTypes;
 from tables.aggregation_methods import AggregationMethods;
-from auxiliar_modules.map_matching import format_and_map_match_measurements;
+from auxiliar_modules.map_matching import stream_and_map_match_measurements;
+from auxiliar_modules.http_client import HTTPClient;
 from auxiliar_modules.db_queries import get_computed_ways, get_raw_measurements_from_main_db, delete_all;
 
 def insert_data_into_db():
@@ -58,8 +59,8 @@ def main(trip: str):
 
     # STEP 1 AND 2
     print("Performing Step 1 and 2 - Fetch and Format and Map Match Car Measurements");
-    measurements_from_db = get_raw_measurements_from_main_db(trip);
-    measurements, nodes, ways = format_and_map_match_measurements(measurements_from_db);
+    batches_from_db = get_raw_measurements_from_main_db(trip, batch_size=10000);
+    measurements, nodes, ways = stream_and_map_match_measurements(batches_from_db);
 
     NodesDictionary().fill(nodes);
     WaysDictionary().fill(ways);
@@ -85,7 +86,7 @@ def main(trip: str):
 
     # STEP 7
     print("Performing Step 7 - Compute Measurements")
-    ComputedValues().compute_data(Measurements().get_measurements(), computed_ways)
+    ComputedValues().compute_data(computed_ways)
 
     # STEP 8
     print("Performing Step 8 - Compute Aggregated Values")
@@ -95,6 +96,8 @@ def main(trip: str):
     print("Performing Step 9 - Insert Data")
     insert_data_into_db();
     drop_data();
+
+    HTTPClient().print_statistics();
     
     
 
@@ -1,7 +1,8 @@
 from tables.computed_values import ComputedValue;
 from tables.computed_values_types import ComputedValueType
-from tables.measurements import Measurements, Measurement;
-from tables.segments import Segments;
+from tables.measurements import Measurement;
+import numpy as np
+from typing import Dict
 
 class Acceleration(ComputedValue):
 
@@ -10,18 +11,13 @@ class Acceleration(ComputedValue):
     DESCRIPTION = "X component of the acceleration measurements";
     UNITS = "m/s²";
     AGGREGATIONS = [];
+    MEASUREMENT_TYPE = 'acc.xyz.x';
 
     def __init__(self, id: int, measurement: Measurement, type: ComputedValueType, value: float, segment: int, direction: int):
         super().__init__(id, measurement, type, value, segment, direction);
-     
-    
-    
-    def calculate_value(self, measurement: Measurement):
-        return measurement.value;
-    
-    @staticmethod
-    def prerequisites(measurement: Measurement):
-        if measurement.type != 'acc.xyz.x':
-            return False;
-        else:
-            return True;
+
+
+    @classmethod
+    def calculate_batch(cls, columns: Dict) -> np.ndarray:
+
+        return columns['value'];
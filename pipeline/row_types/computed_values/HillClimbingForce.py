@@ -1,8 +1,8 @@
 from tables.computed_values import ComputedValue;
 from tables.computed_values_types import ComputedValueType
-from tables.measurements import Measurements, Measurement;
-from tables.segments_properties import SegmentsProperties
-import math;
+from tables.measurements import Measurement;
+import numpy as np
+from typing import Dict
 
 class HillClimbingForce(ComputedValue):
 
@@ -11,28 +11,15 @@ class HillClimbingForce(ComputedValue):
     DESCRIPTION = "Hill Climbing Force component of the Traction Force of the energy measurement";
     UNITS = "Newtons";
     AGGREGATIONS = [];
+    MEASUREMENT_TYPE = 'obd.trac_cons';
+    SEGMENT_PROPERTIES = ['Inclination'];
 
     def __init__(self, id: int, measurement: Measurement, type: ComputedValueType, value: float, segment: int, direction: int):
         super().__init__(id, measurement, type, value, segment, direction);
-     
-    
-    
-    def calculate_value(self, measurement: Measurement):
 
-        inclination_of_segment = SegmentsProperties().get_segment_property("Inclination", measurement.segment.id)
 
-        if inclination_of_segment != None:
+    @classmethod
+    def calculate_batch(cls, columns: Dict) -> np.ndarray:
 
-            if(measurement.direction == 1):
-                inclination_of_segment = inclination_of_segment * -1;
-
-            return (1966 + 80) * math.sin(inclination_of_segment) * 9.81;
-
-        return None;
-    
-    @staticmethod
-    def prerequisites(measurement: Measurement):
-        if measurement.type != 'obd.trac_cons':
-            return False;
-        else:
-            return True;
+        inclination_of_segment = np.where(columns['direction'] == 1, -columns['Inclination'], columns['Inclination']);
+        return (1966 + 80) * np.sin(inclination_of_segment) * 9.81;
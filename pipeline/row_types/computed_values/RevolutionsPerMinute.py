@@ -1,7 +1,8 @@
 from tables.computed_values import ComputedValue;
 from tables.computed_values_types import ComputedValueType
-from tables.measurements import Measurements, Measurement;
-from tables.segments import Segments;
+from tables.measurements import Measurement;
+import numpy as np
+from typing import Dict
 
 class RevolutionsPerMinute(ComputedValue):
 
@@ -10,19 +11,13 @@ class RevolutionsPerMinute(ComputedValue):
     DESCRIPTION = "How many times the crankshaft of the engine makes one full rotation in a minute";
     UNITS = "rpm";
     AGGREGATIONS = [];
+    MEASUREMENT_TYPE = 'obd.rpm';
 
     def __init__(self, id: int, measurement: Measurement, type: ComputedValueType, value: float, segment: int, direction: int):
         super().__init__(id, measurement, type, value, segment, direction);
-     
-    
-    
-    def calculate_value(self, measurement: Measurement):
-        
-        return measurement.value;
-    
-    @staticmethod
-    def prerequisites(measurement: Measurement):
-        if measurement.type != 'obd.rpm':
-            return False;
-        else:
-            return True;
+
+
+    @classmethod
+    def calculate_batch(cls, columns: Dict) -> np.ndarray:
+
+        return columns['value'];
@@ -1,8 +1,8 @@
-from fileinput import close
 from tables.computed_values_types import ComputedValueType
 from tables.computed_values import ComputedValue;
-from tables.measurements import Measurements, Measurement;
-from tables.segments import Segments;
+from tables.measurements import Measurement;
+import numpy as np
+from typing import Dict
 
 class TractionForce(ComputedValue):
 
@@ -10,39 +10,20 @@ class TractionForce(ComputedValue):
     DESCRIPTION = "Traction Force calculated from Traction power";
     UNITS = "Newtons";
     AGGREGATIONS = [];
+    MEASUREMENT_TYPE = 'obd.trac_cons';
+    SENSORS = ['obd.spd_veh'];
 
 
     def __init__(self, id: int, measurement: Measurement, type: ComputedValueType, value: float, segment: int, direction: int):
         super().__init__(id, measurement, type, value, segment, direction);
-        
-    
-
-    def calculate_value(self, measurement: Measurement):
-
-        measurements_table = Measurements(); 
-        segment = measurement.segment;
-        power = measurement.value;
-        # We substract 160 from erroneous measurement by default
-        power = power - 160;
-        # We convert it to W
-        power = power * 1000;
-
-        closest_velocity_measurement = measurements_table.get_closest_measurement_of_type_in_segment('obd.spd_veh', measurement.created_at, segment.id);
-        if closest_velocity_measurement != None:
-            velocity = closest_velocity_measurement.value;
-
-            if velocity == 0:
-                return 0;
-            else:
-                return power / velocity;
-
-        return None;
-
-    @staticmethod
-    def prerequisites(measurement: Measurement):
-
-        # We only calculate traction force for energy consumption measurements
-        if measurement.type != 'obd.trac_cons':
-            return False;
-        else:
-            return True;
\ No newline at end of file
+
+
+    @classmethod
+    def calculate_batch(cls, columns: Dict) -> np.ndarray:
+
+        # We substract 160 from erroneous measurement by default and convert it to W
+        power = (columns['value'] - 160) * 1000;
+        velocity = columns['obd.spd_veh'];
+
+        # Traction force is 0 when the vehicle is stopped
+        return np.divide(power, velocity, out=np.zeros(len(velocity)), where=velocity != 0);
@@ -1,7 +1,8 @@
 from tables.computed_values import ComputedValue;
 from tables.computed_values_types import ComputedValueType
-from tables.measurements import Measurements, Measurement;
-from tables.segments import Segments;
+from tables.measurements import Measurement;
+import numpy as np
+from typing import Dict
 
 class TractionPower(ComputedValue):
 
@@ -10,19 +11,13 @@ class TractionPower(ComputedValue):
     DESCRIPTION = "Traction power taken from the vehicle";
     UNITS = "W";
     AGGREGATIONS = [];
+    MEASUREMENT_TYPE = 'obd.trac_cons';
 
     def __init__(self, id: int, measurement: Measurement, type: ComputedValueType, value: float, segment: int, direction: int):
         super().__init__(id, measurement, type, value, segment, direction);
-     
-    
-    
-    def calculate_value(self, measurement: Measurement):
-        
-        return measurement.value;
-    
-    @staticmethod
-    def prerequisites(measurement: Measurement):
-        if measurement.type != 'obd.trac_cons':
-            return False;
-        else:
-            return True;
\ No newline at end of file
+
+
+    @classmethod
+    def calculate_batch(cls, columns: Dict) -> np.ndarray:
+
+        return columns['value'];
@@ -2,8 +2,7 @@ import math;
 from tables.segments_properties import SegmentProperty
 from tables.segments import Segment
 from typing import List
-import os;
-import requests;
+from auxiliar_modules.elevation import ElevationCache;
 
 class Inclination(SegmentProperty):
 
@@ -11,11 +10,20 @@ class Inclination(SegmentProperty):
         super().__init__(id, segment)
         self.type = 'Inclination';
 
+    @classmethod
+    def prefetch(cls, segments: List[Segment]):
+
+        points = [segment.position_a for segment in segments] + [segment.position_b for segment in segments];
+        ElevationCache().get_elevations(points);
+
     def calculate_value(self, segment: Segment):
 
         elevation_point_a = self.get_elevation(segment.position_a);
         elevation_point_b = self.get_elevation(segment.position_b);
 
+        if elevation_point_a == None or elevation_point_b == None:
+            return None;
+
         a = elevation_point_b - elevation_point_a;
         b = segment.length * 1000;
         c = math.sqrt((a * a) + (b * b));
@@ -25,12 +33,5 @@ class Inclination(SegmentProperty):
 
     def get_elevation(self, point: List[float]) -> float:
         
-        url = 'https://services.datafordeler.dk/DHMTerraen/DHMKoter/1.0.0/GEOREST/HentKoter?format=json&username={id}&password={pwd}&geop=POINT({lat} {lon})&georef=EPSG:4326'.format(
-            id=os.getenv('KOTER_USER'), 
-            pwd = os.getenv('KOTER_PWD'),
-            lat = point[0],
-            lon= point[1]);
-        response = requests.get(url);
-        resJSON = response.json();
-        return resJSON['HentKoterRespons']['data'][0]['kote']
+        return ElevationCache().get_elevation(point);
     
@@ -11,6 +11,8 @@ import pkgutil;
 from tables.computed_values_types import ComputedValuesTypes
 from tables.measurements import Measurements
 from tables.segments import Segments
+from tables.segments_properties import SegmentsProperties
+import numpy as np
 from typing import Dict, List
 
 
@@ -31,6 +33,16 @@ class ComputedValue:
     :type value: float
     """
 
+    # Type of the measurements from which the computed value is computed. It is needed to compute the values in batch.
+    MEASUREMENT_TYPE: str = None;
+    # Types of measurements of other sensors that the computed value needs. They are joined to each measurement
+    # with the measurement of the type closest in time in the whole trip, within SENSORS_MAX_GAP seconds, and the
+    # measurements without any of them within that gap get no computed value. If it is None, there is no maximum.
+    SENSORS: List[str] = [];
+    SENSORS_MAX_GAP: int = 2;
+    # Segment properties of the segment of each measurement that the computed value needs in batch.
+    SEGMENT_PROPERTIES: List[str] = [];
+
     def __init__(self, id, measurement, type, value, segment, direction):
        
         if id == -1:
@@ -38,8 +50,9 @@ class ComputedValue:
             self.measurement: Measurement = measurement;
             self.segment: Segment = measurement.segment;
             self.direction: int = measurement.direction;
-            self.type: ComputedValueType = ComputedValuesTypes().get_type_by_name(self.TYPE);
-            self.value: float = self.calculate_value(self.measurement);
+            self.type: ComputedValueType = type if type != None else ComputedValuesTypes().get_type_by_name(self.TYPE);
+            # Values computed in batch are passed already computed, the rest are computed here
+            self.value: float = value if value is not None else self.calculate_value(self.measurement);
         else:
             self.id: int = id;
             self.measurement: Measurement = measurement
@@ -58,25 +71,77 @@ class ComputedValue:
         return [self.measurement.id, self.type.id, self.value, self.segment.id, self.direction];
 
     def calculate_value(self, measurement):
-        """Returns the value of the computed value. This method needs to be overridden by any subclass
-        that implements a type of computed value.
+        """Returns the value of the computed value, or None if the measurement lacks any of the SENSORS or
+        SEGMENT_PROPERTIES. By default it is computed with calculate_batch for the single measurement, so
+        this method only needs to be overridden by subclasses that do not implement calculate_batch.
 
         :param measurement: The measurement associated with the computed value
         :type measurement: Measurement
     
         """
-        pass;
+        columns = {
+            'value': np.array([measurement.value], dtype=np.float64),
+            'timestamp': np.array([measurement.timestamp], dtype=np.int64),
+            'direction': np.array([measurement.direction], dtype=np.int64),
+            'segment': np.array([measurement.segment.id], dtype=np.int64)
+        };
+
+        for type in self.SENSORS:
+            joined_measurement = self.get_sensor_measurement(measurement, type);
+            if joined_measurement == None:
+                return None;
+            columns[type] = np.array([joined_measurement.value], dtype=np.float64);
+
+        for property_name in self.SEGMENT_PROPERTIES:
+            segment_property = SegmentsProperties().get_segment_property(property_name, measurement.segment.id);
+            if segment_property == None:
+                return None;
+            columns[property_name] = np.array([segment_property], dtype=np.float64);
+
+        values = self.calculate_batch(columns);
+        if values is None:
+            return None;
+        return np.asarray(values, dtype=np.float64)[0].item();
+
+    @classmethod
+    def calculate_batch(cls, columns: Dict) -> np.ndarray:
+        """Returns the values of the computed value for many measurements of MEASUREMENT_TYPE at once, or None if
+        the computed value can only be computed one measurement at a time with calculate_value. NaN values are
+        stored as they are. This method needs to be overridden by any subclass that implements a type of computed
+        value, unless it overrides calculate_value instead.
+
+        :param columns: Arrays with one position per measurement: "value", "timestamp", "direction" and "segment",
+            the value of the measurement joined from each of the SENSORS under its type, and each of the
+            SEGMENT_PROPERTIES under its name. Only measurements that have all of them are passed, so measurements
+            without a measurement of any of the SENSORS within SENSORS_MAX_GAP seconds are left out.
+        :type columns: Dict
+    
+        """
+        return None;
 
-    @staticmethod
-    def prerequisites(self, measurement):
+    def get_sensor_measurement(self, measurement, type):
+        """
+        Returns the measurement of one of the SENSORS of the computed value joined to a measurement,
+        or None if there is none within SENSORS_MAX_GAP seconds.
+
+        :param measurement: The measurement associated with the computed value
+        :type measurement: Measurement
+        :param type: Type of the joined measurement
+        :type type: str
+        """
+        return ComputedValues().get_joined_measurement(measurement, type, self.SENSORS_MAX_GAP);
+
+    @classmethod
+    def prerequisites(cls, measurement):
         """
         Returns a boolean indicating if a computed value needs to be computed for a certain measurement.
         It is used as a filter to avoid computing all types of computed values for all measurements when it is not needed.
+        By default it is computed for the measurements of MEASUREMENT_TYPE.
 
         :param measurement: Measurement associated with the Computed Value
         :type measurement: Measurement
         """
-        pass;
+        return measurement.type == cls.MEASUREMENT_TYPE;
 
 def parse_computed_values(computed_values_rows:List) -> List[ComputedValue]:
     """Converts computed values rows retrieved from the database to ComputedValue objects to be used within the pipeline
@@ -106,6 +171,16 @@ class ComputedValues(object):
     computed_values_in_db: List[ComputedValue] = [];
 
     computed_values_per_segment: Dict = {};
+    # (type, maximum gap) -> measurement id -> joined measurement of the type
+    joined_measurements: Dict = {};
+
+    # Columns of the measurements of each type, shared by the types of computed values computed from the same type:
+    # measurement type -> column name -> column
+    columns_per_type: Dict = {};
+    # (measurement type, sensor type, maximum gap) -> values of the joined sensor measurements and which ones were found
+    sensor_columns: Dict = {};
+    # (measurement type, property name) -> segment property of each measurement and which ones have it
+    property_columns: Dict = {};
 
     #### SINGLETON ####
 
@@ -118,16 +193,15 @@ class ComputedValues(object):
 
 
 
-    def compute_data(self, measurements, computed_ways):
-        """Computes, creates and stores Computed Value objects in the class instance based on the ways and measurements passed as parameters.
+    def compute_data(self, computed_ways):
+        """Computes, creates and stores Computed Value objects in the class instance from all the measurements of the
+        Measurements table, and retrieves the ones of the ways passed as parameter from the database.
 
-        :param measurements: Measurements from which the function computes the ComputedValues
-        :type measurements: List[Measurement]
         :param computed_ways: Ways whose Computed Values need to be retrieved from the database instead of computed.
         :type computed_ways: List[int]
         
         """
-        self.computed_values_to_insert = self.generate_computed_values(measurements);
+        self.computed_values_to_insert = self.generate_computed_values();
         self.computed_values_in_db = parse_computed_values(get_computed_values_in_ways(computed_ways));
 
         self.computed_values = self.computed_values_to_insert + self.computed_values_in_db;
@@ -142,6 +216,10 @@ class ComputedValues(object):
         self.computed_values_to_insert = [];
         self.computed_values_in_db = [];
         self.computed_values_per_segment = {};
+        self.joined_measurements = {};
+        self.columns_per_type = {};
+        self.sensor_columns = {};
+        self.property_columns = {};
 
 
     ### DATABASE ####
@@ -215,19 +293,41 @@ class ComputedValues(object):
 
 
 
-    def generate_computed_values(self, measurements: List[Measurement]) -> List[ComputedValue]:
+    def generate_computed_values(self) -> List[ComputedValue]:
         """
-        Returns the computed values for a list of measurements.
-
-        :param: measurements: Measurements from which to compute the Computed Values.
-        :type measurements: List[Measurement]
-      
+        Returns the computed values of all the measurements of the Measurements table. Types of computed values that
+        implement calculate_batch are computed at once from the columns of the table, and the rest are computed one
+        measurement at a time.
         """
         computed_values = [];
         classes_types = self.get_computed_values_types_classes();
+        stored_measurements = Measurements().columns;
+
+        print("Computing computed values in batch")
+        row_classes_types = [];
+        for klass in classes_types:
+            values = None;
+            if klass.MEASUREMENT_TYPE != None:
+                positions, columns = self.get_columns(klass);
+                values = klass.calculate_batch(columns);
+
+            if values is None:
+                row_classes_types.append(klass);
+                continue;
+
+            type = ComputedValuesTypes().get_type_by_name(klass.TYPE);
+            for position, value in zip(positions.tolist(), np.asarray(values, dtype=np.float64).tolist()):
+                computed_values.append(klass(-1, stored_measurements[position], type, value, None, None));
+
+        if len(row_classes_types) == 0:
+            return computed_values;
+
+        measurements = stored_measurements.to_measurements();
+        print("Joining sensors")
+        self.join_sensors(measurements, row_classes_types);
         print("Computing computed values")
         for measurement in measurements:
-            for klass in classes_types:
+            for klass in row_classes_types:
                 if klass.prerequisites(measurement):
                     computed_value = klass(-1, measurement, None, None, None, None);
                     
@@ -237,6 +337,137 @@ class ComputedValues(object):
         return computed_values;
 
 
+    def get_columns(self, klass):
+        """
+        Returns the positions in the Measurements table of the measurements from which a type of computed value is
+        computed, and the columns passed to its calculate_batch method: the value, timestamp, direction and segment id
+        of the measurements, the values of the measurements of its SENSORS joined by closest timestamp within
+        SENSORS_MAX_GAP seconds, and its SEGMENT_PROPERTIES for the segment of each measurement. Measurements without
+        any of them are left out.
+
+        :param: klass: Subclass that implements the type of computed value.
+        :type klass: type
+      
+        """
+        type_columns = self.get_type_columns(klass.MEASUREMENT_TYPE);
+        columns = {name: type_columns[name] for name in ['value', 'timestamp', 'direction', 'segment']};
+        available = np.ones(len(type_columns['position']), dtype=bool);
+
+        for type in klass.SENSORS:
+            columns[type], found = self.get_sensor_column(klass.MEASUREMENT_TYPE, type, klass.SENSORS_MAX_GAP);
+            available &= found;
+
+        for property_name in klass.SEGMENT_PROPERTIES:
+            columns[property_name], found = self.get_property_column(klass.MEASUREMENT_TYPE, property_name);
+            available &= found;
+
+        if available.all():
+            return type_columns['position'], columns;
+        return type_columns['position'][available], {name: column[available] for name, column in columns.items()};
+
+    def get_type_columns(self, measurement_type: str) -> Dict:
+        """
+        Returns the positions in the Measurements table of the measurements of a type sorted by time, under "position",
+        and their value, timestamp, direction and segment id taken from the columns of the table.
+
+        :param: measurement_type: Type of the measurements.
+        :type measurement_type: str
+      
+        """
+        if measurement_type not in self.columns_per_type:
+            measurements_table = Measurements();
+            positions = measurements_table.get_positions_of_type(measurement_type);
+            self.columns_per_type[measurement_type] = {
+                'position': positions,
+                'value': measurements_table.columns.values[positions],
+                'timestamp': measurements_table.columns.timestamps[positions],
+                'direction': measurements_table.columns.directions[positions].astype(np.int64),
+                'segment': measurements_table.columns.segment_ids[positions]
+            };
+        return self.columns_per_type[measurement_type];
+
+    def get_sensor_column(self, measurement_type: str, type: str, max_gap: int):
+        """
+        Returns the values of the measurements of a sensor joined by closest timestamp to the measurements of a type,
+        and whether each measurement has a joined measurement.
+
+        :param: measurement_type: Type of the measurements of reference.
+        :type measurement_type: str
+        :param: type: Type of the joined measurements.
+        :type type: str
+        :param: max_gap: Maximum difference in seconds between the timestamps of the join. If None, there is no maximum.
+        :type max_gap: int
+      
+        """
+        key = (measurement_type, type, max_gap);
+        if key not in self.sensor_columns:
+            measurements_table = Measurements();
+            joined = measurements_table.get_closest_positions_of_type(self.get_type_columns(measurement_type)['timestamp'], type, max_gap);
+            found = joined != -1;
+            values = np.full(len(joined), np.nan);
+            values[found] = measurements_table.columns.values[joined[found]];
+            self.sensor_columns[key] = (values, found);
+        return self.sensor_columns[key];
+
+    def get_property_column(self, measurement_type: str, property_name: str):
+        """
+        Returns a segment property of the segment of each measurement of a type, and whether each segment has it.
+
+        :param: measurement_type: Type of the measurements.
+        :type measurement_type: str
+        :param: property_name: Name of the segment property.
+        :type property_name: str
+      
+        """
+        key = (measurement_type, property_name);
+        if key not in self.property_columns:
+            segment_ids = self.get_type_columns(measurement_type)['segment'];
+            segments_properties = SegmentsProperties();
+            self.property_columns[key] = (segments_properties.get_segment_properties(property_name, segment_ids),
+                segments_properties.have_segment_property(property_name, segment_ids));
+        return self.property_columns[key];
+
+
+    def join_sensors(self, measurements: List[Measurement], classes_types: List):
+        """
+        Joins the measurements that need each type of computed value with the measurements of the SENSORS it declares,
+        by closest timestamp in the whole trip. Every sensor is joined once for all the measurements.
+
+        :param: measurements: Measurements from which to compute the Computed Values.
+        :type measurements: List[Measurement]
+        :param: classes_types: Subclasses that implement the types of computed values.
+        :type classes_types: List
+      
+        """
+        measurements_table = Measurements();
+        for klass in classes_types:
+            if len(klass.SENSORS) == 0:
+                continue;
+
+            needed = [measurement for measurement in measurements if klass.prerequisites(measurement)];
+            for type in klass.SENSORS:
+                joined = self.joined_measurements.setdefault((type, klass.SENSORS_MAX_GAP), {});
+                missing = [measurement for measurement in needed if measurement.id not in joined];
+                closest = measurements_table.get_closest_measurements_of_type(missing, type, klass.SENSORS_MAX_GAP);
+                for measurement, joined_measurement in zip(missing, closest):
+                    joined[measurement.id] = joined_measurement;
+
+    def get_joined_measurement(self, measurement: Measurement, type: str, max_gap: int) -> Measurement:
+        """
+        Returns the measurement of a type joined to a measurement by closest timestamp, or None if there is none.
+
+        :param: measurement: Measurement of reference.
+        :type measurement: Measurement
+        :param: type: Type of the joined measurement.
+        :type type: str
+        :param: max_gap: Maximum difference in seconds between the timestamps of the join. If None, there is no maximum.
+        :type max_gap: int
+      
+        """
+        joined = self.joined_measurements.get((type, max_gap));
+        if joined == None or measurement.id not in joined:
+            return Measurements().get_closest_measurements_of_type([measurement], type, max_gap)[0];
+        return joined[measurement.id];
 
     def get_computed_values_in_segment(self, segment_id) -> List[ComputedValue]:
         """
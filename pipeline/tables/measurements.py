@@ -1,17 +1,25 @@
-from datetime import datetime
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List
 
-from numpy import number
+import numpy as np
+import pandas as pd
 
 from tables.segments import Segments, Segment;
 from auxiliar_modules.db_queries import connect;
-import geopy;
-import geopy.distance
+from auxiliar_modules.geodesy import get_consecutive_distances, haversine_distance, haversine_distances;
+from auxiliar_modules.temporal_join import get_nearest_in_time;
 import json;
-import time;
 
 class Measurement:
-    """This is a conceptual class representation of a car sensor measurement.
+    """This is a conceptual class representation of a car sensor measurement. It is a view of one position of the
+    MeasurementColumns that store the measurement: its attributes are read from and written to the columns, so a
+    measurement holds no data of its own.
+
+    :param columns: Columns that store the measurement.
+    :type columns: MeasurementColumns
+    :param row: Position of the measurement in the columns.
+    :type row: int
+
+    The attributes of a measurement are:
 
     :param id: The id of the measurement.
     :type id: str
@@ -33,20 +41,106 @@ class Measurement:
     :type direction: int
     :param way: Id of the way to which the measurement pertains.
     :type way: int
+    :param timestamp: Epoch seconds of when was the measurement measured. It is used to compare measurements in time.
+    :type timestamp: int
+    :param distance_along_segment: Distance in meters from the first position of the segment to the measurement.
+    :type distance_along_segment: float
+    :param way_node_offset: Position in the nodes of its way of the first node of the segment of the measurement, if the map matcher gave it.
+    :type way_node_offset: int
     """
 
+    __slots__ = ('columns', 'row');
+
+
+    def __init__(self, columns, row):
+        self.columns: MeasurementColumns = columns;
+        self.row: int = row;
+
+    def __eq__(self, other):
+        if not isinstance(other, Measurement):
+            return NotImplemented;
+        return self.columns is other.columns and self.row == other.row;
+
+    def __hash__(self):
+        return hash((id(self.columns), self.row));
+
+    @property
+    def id(self) -> str:
+        return self.columns.ids[self.row];
+
+    @property
+    def type(self) -> str:
+        return MEASUREMENT_TYPES[self.columns.type_codes[self.row]];
+
+    @property
+    def position(self) -> List[float]:
+        return [self.columns.lat[self.row].item(), self.columns.lon[self.row].item()];
+
+    @position.setter
+    def position(self, position: List[float]):
+        self.columns.lat[self.row] = position[0];
+        self.columns.lon[self.row] = position[1];
+
+    @property
+    def value(self) -> float:
+        return self.columns.values[self.row].item();
+
+    @property
+    def trip(self) -> str:
+        return self.columns.trips[self.row];
+
+    @property
+    def created_at(self):
+        return self.columns.created_at[self.row];
+
+    @property
+    def updated_at(self):
+        return self.columns.updated_at[self.row];
 
-    def __init__(self, id, type, position, value, trip, created_at, updated_at, segment):
-        self.id: str = id;
-        self.type: str = type;
-        self.position: List[float] = position;
-        self.value: float = value;
-        self.trip: str = trip;
-        self.created_at = created_at;
-        self.updated_at = updated_at;
-        self.segment: Segment = segment;
-        self.direction: int = None;
-        self.way: int = None;
+    @property
+    def timestamp(self) -> int:
+        return self.columns.timestamps[self.row].item();
+
+    @property
+    def segment(self) -> Segment:
+        return self.columns.segments[self.row];
+
+    @segment.setter
+    def segment(self, segment: Segment):
+        self.columns.set_segments([self.row], [segment]);
+
+    @property
+    def direction(self) -> int:
+        return get_optional(self.columns.directions[self.row]);
+
+    @direction.setter
+    def direction(self, direction: int):
+        self.columns.directions[self.row] = direction if direction != None else -1;
+
+    @property
+    def way(self) -> int:
+        return get_optional(self.columns.ways[self.row]);
+
+    @way.setter
+    def way(self, way: int):
+        self.columns.ways[self.row] = way if way != None else -1;
+
+    @property
+    def way_node_offset(self) -> int:
+        return get_optional(self.columns.way_node_offsets[self.row]);
+
+    @way_node_offset.setter
+    def way_node_offset(self, way_node_offset: int):
+        self.columns.way_node_offsets[self.row] = way_node_offset if way_node_offset != None else -1;
+
+    @property
+    def distance_along_segment(self) -> float:
+        distance = self.columns.distances_along_segment[self.row].item();
+        return distance if not np.isnan(distance) else None;
+
+    @distance_along_segment.setter
+    def distance_along_segment(self, distance_along_segment: float):
+        self.columns.distances_along_segment[self.row] = distance_along_segment if distance_along_segment != None else np.nan;
 
     def get_db_row(self):
         """Returns a list of values to be inserted in the visualization database as a Measurement
@@ -55,118 +149,581 @@ class Measurement:
         position = 'POINT(' + str(self.position[0]) + ' ' + str(self.position[1]) + ')';
         return [self.id, self.type, position, self.value, self.trip, self.created_at, self.updated_at, self.segment.id, self.direction];
 
-def filter_measurements(measurements: List):
+
+def get_optional(value: np.integer):
+    """
+    Returns an integer stored in a column, or None if it is -1, which is how missing integers are stored.
+
+    :param value: Value stored in a column
+    :type value: np.integer
+    """
+    value = value.item();
+    return value if value != -1 else None;
+
+class SortedGroups:
+    """This is a conceptual class representation of the grouping of the positions of a column by a key. Positions are
+    sorted by key, and by the secondary keys within each key, and the positions of each group are contiguous
+    between two offsets. Sorts are stable, so positions with equal keys keep their order.
+
+    :param keys: Key of each position.
+    :type keys: np.ndarray
+    :param secondary_keys: Keys that sort the positions within each group, from the most to the least significant.
+    :type secondary_keys: np.ndarray
+    """
+    def __init__(self, keys: np.ndarray, *secondary_keys: np.ndarray):
+        self.order: np.ndarray = np.lexsort(tuple(reversed(secondary_keys)) + (keys,)).astype(np.int64);
+        sorted_keys = keys[self.order];
+        starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))) if len(keys) > 0 else np.empty(0, dtype=np.int64);
+        self.keys: np.ndarray = sorted_keys[starts];
+        self.offsets: np.ndarray = np.append(starts, len(keys)).astype(np.int64);
+
+    def __len__(self):
+        return len(self.keys);
+
+    def get_group(self, key) -> np.ndarray:
+        """
+        Returns the sorted positions of a group, which are empty if there is no such group.
+
+        :param key: Key of the group
+        :type key: int
+        """
+        k = int(np.searchsorted(self.keys, key));
+        if k == len(self.keys) or self.keys[k] != key:
+            return np.empty(0, dtype=np.int64);
+        return self.order[self.offsets[k]:self.offsets[k + 1]];
+
+    def get_firsts(self) -> np.ndarray:
+        """
+        Returns the first position of every group.
+        """
+        return self.order[self.offsets[:-1]];
+
+    def get_lasts(self) -> np.ndarray:
+        """
+        Returns the last position of every group.
+        """
+        return self.order[self.offsets[1:] - 1];
+
+    def get_sizes(self) -> np.ndarray:
+        """
+        Returns the number of positions of every group.
+        """
+        return np.diff(self.offsets);
+
+
+#### DIRECTIONS ####
+
+class DirectionDetector:
+    """This is a conceptual class representation of a method to detect the direction in which the car was going
+    when the measurements were taken. Subclasses implement the detection for all the segments of a trip at once.
+    """
+
+    def get_directions(self, measurements, groups_per_segment: SortedGroups) -> np.ndarray:
+        """
+        Returns the direction of every measurement. This method needs to be overridden by any subclass.
+
+        :param measurements: Columns of the measurements of the trip, in trip order.
+        :type measurements: MeasurementColumns
+        :param groups_per_segment: Positions of the measurements grouped by segment, in trip order within each segment.
+        :type groups_per_segment: SortedGroups
+        """
+        pass;
+
+
+class SegmentEndsDirectionDetector(DirectionDetector):
+    """Detects one direction per segment: 0 if the last measurement of the segment is closer than the first one to the
+    second position of the segment, and 1 otherwise. All the measurements of a segment get its direction. The distances
+    of all the segments are computed in one vectorized call.
+    """
+
+    def get_directions(self, measurements, groups_per_segment: SortedGroups) -> np.ndarray:
+        """
+        Returns the direction of every measurement.
+
+        :param measurements: Columns of the measurements of the trip, in trip order.
+        :type measurements: MeasurementColumns
+        :param groups_per_segment: Positions of the measurements grouped by segment, in trip order within each segment.
+        :type groups_per_segment: SortedGroups
+        """
+        firsts = groups_per_segment.get_firsts();
+        lasts = groups_per_segment.get_lasts();
+        segments = measurements.segments[firsts];
+        lat_b = np.array([float(segment.position_b[0]) for segment in segments], dtype=np.float64);
+        lon_b = np.array([float(segment.position_b[1]) for segment in segments], dtype=np.float64);
+
+        distance_m1 = haversine_distances(measurements.lat[firsts], measurements.lon[firsts], lat_b, lon_b);
+        distance_m2 = haversine_distances(measurements.lat[lasts], measurements.lon[lasts], lat_b, lon_b);
+        directions = np.where(distance_m2 < distance_m1, 0, 1);
+
+        res = np.empty(len(measurements), dtype=np.int64);
+        res[groups_per_segment.order] = np.repeat(directions, groups_per_segment.get_sizes());
+        return res;
+
+
+_direction_detector: DirectionDetector = None;
+
+def set_direction_detector(detector: DirectionDetector):
+    """
+    Sets the method used to detect the directions of the measurements.
+
+    :param detector: Direction detector to use
+    :type detector: DirectionDetector
+    """
+    global _direction_detector;
+    _direction_detector = detector;
+
+def get_direction_detector() -> DirectionDetector:
+    """
+    Returns the method used to detect the directions of the measurements. By default it is one direction per
+    segment, from the first and last measurements of the segment.
+    """
+    global _direction_detector;
+    if _direction_detector == None:
+        _direction_detector = SegmentEndsDirectionDetector();
+    return _direction_detector;
+
+
+#### SEGMENT ASSIGNMENT ####
+
+# Maximum distance in meters from a map matched measurement to the segment it is assigned to.
+SEGMENT_MAX_DISTANCE = 10;
+
+#### DECIMATION ####
+
+# Maximum number of samples kept per second and per meter for each type of raw measurement.
+# None keeps every sample of the type, as well as the types that are not in the dictionary.
+DECIMATION_TARGETS: Dict = {
+    'obd.trac_cons': None,
+    'acc.xyz': {'per_second': 5, 'per_meter': 0.5},
+    'obd.spd_veh': {'per_second': 1, 'per_meter': None},
+    'obd.rpm': {'per_second': 1, 'per_meter': None}
+};
+
+
+def get_first_of_each_bin(bins: np.ndarray, previous_bin) -> np.ndarray:
+    """
+    Returns a mask of the positions of an array of sorted bins in which a new bin starts.
+
+    :param bins: Bins of consecutive samples
+    :type bins: np.ndarray
+    :param previous_bin: Bin of the sample before the first one, or None if there is no such sample.
+    :type previous_bin: int
+    """
+    mask = np.ones(len(bins), dtype=bool);
+    mask[1:] = bins[1:] != bins[:-1];
+    if previous_bin != None and len(bins) > 0:
+        mask[0] = bins[0] != previous_bin;
+    return mask;
+
+
+class MeasurementsDecimator:
+    """Decimates raw measurements from the LiRA database so that every type of measurement does not exceed
+    a maximum number of samples per second and per meter travelled. Samples are grouped in bins of time and
+    distance and only the first sample of each bin is kept. The state of the bins is kept between calls,
+    so the measurements of a trip can be decimated in batches.
+
+    :param targets: Maximum samples per second and per meter for each type of measurement.
+    :type targets: Dict
+    """
+    def __init__(self, targets: Dict = DECIMATION_TARGETS):
+        self.targets: Dict = targets;
+        self.state: Dict = {};
+        self.kept_per_type: Dict = {};
+        self.total_per_type: Dict = {};
+
+    def decimate(self, measurements: List) -> List:
+        """
+        Returns the measurements that are kept after the decimation, in their original order. Measurements
+        without a valid position (missing, empty or not numeric) are discarded before decimating.
+
+        :param measurements: Raw measurements from the LiRA database, sorted by time
+        :type measurements: List[]
+        """
+        if len(measurements) == 0:
+            return [];
+
+        types = np.array([measurement[2] for measurement in measurements], dtype=object);
+        lat = pd.to_numeric(pd.Series([measurement[3] for measurement in measurements], dtype=object), errors='coerce').to_numpy(dtype=np.float64);
+        lon = pd.to_numeric(pd.Series([measurement[4] for measurement in measurements], dtype=object), errors='coerce').to_numpy(dtype=np.float64);
+        with_position = ~(np.isnan(lat) | np.isnan(lon));
+
+        keep = np.zeros(len(measurements), dtype=bool);
+        timestamps = None;
+        for type in np.unique(types):
+            positions = np.flatnonzero((types == type) & with_position);
+            self.total_per_type[type] = self.total_per_type.get(type, 0) + int(np.sum(types == type));
+
+            target = self.targets.get(type);
+            if target != None and len(positions) > 0:
+                state = self.state.setdefault(type, {'time_bin': None, 'distance_bin': None, 'position': None, 'distance': 0.0});
+
+                if target.get('per_second') != None:
+                    if timestamps is None:
+                        timestamps = to_epoch_seconds([measurement[9] for measurement in measurements], fractional=True);
+                    bins = np.floor(timestamps[positions] * target['per_second']).astype(np.int64);
+                    first_of_bin = get_first_of_each_bin(bins, state['time_bin']);
+                    state['time_bin'] = int(bins[-1]);
+                    positions = positions[first_of_bin];
+
+                if target.get('per_meter') != None and len(positions) > 0:
+                    path_lat = lat[positions];
+                    path_lon = lon[positions];
+                    if state['position'] != None:
+                        path_lat = np.concatenate(([state['position'][0]], path_lat));
+                        path_lon = np.concatenate(([state['position'][1]], path_lon));
+                    distances = get_consecutive_distances(path_lat, path_lon);
+                    if state['position'] == None:
+                        distances = np.concatenate(([0.0], distances));
+                    travelled = state['distance'] + np.cumsum(distances);
+                    bins = np.floor(travelled * target['per_meter']).astype(np.int64);
+                    first_of_bin = get_first_of_each_bin(bins, state['distance_bin']);
+                    state['distance_bin'] = int(bins[-1]);
+                    state['distance'] = float(travelled[-1]);
+                    state['position'] = (float(path_lat[-1]), float(path_lon[-1]));
+                    positions = positions[first_of_bin];
+
+            keep[positions] = True;
+            self.kept_per_type[type] = self.kept_per_type.get(type, 0) + len(positions);
+
+        return [measurements[i] for i in np.flatnonzero(keep)];
+
+    def get_kept_per_type(self) -> Dict:
+        """
+        Returns the number of measurements kept for each type since the decimator was created.
+        """
+        return self.kept_per_type;
+
+    def print_report(self):
+        """
+        Prints how many measurements have been kept for each type.
+        """
+        for type in sorted(self.total_per_type):
+            print("Kept {} of {} measurements of type {}".format(self.kept_per_type.get(type, 0), self.total_per_type[type], type));
+
+
+def filter_measurements(measurements: List, decimator: MeasurementsDecimator = None):
     """
     Reduces the amount of measurements to compute
 
     :param measurements: Original list of measurements to compute
     :type measurements: List[]
+    :param decimator: Decimator used to reduce the measurements. It is only needed when the list passed as
+        parameter is a batch of the trip, so the state of the decimation is kept between batches. If it is
+        not passed, the list is decimated as a whole trip and the number of measurements kept is printed.
+    :type decimator: MeasurementsDecimator
     """
+    if decimator != None:
+        return decimator.decimate(measurements);
 
-    res = [];
-    i = 0;
+    decimator = MeasurementsDecimator();
+    res = decimator.decimate(measurements);
+    decimator.print_report();
+    return res;
 
-    number_of_measurements = len(measurements);
-    if(number_of_measurements > 80000):
-        filter_coefficient = 10;
-    else:
-        filter_coefficient = 1;
 
+def stream_formatted_measurements(batches: Iterable[List]) -> Iterator['MeasurementColumns']:
+    """
+    Filters and formats batches of measurements retrieved from the LiRA database one at a time, yielding
+    the columns of the formatted measurements of every batch.
 
-    for measurement in measurements:
-        if i % filter_coefficient == 0 or measurement[2] == 'obd.trac_cons':
-            if(measurement[3] != None and measurement[4] != None):
-                res.append(measurement);
-        i = i + 1;
-    return res;
+    :param batches: Batches of measurements from the LiRA database
+    :type batches: Iterable[List[]]
+    """
+    decimator = MeasurementsDecimator();
+    for batch in batches:
+        yield format_measurements(filter_measurements(batch, decimator));
+    decimator.print_report();
 
-def format_for_map_matching(measurements: List[Measurement]) -> List:
+def format_for_map_matching(measurements) -> List:
     """
     Returns a list of measurements ready for map matching based on the measurements passed as a parameter.
 
-    :param measurements: List of measurements to format.
-    :type measurements: List[Measurement]
+    :param measurements: Measurements to format, as columns or as a list of views.
+    :type measurements: MeasurementColumns
 
     """
+    columns = MeasurementColumns.from_measurements(measurements);
+    return [list(point) for point in zip(columns.lat.tolist(), columns.lon.tolist(), columns.timestamps.tolist())];
+
 
-    measurementsPos = [];
-    for m in measurements:
-            timestamp = m.created_at;
 
-            if type(timestamp) is str:
-                timestamp = datetime.strptime(timestamp.split('+')[0], '%Y-%m-%d %H:%M:%S.%f')
-            timestamp = time.mktime(timestamp.timetuple())
-            mPos = [m.position[0], m.position[1], timestamp];
-            measurementsPos.append(mPos);
-    return measurementsPos;
+#### COLUMNAR FORMATTING ####
 
+# Types of the formatted measurements. The position of a type in the list is its type code.
+MEASUREMENT_TYPES: List[str] = ['obd.trac_cons', 'acc.xyz.x', 'obd.spd_veh', 'obd.rpm'];
 
 
-def format_3d_measurement(measurement: List, type: str):
+def decode_value_message(message: Dict, type: str):
     """
-    Returns three formatted measurements, one for each dimension. Just for measurements
-    which have 3 dimensions such as acceleration (acc.xyz)
-    :param measurement: List of values representing a measurement
-    :type measurement: List[]
+    Returns the type and the value of a measurement which has 1 dimension such as power consumption (obd.trac_cons),
+    or None if the message does not contain the value.
 
+    :param message: Decoded message of the measurement
+    :type message: Dict
+    :param type: Type of the measurement in the LiRA database
+    :type type: str
     """
-    message = json.loads(measurement[5]);
+    if type + '.value' in message:
+        return type, message[type + '.value'];
+    return None;
+
 
-    if type+'.x' in message:
-        value_x = message[type + '.x'];
-        # value_y = message[type + '.y'];
-        # value_z = message[type + '.z'];
+def decode_x_message(message: Dict, type: str):
+    """
+    Returns the type and the value of the x dimension of a measurement which has 3 dimensions such as
+    acceleration (acc.xyz), or None if the message does not contain it.
 
-        # print(type+'.x' + " " + str(value_x));
-        # print(type+'.y' + " " + str(value_y));
-        # print(type+'.z' + " " + str(value_z));
+    :param message: Decoded message of the measurement
+    :type message: Dict
+    :param type: Type of the measurement in the LiRA database
+    :type type: str
+    """
+    if type + '.x' in message:
+        return type + '.x', message[type + '.x'];
+    return None;
 
-        position = [measurement[3], measurement[4]]
-        mesX = Measurement(measurement[0], type + '.x', position, value_x, measurement[7], measurement[9], measurement[10], -1)
-        # mesY = Measurement(measurement[0], type + '.y', position, value_y, measurement[7], measurement[9], measurement[10], -1)
-        # mesZ = Measurement(measurement[0], type + '.z', position, value_z, measurement[7], measurement[9], measurement[10], -1)
 
-        return [mesX];
-    return [];
+# Decoder of the message payload for each type of measurement in the LiRA database
+MESSAGE_DECODERS: Dict = {
+    'obd.trac_cons': decode_value_message,
+    'acc.xyz': decode_x_message,
+    'obd.spd_veh': decode_value_message,
+    'obd.rpm': decode_value_message
+};
 
 
-def format_2d_measurement(measurement: List, type: str):
+def to_epoch_seconds(timestamps, fractional: bool = False) -> np.ndarray:
     """
-    Returns a formatted measurement. Just for measurements
-    which have 1 dimensions such as power consumption (obd.trac_cons)
-    :param measurement: List of values representing a measurement
-    :type measurement: List[]
+    Converts a sequence of timestamps (datetimes or strings as stored in the LiRA database) into an array
+    of epoch seconds in a single vectorized pass. Timestamps without time zone are considered UTC.
 
+    :param timestamps: Timestamps to convert
+    :type timestamps: List
+    :param fractional: If True, the seconds are returned as floats keeping the fraction of a second.
+    :type fractional: bool
+    """
+    if len(timestamps) == 0:
+        return np.empty(0, dtype=np.float64 if fractional else np.int64);
+    datetimes = pd.to_datetime(pd.Series(list(timestamps), dtype=object), utc=True, format='mixed');
+    elapsed = datetimes - pd.Timestamp(0, tz='UTC');
+    if fractional:
+        return (elapsed / pd.Timedelta(seconds=1)).to_numpy(dtype=np.float64);
+    return (elapsed // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64);
+
+
+class MeasurementColumns:
+    """This is a columnar representation of measurements, and the only storage of their data. Every attribute is an
+    array with one position per measurement. It behaves as a sequence of Measurement views: indexing it with a
+    position returns the view of that position, and slicing it returns columns that share the arrays of the sliced
+    ones, so changes made through either of them are seen by both. Integers that are not known are stored as -1,
+    and distances as NaN.
+
+    :param ids: Ids of the measurements.
+    :type ids: np.ndarray
+    :param type_codes: Position of the type of each measurement in MEASUREMENT_TYPES.
+    :type type_codes: np.ndarray
+    :param lat: Latitude of the measurements.
+    :type lat: np.ndarray
+    :param lon: Longitude of the measurements.
+    :type lon: np.ndarray
+    :param values: Values of the measurements.
+    :type values: np.ndarray
+    :param timestamps: Epoch seconds of when the measurements were measured.
+    :type timestamps: np.ndarray
+    :param trips: Ids of the trips to which the measurements pertain.
+    :type trips: np.ndarray
+    :param created_at: Timestamps of when the measurements were measured, as retrieved from the LiRA database.
+    :type created_at: np.ndarray
+    :param updated_at: Timestamps of when the measurements were updated in the LiRA database.
+    :type updated_at: np.ndarray
+    :param segments: Segments to which the measurements pertain. By default they have none.
+    :type segments: np.ndarray
+    :param segment_ids: Ids of the segments to which the measurements pertain. By default they have none.
+    :type segment_ids: np.ndarray
+    :param directions: Directions of the car when the measurements were taken. By default they are not known.
+    :type directions: np.ndarray
+    :param ways: Ids of the ways to which the measurements pertain. By default they have none.
+    :type ways: np.ndarray
+    :param way_node_offsets: Positions in the nodes of their ways of the first nodes of the segments of the measurements.
+        By default they are not known.
+    :type way_node_offsets: np.ndarray
+    :param distances_along_segment: Distances in meters from the first positions of the segments to the measurements.
+        By default they are not known.
+    :type distances_along_segment: np.ndarray
     """
-    message = json.loads(measurement[5]);
 
-    if type + '.value' in message:
-        value = message[type + '.value'];
-        
-        position = [measurement[3], measurement[4]]
-        mes = Measurement(measurement[0], type, position, value, measurement[7], measurement[9], measurement[10], -1)
-        return [mes];
+    # Names of the columns, in the order of the parameters
+    COLUMNS: List[str] = ['ids', 'type_codes', 'lat', 'lon', 'values', 'timestamps', 'trips', 'created_at', 'updated_at',
+        'segments', 'segment_ids', 'directions', 'ways', 'way_node_offsets', 'distances_along_segment'];
+
+    def __init__(self, ids, type_codes, lat, lon, values, timestamps, trips, created_at, updated_at, segments = None,
+            segment_ids = None, directions = None, ways = None, way_node_offsets = None, distances_along_segment = None):
+        self.ids: np.ndarray = ids;
+        self.type_codes: np.ndarray = type_codes;
+        self.lat: np.ndarray = lat;
+        self.lon: np.ndarray = lon;
+        self.values: np.ndarray = values;
+        self.timestamps: np.ndarray = timestamps;
+        self.trips: np.ndarray = trips;
+        self.created_at: np.ndarray = created_at;
+        self.updated_at: np.ndarray = updated_at;
+        self.segments: np.ndarray = segments if segments is not None else np.full(len(ids), None, dtype=object);
+        self.segment_ids: np.ndarray = segment_ids if segment_ids is not None else np.full(len(ids), -1, dtype=np.int64);
+        self.directions: np.ndarray = directions if directions is not None else np.full(len(ids), -1, dtype=np.int8);
+        self.ways: np.ndarray = ways if ways is not None else np.full(len(ids), -1, dtype=np.int64);
+        self.way_node_offsets: np.ndarray = way_node_offsets if way_node_offsets is not None else np.full(len(ids), -1, dtype=np.int64);
+        self.distances_along_segment: np.ndarray = distances_along_segment if distances_along_segment is not None else np.full(len(ids), np.nan);
+
+    @staticmethod
+    def empty():
+        """
+        Returns columns without measurements.
+        """
+        return MeasurementColumns(np.empty(0, dtype=object), np.empty(0, dtype=np.int8), np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=object), np.empty(0, dtype=object), np.empty(0, dtype=object));
+
+    def __len__(self):
+        return len(self.ids);
+
+    def __iter__(self):
+        for row in range(len(self.ids)):
+            yield Measurement(self, row);
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return MeasurementColumns(*[getattr(self, name)[key] for name in MeasurementColumns.COLUMNS]);
+        row = int(key);
+        if row < 0:
+            row += len(self.ids);
+        if row < 0 or row >= len(self.ids):
+            raise IndexError(key);
+        return Measurement(self, row);
+
+    def take(self, positions: np.ndarray):
+        """
+        Returns new columns with a copy of the measurements at some positions.
 
-    return [];
+        :param positions: Positions of the measurements to copy
+        :type positions: np.ndarray
+        """
+        positions = np.asarray(positions, dtype=np.int64);
+        return MeasurementColumns(*[getattr(self, name)[positions] for name in MeasurementColumns.COLUMNS]);
+
+    def set_segments(self, positions, segments: List[Segment]):
+        """
+        Assigns segments to the measurements at some positions.
 
+        :param positions: Positions of the measurements
+        :type positions: np.ndarray
+        :param segments: Segments to assign, or None to remove the segment of a measurement
+        :type segments: List[Segment]
+        """
+        for position, segment in zip(np.asarray(positions, dtype=np.int64).tolist(), segments):
+            self.segments[position] = segment;
+            self.segment_ids[position] = segment.id if segment != None else -1;
+
+    @staticmethod
+    def concatenate(columns_list: List):
+        """
+        Returns new columns with the measurements of many columns, one after the other.
 
-def format_measurements(measurements: List):
+        :param columns_list: Columns to concatenate
+        :type columns_list: List[MeasurementColumns]
+        """
+        if len(columns_list) == 0:
+            return MeasurementColumns.empty();
+        return MeasurementColumns(*[np.concatenate([getattr(columns, name) for columns in columns_list]) for name in MeasurementColumns.COLUMNS]);
+
+    @staticmethod
+    def from_measurements(measurements):
+        """
+        Returns the columns of a sequence of measurements, in the same order. If they already are columns, or views of
+        all the positions of the same columns in order, those columns are returned. Otherwise the measurements are
+        copied to new columns.
+
+        :param measurements: Measurements
+        :type measurements: List[Measurement]
+        """
+        if isinstance(measurements, MeasurementColumns):
+            return measurements;
+
+        rows_per_columns: Dict = {};
+        for k in range(len(measurements)):
+            measurement = measurements[k];
+            columns, rows, orders = rows_per_columns.setdefault(id(measurement.columns), (measurement.columns, [], []));
+            rows.append(measurement.row);
+            orders.append(k);
+
+        if len(rows_per_columns) == 0:
+            return MeasurementColumns.empty();
+        if len(rows_per_columns) == 1:
+            columns, rows, _ = next(iter(rows_per_columns.values()));
+            if len(rows) == len(columns) and rows == list(range(len(columns))):
+                return columns;
+            return columns.take(rows);
+
+        res = MeasurementColumns.concatenate([columns.take(rows) for columns, rows, _ in rows_per_columns.values()]);
+        orders = np.concatenate([np.array(orders, dtype=np.int64) for _, _, orders in rows_per_columns.values()]);
+        return res.take(np.argsort(orders, kind='stable'));
+
+    def to_measurements(self) -> List[Measurement]:
+        """
+        Returns the views of all the measurements of the columns.
+        """
+        return list(self);
+
+
+def format_measurements_columns(measurements: List) -> MeasurementColumns:
+    """
+    Takes measurements that have been retrieved from the LiRA database and parses them in one pass into
+    a columnar representation. The messages of all the measurements are parsed in a single JSON document,
+    and each one is decoded with the decoder of its type.
+
+    :param measurements: List of measurements
+    :type measurements: List[]
     """
-    Takes measurements that have been retrieved from the LiRA database and formats them into Measurement class instances.
+    type_codes_per_type = {type: code for code, type in enumerate(MEASUREMENT_TYPES)};
+
+    rows = [row for row in measurements if row[2] in MESSAGE_DECODERS];
+    messages = json.loads('[' + ','.join([row[5] for row in rows]) + ']');
+
+    kept = [];
+    type_codes = [];
+    values = [];
+    for row, message in zip(rows, messages):
+        decoded = MESSAGE_DECODERS[row[2]](message, row[2]);
+        if decoded == None:
+            continue;
+
+        type, value = decoded;
+        kept.append(row);
+        type_codes.append(type_codes_per_type[type]);
+        values.append(value);
+
+    created_at = [row[9] for row in kept];
+    return MeasurementColumns(
+        np.array([row[0] for row in kept], dtype=object),
+        np.array(type_codes, dtype=np.int8),
+        np.array([row[3] for row in kept], dtype=np.float64),
+        np.array([row[4] for row in kept], dtype=np.float64),
+        np.array(values, dtype=np.float64),
+        to_epoch_seconds(created_at),
+        np.array([row[7] for row in kept], dtype=object),
+        np.array(created_at, dtype=object),
+        np.array([row[10] for row in kept], dtype=object)
+    );
+
+
+def format_measurements(measurements: List) -> MeasurementColumns:
+    """
+    Takes measurements that have been retrieved from the LiRA database and formats them into columns. The columns
+    behave as a list of Measurement views, which are only created when a measurement is accessed.
     :param measurement: List of measurements
     :type measurement: List[]
 
     """
-    res = [];
-    for row in measurements:
-        type = row[2];
-        parts = type.split('.');
-        if parts[1] == 'xyz':
-            res = res + format_3d_measurement(row, type);
-        else:
-            res = res + format_2d_measurement(row, type);
-
-    return res;
+    return format_measurements_columns(measurements);
 
 
 
@@ -177,13 +734,23 @@ def parse_measurements(measurements_rows: List) -> List[Measurement]:
     :type measurement: List[]
 
     """
-    measurements = [];
-    for row in measurements_rows:
-        position = (row[8], row[9]);
-        measurement = Measurement(row[0], row[1], position, row[3], row[4], row[5], row[6], row[7])
-        measurements.append(measurement);
-
-    return measurements;
+    type_codes_per_type = {type: code for code, type in enumerate(MEASUREMENT_TYPES)};
+    columns = MeasurementColumns(
+        np.array([row[0] for row in measurements_rows], dtype=object),
+        np.array([type_codes_per_type[row[1]] for row in measurements_rows], dtype=np.int8),
+        np.array([row[8] for row in measurements_rows], dtype=np.float64),
+        np.array([row[9] for row in measurements_rows], dtype=np.float64),
+        np.array([row[3] for row in measurements_rows], dtype=np.float64),
+        to_epoch_seconds([row[5] for row in measurements_rows]),
+        np.array([row[4] for row in measurements_rows], dtype=object),
+        np.array([row[5] for row in measurements_rows], dtype=object),
+        np.array([row[6] for row in measurements_rows], dtype=object)
+    );
+    # The segments of the rows are kept as the ids stored in the database
+    for row in range(len(measurements_rows)):
+        columns.segments[row] = measurements_rows[row][7];
+    columns.segment_ids[:] = [row[7] for row in measurements_rows];
+    return columns.to_measurements();
 
 
 
@@ -194,12 +761,19 @@ class Measurements(object):
     It is programmed as a Singleton so one instance exists at the same time and so it can be accessed from any point
     in the pipeline.
     """
-    measurements: List[Measurement] = [];
+    # Columns of the measurements, which are the only storage of their data. Measurements are returned as views of them.
+    columns: MeasurementColumns = MeasurementColumns.empty();
+    type_codes_per_type: Dict = {type: code for code, type in enumerate(MEASUREMENT_TYPES)};
+
+    # Ids of the measurements sorted, and the position of each of them, to find measurements by id with a binary search
+    sorted_ids: np.ndarray = np.empty(0, dtype=object);
+    positions_per_sorted_id: np.ndarray = np.empty(0, dtype=np.int64);
 
-    measurements_per_type: Dict = {};
-    measurements_per_segment: Dict = {};
-    segment_of_measurement: Dict = {};
-    measurements_per_id: Dict = {};
+    # Positions of the measurements grouped by segment in trip order, by segment and type in time order
+    # and by type in time order
+    groups_per_segment: SortedGroups = None;
+    groups_per_segment_and_type: SortedGroups = None;
+    groups_per_type: SortedGroups = None;
 
     #### SINGLETON ####
 
@@ -211,7 +785,7 @@ class Measurements(object):
 
     
     def compute_data(self, measurements: List[Measurement]):
-        """Assigns a segment and a direction to each measurement passed as parameter. Afterwards it stores them as a list and dictionaries
+        """Assigns a segment and a direction to each measurement passed as parameter. Afterwards it stores them as columns
         in the class instance.
 
         :param measurements: Measurements that need to be assigned to a segment.
@@ -220,7 +794,6 @@ class Measurements(object):
         """
         print("computing measurements for a trip")
         computed_measurements = self.compute_measurements(measurements)
-        self.measurements = computed_measurements;
         print("generating dictionaries")
         self.generate_dictionaries(computed_measurements)
         print("computing directions")
@@ -231,11 +804,12 @@ class Measurements(object):
         """
         Deletes all the data stored in the class instance.
         """
-        self.measurements = [];
-        self.measurements_per_type = {};
-        self.measurements_per_segment = {};
-        self.segment_of_measurement = {};
-        self.measurements_per_id = {};
+        self.columns = MeasurementColumns.empty();
+        self.sorted_ids = np.empty(0, dtype=object);
+        self.positions_per_sorted_id = np.empty(0, dtype=np.int64);
+        self.groups_per_segment = None;
+        self.groups_per_segment_and_type = None;
+        self.groups_per_type = None;
 
 
     #### DATABASE ####
@@ -244,7 +818,7 @@ class Measurements(object):
         """
         Inserts the Measurements into the Measurements table in the visualization database. 
         """
-        measurements = self.measurements;
+        measurements = self.columns;
         if len(measurements) == 0:
             return;
 
@@ -270,35 +844,35 @@ class Measurements(object):
 
     #### DICTIONARY GENERATION ####
 
-    def generate_dictionaries(self, computed_measurements: List[Measurement]):
+    def generate_dictionaries(self, computed_measurements):
         """
-        Computes dictionaries that store the measurements. The purpose of the dictionaries is for measurements to be
-        accessed and searched in a most efficient way.
+        Stores the columns of the measurements and computes their groupings by segment and type. The purpose of the
+        groupings is for measurements to be accessed and searched in a most efficient way: groups are found with a binary
+        search over the sorted keys, and the measurements of a group are sorted by time.
 
-        :param computed_measurements: Measurements to be inserted into the dictionaries.
-        :type computed_measurement: List[Measurement] 
+        :param computed_measurements: Measurements to be stored, as columns or as a list of views.
+        :type computed_measurement: MeasurementColumns
         """
-        computed_types = [];
-        computed_segments = [];
-        for measurement in computed_measurements:
+        columns = MeasurementColumns.from_measurements(computed_measurements);
+        self.columns = columns;
 
-            self.segment_of_measurement[measurement.id] = measurement.segment;
-            self.measurements_per_id[measurement.id] = measurement;
+        self.positions_per_sorted_id = np.argsort(columns.ids, kind='stable').astype(np.int64);
+        self.sorted_ids = columns.ids[self.positions_per_sorted_id];
 
-            type = measurement.type;
-            if type in computed_types:
-                self.measurements_per_type[type].append(measurement);
-            else:
-                self.measurements_per_type[type] = [measurement];
-                computed_types.append(type);
+        self.groups_per_segment = SortedGroups(columns.segment_ids);
+        self.groups_per_segment_and_type = SortedGroups(self.get_segment_and_type_keys(columns.segment_ids, columns.type_codes), columns.timestamps);
+        self.groups_per_type = SortedGroups(columns.type_codes, columns.timestamps);
 
-            segment = measurement.segment.id;
-            if segment in computed_segments:
-                self.measurements_per_segment[segment].append(measurement);
-            else:
-                self.measurements_per_segment[segment] = [measurement];
-                computed_segments.append(segment);
+    def get_segment_and_type_keys(self, segment_ids, type_codes):
+        """
+        Returns the keys of the groups by segment and type.
 
+        :param segment_ids: Ids of the segments
+        :type segment_ids: np.ndarray
+        :param type_codes: Codes of the types
+        :type type_codes: np.ndarray
+        """
+        return np.asarray(segment_ids, dtype=np.int64) * len(MEASUREMENT_TYPES) + np.asarray(type_codes, dtype=np.int64);
 
 
 
@@ -307,25 +881,10 @@ class Measurements(object):
     def compute_directions(self):
         """
         Computes the directions for the measurements stored in the class instance. Direction refers
-        to the direction of the car when the measurement was taken.
+        to the direction of the car when the measurement was taken. The directions of all the segments
+        are detected at once with the current direction detector.
         """
-        for measurement in self.measurements:
-            segment_o: Segment = measurement.segment;
-            position_b = segment_o.position_b;
-
-            measurements_of_segment:List[Measurement] = self.measurements_per_segment[measurement.segment.id]
-            first_measurement = measurements_of_segment[0];
-            last_measurement = measurements_of_segment[len(measurements_of_segment) - 1];
-
-            distance_m1 = self.calculate_distance(first_measurement.position, position_b);
-            distance_m2 = self.calculate_distance(last_measurement.position, position_b);
-
-            if distance_m2 < distance_m1:
-                direction = 0;
-            else:
-                direction = 1;
-
-            measurement.direction = direction;
+        self.columns.directions[:] = get_direction_detector().get_directions(self.columns, self.groups_per_segment);
 
         return;
     
@@ -339,48 +898,147 @@ class Measurements(object):
         :param measurement_id: Id of the measurement
         :type measurement_id: str
         """
-        return self.measurements_per_id[measurement_id];
+        k = int(np.searchsorted(self.sorted_ids, measurement_id));
+        if k == len(self.sorted_ids) or self.sorted_ids[k] != measurement_id:
+            raise KeyError(measurement_id);
+        return self.columns[self.positions_per_sorted_id[k]];
 
-    def get_next_measurement_of_type_in_segment(self, type:str, created_at, segment_id:int) -> Measurement:
-        measurements = self.measurements_per_segment[segment_id];
-        for measurement in measurements:
-            if measurement.type == type:
-                if measurement.created_at >= created_at:
-                    return measurement;
-        return None;
+    def get_measurements_in_segment(self, segment_id: int) -> List[Measurement]:
+        """
+        Returns the measurements of a segment in trip order.
 
-    def get_previous_measurement_of_type_in_segment(self, type:str, created_at, segment_id:int) -> Measurement:
-        measurements = self.measurements_per_segment[segment_id];
-        for measurement in measurements:
-            if measurement.type == type:
-                if measurement.created_at <= created_at:
-                    return measurement;
-        return None;
+        :param segment_id: Id of the segment
+        :type segment_id: int
+        """
+        return [self.columns[i] for i in self.groups_per_segment.get_group(segment_id).tolist()];
+
+    def get_positions_of_type_in_segment(self, type: str, segment_id: int) -> np.ndarray:
+        """
+        Returns the positions of the measurements of a certain type and a certain segment sorted by time.
+
+        :param type: Type of the measurements
+        :type type: str
+        :param segment_id: Id of the segment
+        :type segment_id: int
+        """
+        if type not in self.type_codes_per_type:
+            return np.empty(0, dtype=np.int64);
+        return self.groups_per_segment_and_type.get_group(self.get_segment_and_type_keys(segment_id, self.type_codes_per_type[type]));
+
+    def get_next_measurement_of_type_in_segment(self, type:str, timestamp:int, segment_id:int) -> Measurement:
+        """
+        Returns the first measurement of a certain type and a certain segment taken at or after a timestamp,
+        or None if there is no such measurement.
+
+        :param type: Type of the measurement
+        :type type: str
+        :param timestamp: Epoch seconds of reference
+        :type timestamp: int
+        :param segment_id: Id of the segment of reference
+        :type segment_id: int
+
+        """
+        positions = self.get_positions_of_type_in_segment(type, segment_id);
+        i = int(np.searchsorted(self.columns.timestamps[positions], timestamp, side='left'));
+        return self.columns[positions[i]] if i < len(positions) else None;
+
+    def get_previous_measurement_of_type_in_segment(self, type:str, timestamp:int, segment_id:int) -> Measurement:
+        """
+        Returns the last measurement of a certain type and a certain segment taken at or before a timestamp,
+        or None if there is no such measurement.
+
+        :param type: Type of the measurement
+        :type type: str
+        :param timestamp: Epoch seconds of reference
+        :type timestamp: int
+        :param segment_id: Id of the segment of reference
+        :type segment_id: int
+
+        """
+        positions = self.get_positions_of_type_in_segment(type, segment_id);
+        i = int(np.searchsorted(self.columns.timestamps[positions], timestamp, side='right')) - 1;
+        return self.columns[positions[i]] if i >= 0 else None;
     
-    def get_closest_measurement_of_type_in_segment(self, type:str, created_at, segment_id:int):
+    def get_closest_measurement_of_type_in_segment(self, type:str, timestamp:int, segment_id:int, max_gap:int = None):
         """
         Returns the measurement with the closest timestamp to another timestamp of a measurement
-        of a certain type and a certain segment.
+        of a certain type and a certain segment. If both neighbours are equally close, the previous one is returned.
 
         :param type: Type of the measurement
         :type type: str
-        :param created_at: Timestamp of reference
-        :type created_at: str
+        :param timestamp: Epoch seconds of reference
+        :type timestamp: int
         :param segment_id: Id of the segment of reference
         :type segment_id: int
+        :param max_gap: Maximum difference in seconds between the timestamps. If None, there is no maximum.
+        :type max_gap: int
 
         """
-        res = self.get_previous_measurement_of_type_in_segment(type, created_at, segment_id)
-        if res == None:
-            res = self.get_next_measurement_of_type_in_segment(type, created_at, segment_id)
+        previous = self.get_previous_measurement_of_type_in_segment(type, timestamp, segment_id);
+        next = self.get_next_measurement_of_type_in_segment(type, timestamp, segment_id);
+        if previous == None or (next != None and next.timestamp - timestamp < timestamp - previous.timestamp):
+            res = next;
+        else:
+            res = previous;
+
+        if res != None and max_gap != None and abs(res.timestamp - timestamp) > max_gap:
+            return None;
+        return res;
+
+    def get_closest_measurements_of_type(self, measurements: List[Measurement], type: str, max_gap: int = None) -> List[Measurement]:
+        """
+        Returns, for each measurement passed as parameter, the measurement of a certain type of the whole trip with the
+        closest timestamp, or None if there is none within the maximum gap. All the measurements are joined at once
+        with the measurements of the type sorted by time.
+
+        :param measurements: Measurements of reference
+        :type measurements: List[Measurement]
+        :param type: Type of the joined measurements
+        :type type: str
+        :param max_gap: Maximum difference in seconds between the timestamps. If None, there is no maximum.
+        :type max_gap: int
+
+        """
+        timestamps = np.array([measurement.timestamp for measurement in measurements], dtype=np.int64);
+        return [self.columns[i] if i != -1 else None for i in self.get_closest_positions_of_type(timestamps, type, max_gap).tolist()];
+
+    def get_positions_of_type(self, type: str) -> np.ndarray:
+        """
+        Returns the positions of the measurements of a certain type sorted by time.
+
+        :param type: Type of the measurements
+        :type type: str
+        """
+        if type not in self.type_codes_per_type:
+            return np.empty(0, dtype=np.int64);
+        return self.groups_per_type.get_group(self.type_codes_per_type[type]);
+
+    def get_closest_positions_of_type(self, timestamps: np.ndarray, type: str, max_gap: int = None) -> np.ndarray:
+        """
+        Returns, for each timestamp passed as parameter, the position of the measurement of a certain type of the whole
+        trip with the closest timestamp, or -1 if there is none within the maximum gap.
+
+        :param timestamps: Epoch seconds of reference
+        :type timestamps: np.ndarray
+        :param type: Type of the joined measurements
+        :type type: str
+        :param max_gap: Maximum difference in seconds between the timestamps. If None, there is no maximum.
+        :type max_gap: int
+
+        """
+        positions_of_type = self.get_positions_of_type(type);
+        nearest = get_nearest_in_time(self.columns.timestamps[positions_of_type], timestamps, max_gap);
+        res = np.full(len(nearest), -1, dtype=np.int64);
+        found = nearest != -1;
+        res[found] = positions_of_type[nearest[found]];
         return res;
 
     def get_measurements(self) -> List[Measurement]:
         """
-        Returns all the measurements stored in the instance of the class.
+        Returns views of all the measurements stored in the instance of the class.
         """
         
-        return self.measurements;
+        return self.columns.to_measurements();
 
 
 
@@ -397,81 +1055,56 @@ class Measurements(object):
         :param point_b: Latitude and longitude of the second geographical point.
         :type point_b: List[float]
         """
-        a = (point_a[0], point_a[1]);
-        b = (point_b[0], point_b[1]);
-        return geopy.distance.distance(a, b).km;
-
-
-    # Determines if pointC is in the segment composed by points A and B
-    def is_point_c_between_a_and_b(self, point_a, point_b, point_c):
-        """
-        Returns if a geographical point C is between a geographical point A and a 
-        geographical point B.
-
-        :param point_a: Latitude and longitude of point A.
-        :type point_a: List[float]
-        :param point_b: Latitude and longitude of point B.
-        :type point_b: List[float]
-        :param point_c: Latitude and longitude of point C.
-        :type point_c: List[float]
-        """
-        distance_ab = geopy.distance.distance(point_a, point_b).km;
-        distance_ac = geopy.distance.distance(point_a, point_c).km;
-        distance_bc = geopy.distance.distance(point_b, point_c).km;
-
-        sum = distance_ac + distance_bc;
+        return haversine_distance(point_a, point_b) / 1000;
 
-        range_a = distance_ab - 0.005;
-        range_b = distance_ab + 0.005;
 
-        if (sum >= range_a) & (sum <= range_b):
-            return True;       
-        
-        return False;
-
-    # For a determined measurement looks for the segment it corresponds by calculating for all segments in it's way
-    def compute_measurement(self, measurement:Measurement, segments:List[Segment]) -> int:
+    # For a determined measurement looks for the nearest segment of it's way
+    def compute_measurement(self, measurement:Measurement) -> int:
         """
-        Assigns a segment to a measurement.
+        Assigns a segment to a measurement. It is the nearest segment of the way of the measurement, if it is
+        closer than SEGMENT_MAX_DISTANCE.
 
         :param measurement: Measurement that needs a segment to be assigned to it.
         :type measurement: Measurement
-        :param segments: Candidate segments for assigning the measurement to.
-        :type segments: List[Segment]
     
         """
-        for segment in segments:
-            point_a = (segment.position_a[0], segment.position_a[1]);
-            point_b = (segment.position_b[0], segment.position_b[1]);
-            point_c = (measurement.position[0], measurement.position[1]);
-            if self.is_point_c_between_a_and_b(point_a, point_b, point_c):
-                return segment.id;
-        
-        return -1;
+        return Segments().get_nearest_segment(measurement.position, SEGMENT_MAX_DISTANCE, measurement.way);
 
     # {'distance_from_trace_point': 0.173, 'edge_index': 0,
     #  'type': 'matched', 'distance_along_edge': 0.931, 'lat': 55.70058, 'lon': 12.565007}
     # Assigns to each measurement a segment of it's way
-    def compute_measurements(self, measurements: List[Measurement]) -> List[Measurement]:
+    def compute_measurements(self, measurements) -> MeasurementColumns:
 
         """
-        Assigns segments to a list of measurements.
+        Assigns segments to a list of measurements and returns the columns of the ones that have been assigned.
+        Measurements whose map matching gave their position in the nodes of their way are assigned directly to the
+        segment that starts there. The rest of the measurements of each way are projected onto all the segments of
+        the way at once, and each one is assigned to the nearest segment closer than SEGMENT_MAX_DISTANCE.
+        Measurements without such a segment are discarded.
         
-        :param measurements: Measurements that need a segment to be assigned to them.
-        :type measurements: List[Measurement]
+        :param measurements: Measurements that need a segment to be assigned to them, as columns or as a list of views.
+        :type measurements: MeasurementColumns
         """
 
-        i = 0;
-        res = [];
-
         segments_dictionary = Segments();
-        for measurement in measurements:
-
-            segment = self.compute_measurement(measurement, segments_dictionary.get_segments_in_a_way(measurement.way));
-            
-            if segment != -1:
-                measurement.segment = Segments().get_segments_by_id(segment);
-                res.append(measurement)
-            i = i + 1;
-            
-        return res;
+        columns = MeasurementColumns.from_measurements(measurements);
+        assigned = np.zeros(len(columns), dtype=bool);
+
+        for i in np.flatnonzero(columns.way_node_offsets != -1).tolist():
+            segment = segments_dictionary.get_segment_at_way_node_offset(int(columns.ways[i]), int(columns.way_node_offsets[i]));
+            if segment != None:
+                columns.set_segments([i], [segment]);
+                assigned[i] = True;
+
+        remaining = np.flatnonzero(~assigned);
+        groups_per_way = SortedGroups(columns.ways[remaining]);
+        for way in groups_per_way.keys.tolist():
+            positions = remaining[groups_per_way.get_group(way)];
+            segment_ids, _, distances_along = segments_dictionary.spatial_index.get_nearest_segments_in_way(columns.lat[positions], columns.lon[positions], way, SEGMENT_MAX_DISTANCE);
+
+            found = segment_ids != -1;
+            columns.set_segments(positions[found], [segments_dictionary.get_segments_by_id(int(segment_id)) for segment_id in segment_ids[found].tolist()]);
+            columns.distances_along_segment[positions[found]] = distances_along[found];
+            assigned[positions[found]] = True;
+
+        return columns.take(np.flatnonzero(assigned));
@@ -1,10 +1,11 @@
 
 from auxiliar_modules.auxiliar_classes import Node, Way
 from auxiliar_modules.db_queries import get_segments_from_ways;
-import geopy;
-import geopy.distance
 from auxiliar_modules.auxiliar_classes import NodesDictionary, WaysDictionary;
 from auxiliar_modules.db_queries import connect;
+from auxiliar_modules.geodesy import haversine_distance, haversine_distances;
+from auxiliar_modules.spatial_index import SegmentsIndex;
+import numpy as np
 import random;
 from typing import List, Dict
 
@@ -66,6 +67,7 @@ class Segments(object):
 
     segments_per_id: Dict = {};
     segments_per_way: Dict = {};
+    spatial_index: SegmentsIndex = None;
 
     #### SINGLETON ####
 
@@ -98,6 +100,7 @@ class Segments(object):
         self.segments = [];
         self.segments_per_id = {};
         self.segments_per_way = {};
+        self.spatial_index = None;
 
 
 
@@ -137,22 +140,17 @@ class Segments(object):
 
     def generate_dictionaries(self, computed_segments: List[Segment]):
         """
-        Computes dictionaries that store the segments. The purpose of the dictionaries is for segments to be
+        Computes dictionaries and the index by way that store the segments. The purpose of the dictionaries is for segments to be
         accessed and searched in a most efficient way.
 
         :param computed_segments: Segments to be inserted into the dictionaries.
         :type computed_segments: List[Segment] 
         """
-        computed_ways = [];
         for segment in computed_segments:
             self.segments_per_id[segment.id] = segment;
-            way = segment.way;
-           
-            if way in computed_ways:
-                self.segments_per_way[way].append(segment);
-            else:
-                self.segments_per_way[way] = [segment];
-                computed_ways.append(way);
+            self.segments_per_way.setdefault(segment.way, []).append(segment);
+
+        self.spatial_index = SegmentsIndex(computed_segments);
 
     
 
@@ -175,6 +173,42 @@ class Segments(object):
         :type seg_id: int
         """
         return self.segments_per_id[seg_id];
+
+    def get_segment_at_way_node_offset(self, way_id: int, offset: int) -> Segment:
+        """
+        Returns the Segment of a way that starts at a position in the nodes of the way, or None if there is no such Segment.
+
+        :param way_id: Id of the way.
+        :type way_id: int
+        :param offset: Position in the nodes of the way of the first node of the Segment.
+        :type offset: int
+        """
+        way = WaysDictionary().get_way_by_id(way_id);
+        if offset < 0 or offset + 1 >= len(way.nodes):
+            return None;
+
+        node_dictionary = NodesDictionary();
+        node_a = node_dictionary.get_node_by_id(way.nodes[offset]);
+        node_b = node_dictionary.get_node_by_id(way.nodes[offset + 1]);
+        segment = self.segments_per_id.get(self.generate_id(way, node_a, node_b));
+        if segment == None or segment.way != way_id:
+            return None;
+        return segment;
+
+    def get_nearest_segment(self, point: List[float], max_distance: float, way_id: int) -> int:
+        """
+        Returns the id of the Segment of a way nearest to a geographical point, or -1 if no Segment of the way is closer
+        than the maximum distance.
+
+        :param point: Latitude and longitude of the point.
+        :type point: List[float]
+        :param max_distance: Maximum distance in meters from the point to the Segment.
+        :type max_distance: float
+        :param way_id: Id of the way of the Segments.
+        :type way_id: int
+        """
+        segment_ids, _, _ = self.spatial_index.get_nearest_segments_in_way(np.array([float(point[0])]), np.array([float(point[1])]), way_id, max_distance);
+        return int(segment_ids[0]);
         
     
     #### SEGMENT COMPUTATION ####
@@ -189,9 +223,7 @@ class Segments(object):
         :param point_b: Latitude and longitude of the second geographical point.
         :type point_b: List[float]
         """
-        a = (point_a[0], point_a[1]);
-        b = (point_b[0], point_b[1]);
-        return geopy.distance.distance(a, b).km;
+        return haversine_distance(point_a, point_b) / 1000;
 
     def generate_id(self, way: Way, node_a: Node, node_b: Node) -> int:
         """
@@ -225,16 +257,40 @@ class Segments(object):
 
         # <overpy.Way id=1880634 nodes=[8082256, 8082270, 1377590132, 8082258, 1659103599, 8082259, 8082260, 1659103318, 8082261, 1605138498, 294211770, 1038008328]>
         # <overpy.Node id=125436 lat=55.7207330 lon=12.5437336>
-        way_nodes = way.nodes;
-        res = [];
+        return self.compute_ways([way]);
+
+    # Divides many ways into their segments at once
+    def compute_ways(self, ways: List[Way]) -> List[Segment]:
+        """
+        Returns the computed segments for a list of ways. The nodes of all the ways are laid in a single array
+        and the lengths of all the segments are computed in one vectorized pass.
+
+        :param: ways: Ways to be computed.
+        :type ways: List[:class Way]
+
+        """
         node_dictionary = NodesDictionary();
-        for x in range(len(way_nodes) - 1):
-            node_a = node_dictionary.get_node_by_id(way_nodes[x]);
-            node_b = node_dictionary.get_node_by_id(way_nodes[x + 1]);
-            position_a = [float(node_a.lat), float(node_a.lon)];
-            position_b = [float(node_b.lat), float(node_b.lon)];
-            
-            segment = Segment(self.generate_id(way, node_a, node_b), position_a, position_b, self.calculate_distance(position_a, position_b), way.id);
+        nodes = [node_dictionary.get_node_by_id(node_id) for way in ways for node_id in way.nodes];
+        if len(nodes) < 2:
+            return [];
+
+        lat = np.array([float(node.lat) for node in nodes], dtype=np.float64);
+        lon = np.array([float(node.lon) for node in nodes], dtype=np.float64);
+        way_index = np.repeat(np.arange(len(ways)), [len(way.nodes) for way in ways]);
+
+        # A segment joins two consecutive nodes of the same way
+        starts = np.flatnonzero(way_index[1:] == way_index[:-1]);
+        lengths = haversine_distances(lat[starts], lon[starts], lat[starts + 1], lon[starts + 1]) / 1000;
+
+        res = [];
+        for start, length in zip(starts.tolist(), lengths.tolist()):
+            way = ways[way_index[start]];
+            node_a = nodes[start];
+            node_b = nodes[start + 1];
+            position_a = [lat[start].item(), lon[start].item()];
+            position_b = [lat[start + 1].item(), lon[start + 1].item()];
+
+            segment = Segment(self.generate_id(way, node_a, node_b), position_a, position_b, length, way.id);
             res.append(segment);
 
         return res;
@@ -249,13 +305,8 @@ class Segments(object):
         :type way_ids: List[int]
       
         """
-        segments_list = [];
         way_dictionary = WaysDictionary();
-        if len(way_ids) != 0:
-            for way_id in way_ids:
-                segments_list = segments_list + self.compute_way(way_dictionary.get_way_by_id(way_id));
-            
-        return segments_list;
+        return self.compute_ways([way_dictionary.get_way_by_id(way_id) for way_id in way_ids]);
 
 
 
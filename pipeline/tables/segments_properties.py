@@ -4,7 +4,8 @@ import os;
 import pkgutil;
 import row_types.segment_properties as segment_properties_classes;
 import importlib;
-from typing import List
+import numpy as np
+from typing import Dict, List
 
 class SegmentProperty:
     """This is a conceptual class representation of a Segment Property.
@@ -41,6 +42,18 @@ class SegmentProperty:
         """
         pass;
 
+    @classmethod
+    def prefetch(cls, segments: List[Segment]):
+        """Retrieves at once the external data that the segment property needs for all the segments passed as parameter,
+        before the segment properties are created one by one. This method can be overridden by any subclass
+        that implements a segment property.
+
+        :param segments: The segments whose segment properties will be computed
+        :type segments: List[Segment]
+
+        """
+        pass;
+
     def get_db_row(self):
         """Returns a list of values to be inserted in the visualization database as a Segment Property
         """
@@ -71,6 +84,9 @@ class SegmentsProperties(object):
     segment_properties_to_insert: List[SegmentProperty] = [];
     segment_properties_in_db: List[SegmentProperty] = [];
 
+    # type -> segment id -> value
+    segment_properties_per_type: Dict = {};
+
     #### SINGLETON ####
 
     _instance = None
@@ -93,6 +109,7 @@ class SegmentsProperties(object):
         self.segment_properties_in_db = parse_segment_properties(get_segment_properties_in_ways(computed_ways));
 
         self.segment_properties = self.segment_properties_to_insert + self.segment_properties_in_db;
+        self.generate_dictionaries();
         pass;
 
 
@@ -103,6 +120,7 @@ class SegmentsProperties(object):
         self.segment_properties = [];
         self.segment_properties_in_db = [];
         self.segment_properties_to_insert = [];
+        self.segment_properties_per_type = {};
 
     ### DATABASE ####
 
@@ -138,6 +156,19 @@ class SegmentsProperties(object):
 
         
 
+    #### DICTIONARY GENERATION ####
+
+    def generate_dictionaries(self):
+        """
+        Computes the dictionary of the values of the segment properties by type and segment, so they
+        are accessed in constant time.
+        """
+        self.segment_properties_per_type = {};
+        for segment_property in self.segment_properties:
+            values = self.segment_properties_per_type.setdefault(segment_property.type, {});
+            values.setdefault(segment_property.segment.id, segment_property.value);
+
+
     #### SEGMENTS PROPERTIES GENERATION ####
 
     def get_segments_properties_types_classes(self):
@@ -169,16 +200,20 @@ class SegmentsProperties(object):
         segments_table = Segments();
 
         print("Computing segments properties")
+        segments = [];
         for way in ways_to_compute:
-            segments = segments_table.get_segments_in_a_way(way);
+            segments.extend(segments_table.get_segments_in_a_way(way));
+
+        for klass in types_classes:
+            klass.prefetch(segments);
 
-            for segment in segments:
-                for klass in types_classes:
-                    property = klass(-1, segment);
+        for segment in segments:
+            for klass in types_classes:
+                property = klass(-1, segment);
+
+                if property.value != None:
+                    res.append(property);
 
-                    if property.value != None:
-                        res.append(property);
-            
         return res;
 
 
@@ -191,7 +226,30 @@ class SegmentsProperties(object):
         :param segment_id: Id of the segment 
         :type segment_id: int
         """
-        for segment_property in self.segment_properties:
-            if segment_property.type == property_name and segment_property.segment.id == segment_id:
-                return segment_property.value;
-        return None;
\ No newline at end of file
+        return self.segment_properties_per_type.get(property_name, {}).get(segment_id);
+
+    def get_segment_properties(self, property_name: str, segment_ids: np.ndarray) -> np.ndarray:
+        """
+        Returns a segment property of many segments, with NaN for the segments without it
+
+        :param property_name: Name of the segment property
+        :type property_name: str
+        :param segment_ids: Ids of the segments
+        :type segment_ids: np.ndarray
+        """
+        values = self.segment_properties_per_type.get(property_name, {});
+        unique_segment_ids, inverse = np.unique(np.asarray(segment_ids, dtype=np.int64), return_inverse=True);
+        return np.array([values.get(segment_id, np.nan) for segment_id in unique_segment_ids.tolist()], dtype=np.float64)[inverse];
+
+    def have_segment_property(self, property_name: str, segment_ids: np.ndarray) -> np.ndarray:
+        """
+        Returns whether each of many segments has a value of a segment property
+
+        :param property_name: Name of the segment property
+        :type property_name: str
+        :param segment_ids: Ids of the segments
+        :type segment_ids: np.ndarray
+        """
+        values = self.segment_properties_per_type.get(property_name, {});
+        unique_segment_ids, inverse = np.unique(np.asarray(segment_ids, dtype=np.int64), return_inverse=True);
+        return np.array([values.get(segment_id) != None for segment_id in unique_segment_ids.tolist()], dtype=bool)[inverse];
\ No newline at end of file
@@ -66,7 +66,7 @@ class TestTables(unittest.TestCase):
         SegmentsProperties().compute_data(self.__class__.computed_ways, self.__class__.not_computed_ways);
 
     def test_7_computed_values_table(self):
-        ComputedValues().compute_data(Measurements().get_measurements(), self.__class__.computed_ways)
+        ComputedValues().compute_data(self.__class__.computed_ways)
 
     def test_8_aggregated_values_table(self):
         AggregatedValues().compute_data(self.__class__.computed_ways, self.__class__.not_computed_ways);
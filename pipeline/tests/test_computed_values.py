@@ -0,0 +1,161 @@
+import math;
+import unittest
+from unittest.mock import patch
+import numpy as np
+from tables.measurements import MEASUREMENT_TYPES, MeasurementColumns, Measurements;
+from tables.segments import Segment;
+from tables.segments_properties import SegmentsProperties;
+from tables.computed_values import ComputedValues;
+from tables.computed_values_types import ComputedValueType, ComputedValuesTypes;
+from row_types.computed_values.InertialForce import InertialForce;
+from row_types.computed_values.TractionForce import TractionForce;
+
+
+def get_trip():
+    segments = [Segment(i, [55.0 + i * 0.001, 12.0], [55.0 + (i + 1) * 0.001, 12.0], 0.1, 1) for i in range(3)];
+
+    rows = [];
+    def add(type, timestamp, value):
+        segment = segments[min(timestamp // 20, 2)];
+        # The car goes backwards in the last segment
+        offset = (timestamp % 20) / 20 if timestamp < 40 else 1 - (timestamp % 20) / 20;
+        rows.append((type + str(timestamp), type, segment.position_a[0] + offset * 0.001, value, timestamp, segment));
+
+    for t in range(60):
+        add('obd.trac_cons', t, float('nan') if t == 5 else 100.0 + 5 * t);
+    for t in range(0, 60, 4):
+        add('obd.spd_veh', t, 0.0 if t == 8 else (float('nan') if t == 12 else 10.0 + t));
+    for t in range(0, 30, 3):
+        add('acc.xyz.x', t, 0.1 * t - 1);
+    for t in range(0, 60, 10):
+        add('obd.rpm', t, 800.0 + t);
+
+    rows.sort(key=lambda row: row[4]);
+    n = len(rows);
+    columns = MeasurementColumns(np.array([row[0] for row in rows], dtype=object), np.array([MEASUREMENT_TYPES.index(row[1]) for row in rows], dtype=np.int8),
+        np.array([row[2] for row in rows]), np.full(n, 12.0), np.array([row[3] for row in rows]), np.array([row[4] for row in rows], dtype=np.int64),
+        np.full(n, 'trip', dtype=object), np.full(n, None, dtype=object), np.full(n, None, dtype=object));
+    columns.set_segments(np.arange(n), [row[5] for row in rows]);
+
+    # Segment 1 has no inclination, and the inclination of segment 0 is unknown
+    properties = {'Inclination': {0: float('nan'), 2: 0.05}};
+    return columns, properties;
+
+
+class TestComputedValues(unittest.TestCase):
+
+    def setUp(self):
+        classes = ComputedValues().get_computed_values_types_classes();
+        ComputedValuesTypes().computed_values_types = [ComputedValueType(i, klass.TYPE, klass.DESCRIPTION, klass.UNITS) for i, klass in enumerate(classes)];
+        ComputedValues().drop();
+        Measurements().drop();
+
+        measurements, properties = get_trip();
+        Measurements().generate_dictionaries(measurements);
+        Measurements().compute_directions();
+        SegmentsProperties().segment_properties_per_type = properties;
+
+    def tearDown(self):
+        ComputedValues().drop();
+        Measurements().drop();
+        SegmentsProperties().segment_properties_per_type = {};
+        ComputedValuesTypes().computed_values_types = [];
+
+    def get_batch_and_row_values(self):
+        measurements = Measurements().get_measurements();
+        classes = ComputedValues().get_computed_values_types_classes();
+        self.assertEqual(len(classes), 7);
+
+        batch = {klass.TYPE: {} for klass in classes};
+        for computed_value in ComputedValues().generate_computed_values():
+            self.assertEqual(computed_value.segment, computed_value.measurement.segment);
+            self.assertEqual(computed_value.direction, computed_value.measurement.direction);
+            batch[computed_value.type.name][computed_value.measurement.id] = computed_value.value;
+
+        ComputedValues().drop();
+        row = {klass.TYPE: {} for klass in classes};
+        for klass in classes:
+            for measurement in measurements:
+                if klass.prerequisites(measurement):
+                    value = klass(-1, measurement, None, None, None, None).value;
+                    if value != None:
+                        row[klass.TYPE][measurement.id] = value;
+        return batch, row;
+
+    def assertSameValues(self, batch, row):
+        for name in row:
+            self.assertEqual(sorted(batch[name]), sorted(row[name]), name);
+            for id, value in row[name].items():
+                if math.isnan(value):
+                    self.assertTrue(math.isnan(batch[name][id]), name + " " + id);
+                else:
+                    self.assertAlmostEqual(batch[name][id], value, msg=name + " " + id);
+
+    def test_batch_matches_row_values(self):
+        batch, row = self.get_batch_and_row_values();
+        self.assertSameValues(batch, row);
+
+        self.assertEqual(len(row['Speed']), 15);
+        self.assertEqual(len(row['Revolutions per minute']), 6);
+        # Traction force is 0 when stopped and NaN when the power or the speed is NaN
+        self.assertEqual(row['Traction Force']['obd.trac_cons8'], 0);
+        self.assertTrue(math.isnan(row['Traction Force']['obd.trac_cons5']));
+        self.assertTrue(math.isnan(row['Traction Force']['obd.trac_cons12']));
+        self.assertAlmostEqual(row['Traction Force']['obd.trac_cons17'], (185 - 160) * 1000 / 26);
+        # Hill climbing force is only computed for the segments with an inclination
+        self.assertEqual(len(row['Hill Climbing Force']), 40);
+        self.assertTrue(math.isnan(row['Hill Climbing Force']['obd.trac_cons5']));
+        self.assertNotIn('obd.trac_cons25', row['Hill Climbing Force']);
+        self.assertAlmostEqual(row['Hill Climbing Force']['obd.trac_cons45'], -(1966 + 80) * math.sin(0.05) * 9.81);
+
+    def test_batch_matches_row_values_with_max_gap(self):
+        with patch.object(InertialForce, 'SENSORS_MAX_GAP', 1):
+            batch, row = self.get_batch_and_row_values();
+        self.assertSameValues(batch, row);
+
+        # Acceleration is measured every 3 seconds until second 27, so no later measurement is within 1 second
+        self.assertEqual(sorted(row['Inertial Force']), sorted('obd.trac_cons' + str(t) for t in range(29)));
+        self.assertAlmostEqual(row['Inertial Force']['obd.trac_cons4'], 0.05 * (1966 + 80) * (0.1 * 3 - 1));
+
+
+class TestSensorsMaxGap(unittest.TestCase):
+
+    def setUp(self):
+        ComputedValues().drop();
+        Measurements().drop();
+
+        measurements, properties = get_trip();
+        Measurements().generate_dictionaries(measurements);
+        Measurements().compute_directions();
+        SegmentsProperties().segment_properties_per_type = properties;
+
+    def tearDown(self):
+        ComputedValues().drop();
+        Measurements().drop();
+        SegmentsProperties().segment_properties_per_type = {};
+
+    def get_joined_ids(self, klass):
+        positions, _ = ComputedValues().get_columns(klass);
+        return set(Measurements().columns.ids[positions].tolist());
+
+    def test_default_max_gap(self):
+        self.assertEqual(TractionForce.SENSORS_MAX_GAP, 2);
+        self.assertEqual(InertialForce.SENSORS_MAX_GAP, 2);
+
+    def test_gap_boundary(self):
+        # Speed is measured every 4 seconds until second 56, so traction power at second 58 is joined exactly at the
+        # maximum gap, and at second 59 it is too far from any speed
+        joined = self.get_joined_ids(TractionForce);
+        self.assertIn('obd.trac_cons58', joined);
+        self.assertNotIn('obd.trac_cons59', joined);
+        self.assertEqual(joined, set('obd.trac_cons' + str(t) for t in range(59)));
+
+        # Acceleration is measured every 3 seconds until second 27
+        joined = self.get_joined_ids(InertialForce);
+        self.assertEqual(joined, set('obd.trac_cons' + str(t) for t in range(30)));
+
+    def test_gap_boundary_one_measurement_at_a_time(self):
+        measurements = {measurement.id: measurement for measurement in Measurements().get_measurements()};
+        self.assertEqual(ComputedValues().get_joined_measurement(measurements['obd.trac_cons58'], 'obd.spd_veh', 2).id, 'obd.spd_veh56');
+        self.assertEqual(ComputedValues().get_joined_measurement(measurements['obd.trac_cons59'], 'obd.spd_veh', 2), None);
+        self.assertEqual(ComputedValues().get_joined_measurement(measurements['obd.trac_cons59'], 'obd.spd_veh', None).id, 'obd.spd_veh56');
@@ -0,0 +1,185 @@
+import os;
+import tempfile;
+import unittest
+import numpy as np
+from collections import OrderedDict
+from types import SimpleNamespace
+from unittest import mock
+from auxiliar_modules import elevation;
+from auxiliar_modules.elevation import ElevationCache, ElevationProvider, DatafordelerElevationProvider, convert_geotiff_tile, load_npy_tile;
+
+
+class FakeElevationProvider(ElevationProvider):
+
+    def __init__(self):
+        self.requested = [];
+
+    def get_elevations(self, points):
+        self.requested.extend(points);
+        return np.array([float(point[0]) + float(point[1]) if point[0] < 56 else np.nan for point in points]);
+
+
+class TestDatafordelerElevationProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.requests = [];
+
+    def request_elevation(self, point):
+        self.requests.append([point]);
+        if point[0] >= 56:
+            raise ValueError('No elevation');
+        return point[0] + point[1];
+
+    def request_elevations(self, points):
+        self.requests.append(points);
+        if any(point[0] >= 56 for point in points):
+            raise ValueError('No elevation');
+        return [point[0] + point[1] for point in points];
+
+    def get_elevations(self, provider, points):
+        with mock.patch.object(elevation, 'request_elevation', self.request_elevation), mock.patch.object(elevation, 'request_elevations', self.request_elevations):
+            return provider.get_elevations(points);
+
+    def test_batches(self):
+        points = [[55.0, float(i)] for i in range(250)];
+        with mock.patch.dict(os.environ, {}, clear=True):
+            provider = DatafordelerElevationProvider();
+        self.assertEqual(provider.batch_size, DatafordelerElevationProvider.BATCH_SIZE);
+
+        res = self.get_elevations(provider, points);
+        np.testing.assert_array_equal(res, [55.0 + i for i in range(250)]);
+        self.assertEqual(sorted(len(request) for request in self.requests), [50, 100, 100]);
+
+    def test_failed_batch_is_requested_point_by_point(self):
+        points = [[55.0, 1.0], [57.0, 2.0], [55.0, 3.0], [55.0, 4.0]];
+        res = self.get_elevations(DatafordelerElevationProvider(batch_size=2), points);
+
+        np.testing.assert_array_equal(res, [56.0, np.nan, 58.0, 59.0]);
+        self.assertEqual(sorted(len(request) for request in self.requests), [1, 1, 2, 2]);
+
+
+class TestElevationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory();
+        self.environment = mock.patch.dict(os.environ, {'ELEVATION_CACHE_PATH': os.path.join(self.directory.name, 'elevation.sqlite')});
+        self.environment.start();
+        self.previous_instance = ElevationCache._instance;
+        self.previous_provider = elevation._elevation_provider;
+        ElevationCache._instance = None;
+        self.provider = FakeElevationProvider();
+        elevation.set_elevation_provider(self.provider);
+
+    def tearDown(self):
+        if ElevationCache._instance.connection != None:
+            ElevationCache._instance.connection.close();
+        ElevationCache._instance = self.previous_instance;
+        elevation._elevation_provider = self.previous_provider;
+        self.environment.stop();
+        self.directory.cleanup();
+
+    def test_cached_elevations_are_looked_up_in_chunks(self):
+        cache = ElevationCache();
+        points = [[55.0 + i * 0.001, 12.0] for i in range(10)];
+        cache.set_elevations(points[:7], [float(i) for i in range(7)]);
+        cache.memory = OrderedDict();
+
+        queries = [];
+        cache.connect().set_trace_callback(lambda statement: queries.append(statement) if statement.startswith('SELECT') else None);
+        with mock.patch.object(ElevationCache, 'LOOKUP_BATCH_SIZE', 3):
+            res = cache.get_cached_elevations(points + [points[2]]);
+
+        self.assertEqual(res, [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, None, None, None, 2.0]);
+        self.assertEqual(len(queries), 4);
+        # The elevations found are kept in memory
+        self.assertEqual(len(cache.memory), 7);
+        queries.clear();
+        self.assertEqual(cache.get_cached_elevations(points[:7]), [float(i) for i in range(7)]);
+        self.assertEqual(queries, []);
+
+    def test_only_missing_elevations_are_requested(self):
+        cache = ElevationCache();
+        cache.set_elevations([[55.0, 12.0]], [5.0]);
+        cache.memory = OrderedDict();
+
+        res = cache.get_elevations([[55.0, 12.0], [55.5, 12.5], [57.0, 12.0], [55.5, 12.5]]);
+        self.assertEqual(res, [5.0, 68.0, None, 68.0]);
+        self.assertEqual(self.provider.requested, [(55.5, 12.5), (57.0, 12.0)]);
+        self.assertEqual(cache.get_cached_elevation([55.5, 12.5]), 68.0);
+        self.assertEqual(cache.get_cached_elevation([57.0, 12.0]), None);
+
+
+class FakeDataset:
+    # Dataset of rasterio with a single block, in the coordinate reference system of the given EPSG code
+
+    def __init__(self, elevations, transform, epsg, nodata = None):
+        self.elevations = elevations;
+        self.transform = SimpleNamespace(c=transform[0], a=transform[1], f=transform[2], e=transform[3]);
+        self.crs = SimpleNamespace(to_epsg=lambda: epsg) if epsg != None else None;
+        self.nodata = nodata;
+        self.dtypes = [str(elevations.dtype)];
+        self.height, self.width = elevations.shape;
+
+    def block_windows(self, band):
+        return [((0, 0), SimpleNamespace(row_off=0, col_off=0, height=self.height, width=self.width))];
+
+    def read(self, band, window = None):
+        return self.elevations;
+
+    def __enter__(self):
+        return self;
+
+    def __exit__(self, *args):
+        return False;
+
+
+class TestConvertGeotiffTile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory();
+        self.npy_path = os.path.join(self.directory.name, 'tile.npy');
+        self.warped = [];
+
+    def tearDown(self):
+        self.directory.cleanup();
+
+    def get_rasterio(self, dataset):
+        def warp(source, **kwargs):
+            self.warped.append((source, kwargs));
+            return FakeDataset(np.array([[7.0, 8.0]], dtype=np.float32), (12.0, 0.5, 56.0, -0.5), 4326, kwargs.get('nodata', source.nodata));
+
+        return SimpleNamespace(open=lambda path: dataset, vrt=SimpleNamespace(WarpedVRT=warp), enums=SimpleNamespace(Resampling=SimpleNamespace(bilinear='bilinear')));
+
+    def test_wgs84_tile(self):
+        dataset = FakeDataset(np.array([[1, 2], [3, 4]], dtype=np.int16), (12.0, 0.5, 56.0, -0.5), 4326, -9999);
+        with mock.patch.object(elevation, 'rasterio', self.get_rasterio(dataset)):
+            convert_geotiff_tile('tile.tif', self.npy_path);
+
+        tile = load_npy_tile(self.npy_path);
+        self.assertEqual(self.warped, []);
+        np.testing.assert_array_equal(tile.elevations, [[1, 2], [3, 4]]);
+        self.assertEqual(tile.transform, (12.0, 0.5, 56.0, -0.5));
+        self.assertEqual(tile.nodata, -9999);
+
+    def test_projected_tile_is_reprojected(self):
+        # Tile of the Danish elevation model, in UTM zone 32N
+        dataset = FakeDataset(np.array([[1.0, 2.0], [3.0, 4.0]], dtype=np.float32), (720000.0, 0.4, 6180000.0, -0.4), 25832);
+        with mock.patch.object(elevation, 'rasterio', self.get_rasterio(dataset)):
+            convert_geotiff_tile('tile.tif', self.npy_path);
+
+        self.assertEqual(len(self.warped), 1);
+        source, options = self.warped[0];
+        self.assertIs(source, dataset);
+        self.assertEqual(options['crs'], 'EPSG:4326');
+        self.assertTrue(np.isnan(options['nodata']));
+
+        tile = load_npy_tile(self.npy_path);
+        np.testing.assert_array_equal(tile.elevations, [[7.0, 8.0]]);
+        self.assertEqual(tile.transform, (12.0, 0.5, 56.0, -0.5));
+
+    def test_tile_without_crs(self):
+        dataset = FakeDataset(np.array([[1.0]]), (720000.0, 0.4, 6180000.0, -0.4), None);
+        with mock.patch.object(elevation, 'rasterio', self.get_rasterio(dataset)):
+            with self.assertRaises(ValueError):
+                convert_geotiff_tile('tile.tif', self.npy_path);
+        self.assertFalse(os.path.exists(self.npy_path));
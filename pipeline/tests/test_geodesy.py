@@ -0,0 +1,78 @@
+import math;
+import unittest
+import numpy as np
+from auxiliar_modules.geodesy import EARTH_RADIUS, haversine_distance, haversine_distances;
+
+try:
+    from geopy.distance import geodesic;
+except ImportError:
+    geodesic = None;
+
+
+def get_relative_errors(lat_a, lon_a, lat_b, lon_b):
+    # Relative errors of the haversine distances with respect to the geodesic distances on the WGS-84 ellipsoid
+    res = haversine_distances(lat_a, lon_a, lat_b, lon_b);
+    expected = np.array([geodesic((lat_a[i], lon_a[i]), (lat_b[i], lon_b[i])).meters for i in range(len(lat_a))]);
+    return np.abs(res - expected) / expected;
+
+
+class TestHaversineDistances(unittest.TestCase):
+
+    def test_known_distances(self):
+        # One degree along a meridian, and along the equator
+        self.assertAlmostEqual(haversine_distance([0, 0], [1, 0]), EARTH_RADIUS * math.pi / 180, places=6);
+        self.assertAlmostEqual(haversine_distance([0, 0], [0, 1]), EARTH_RADIUS * math.pi / 180, places=6);
+        # Half of the equator
+        self.assertAlmostEqual(haversine_distance([0, 0], [0, 180]), EARTH_RADIUS * math.pi, places=3);
+        self.assertEqual(haversine_distance([55.7, 12.5], [55.7, 12.5]), 0);
+
+    def test_arrays_match_single_distances(self):
+        rng = np.random.default_rng(1);
+        lat_a, lat_b = rng.uniform(54, 58, 50), rng.uniform(54, 58, 50);
+        lon_a, lon_b = rng.uniform(8, 13, 50), rng.uniform(8, 13, 50);
+
+        res = haversine_distances(lat_a, lon_a, lat_b, lon_b);
+        self.assertEqual(res.shape, (50,));
+        for i in range(50):
+            self.assertAlmostEqual(res[i], haversine_distance([lat_a[i], lon_a[i]], [lat_b[i], lon_b[i]]), places=6);
+
+    def test_symmetric(self):
+        a = haversine_distance([55.67, 12.56], [55.40, 10.38]);
+        b = haversine_distance([55.40, 10.38], [55.67, 12.56]);
+        self.assertAlmostEqual(a, b, places=6);
+        # Copenhagen to Odense is about 140 km
+        self.assertTrue(135000 < a < 145000);
+
+
+@unittest.skipIf(geodesic == None, 'The geopy package is needed to compare with geodesic distances')
+class TestHaversineAgainstGeodesic(unittest.TestCase):
+
+    def test_worldwide(self):
+        rng = np.random.default_rng(2);
+        lat_a, lat_b = rng.uniform(-89, 89, 300), rng.uniform(-89, 89, 300);
+        lon_a, lon_b = rng.uniform(-180, 180, 300), rng.uniform(-180, 180, 300);
+        self.assertLess(np.max(get_relative_errors(lat_a, lon_a, lat_b, lon_b)), 0.006);
+
+        # Short distances along meridians and parallels, where the ellipsoid differs the most from the sphere
+        lat = np.array([0.0, 0.0, 45.0, 45.0, 80.0, 80.0, -60.0, -60.0]);
+        lon = np.array([10.0, 10.0, -70.0, -70.0, 120.0, 120.0, 30.0, 30.0]);
+        step_lat = np.array([0.001, 0.0, 0.001, 0.0, 0.001, 0.0, 0.001, 0.0]);
+        self.assertLess(np.max(get_relative_errors(lat, lon, lat + step_lat, lon + 0.001 - step_lat)), 0.006);
+
+    def test_denmark(self):
+        # Copenhagen, Aarhus, Odense, Aalborg, Esbjerg and Rønne
+        cities = np.array([[55.676, 12.568], [56.163, 10.204], [55.404, 10.402], [57.048, 9.919], [55.476, 8.459], [55.100, 14.706]]);
+        first, second = np.triu_indices(len(cities), 1);
+        self.assertLess(np.max(get_relative_errors(cities[first, 0], cities[first, 1], cities[second, 0], cities[second, 1])), 0.0035);
+
+        # Long and short distances between random points of Denmark south of 57.5 degrees
+        rng = np.random.default_rng(3);
+        lat_a, lon_a = rng.uniform(54.5, 57.5, 200), rng.uniform(8, 15.2, 200);
+        lat_b, lon_b = rng.uniform(54.5, 57.5, 200), rng.uniform(8, 15.2, 200);
+        self.assertLess(np.max(get_relative_errors(lat_a, lon_a, lat_b, lon_b)), 0.0035);
+        lat_b = np.clip(lat_a + rng.uniform(-0.01, 0.01, 200), 54.5, 57.5);
+        lon_b = lon_a + rng.uniform(-0.01, 0.01, 200);
+        self.assertLess(np.max(get_relative_errors(lat_a, lon_a, lat_b, lon_b)), 0.0035);
+
+        # Short distances along the parallel of Skagen, the northernmost point
+        self.assertLess(np.max(get_relative_errors(np.array([57.75]), np.array([10.6]), np.array([57.75]), np.array([10.601]))), 0.0036);
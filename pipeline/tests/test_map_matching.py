@@ -0,0 +1,96 @@
+import unittest
+import numpy as np
+from tables.measurements import MEASUREMENT_TYPES, MeasurementColumns;
+from auxiliar_modules.map_matching import split_in_chunks, get_edge_shapes, decode_polyline;
+
+
+def get_trace(timestamps, step = 0.0001):
+    n = len(timestamps);
+    return MeasurementColumns(np.array([str(i) for i in range(n)], dtype=object), np.full(n, MEASUREMENT_TYPES.index('obd.spd_veh'), dtype=np.int8),
+        55.0 + np.arange(n) * step, np.full(n, 12.0), np.zeros(n), np.array(list(timestamps), dtype=np.int64),
+        np.full(n, 'trip', dtype=object), np.full(n, None, dtype=object), np.full(n, None, dtype=object));
+
+
+class TestSplitInChunks(unittest.TestCase):
+
+    def test_one_chunk(self):
+        self.assertEqual(split_in_chunks(get_trace(range(10)), max_size=20, overlap=2), [(0, 10, 0, 10)]);
+        self.assertEqual(split_in_chunks([]), []);
+
+    def test_cores_cover_the_trace_without_overlapping(self):
+        trace = get_trace(range(103));
+        chunks = split_in_chunks(trace, max_size=20, overlap=3);
+
+        cores = [position for _, _, core_start, core_end in chunks for position in range(core_start, core_end)];
+        self.assertEqual(cores, list(range(103)));
+        for start, end, core_start, core_end in chunks:
+            self.assertTrue(end - start <= 20);
+            self.assertEqual(start, max(0, core_start - 3));
+            self.assertEqual(end, min(103, core_end + 3));
+
+    def test_split_at_time_gaps(self):
+        trace = get_trace(list(range(10)) + list(range(100, 110)));
+        self.assertEqual(split_in_chunks(trace, max_size=50, max_time_gap=60, overlap=2), [(0, 10, 0, 10), (10, 20, 10, 20)]);
+
+    def test_split_at_distance_gaps(self):
+        trace = get_trace(range(10));
+        for i in range(5, 10):
+            trace[i].position = [trace[i].position[0] + 0.01, 12.0];
+        self.assertEqual(split_in_chunks(trace, max_size=50, max_distance_gap=500, overlap=2), [(0, 5, 0, 5), (5, 10, 5, 10)]);
+
+    def test_single_measurements_are_merged_into_a_neighbour_part(self):
+        # Gaps leave the measurement at 100 alone in the middle and the one at 300 alone at the end
+        trace = get_trace(list(range(5)) + [100] + list(range(200, 205)) + [300]);
+        self.assertEqual(split_in_chunks(trace, max_size=50, max_time_gap=60, overlap=2), [(0, 5, 0, 5), (5, 12, 5, 12)]);
+
+        # The measurement at 0 is alone at the start
+        trace = get_trace([0] + list(range(100, 105)));
+        self.assertEqual(split_in_chunks(trace, max_size=50, max_time_gap=60, overlap=2), [(0, 6, 0, 6)]);
+
+    def test_every_measurement_is_map_matched(self):
+        trace = get_trace([0] + list(range(100, 105)) + [200]);
+        matched = [];
+        for chunk in split_in_chunks(trace, max_size=50, max_time_gap=60, overlap=2):
+            self.assertTrue(chunk[1] - chunk[0] >= 2);
+            matched.extend(range(chunk[2], chunk[3]));
+        self.assertEqual(matched, list(range(7)));
+
+
+class TestDecodePolyline(unittest.TestCase):
+
+    def test_precision_5(self):
+        res = decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@", 5);
+        expected = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]];
+        self.assertEqual(len(res), len(expected));
+        for position, expected_position in zip(res, expected):
+            self.assertAlmostEqual(position[0], expected_position[0], places=5);
+            self.assertAlmostEqual(position[1], expected_position[1], places=5);
+
+    def test_precision_6(self):
+        res = decode_polyline("_izlhA~rlgdF_{geC~ywl@_kwzCn`{nI", 6);
+        expected = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]];
+        for position, expected_position in zip(res, expected):
+            self.assertAlmostEqual(position[0], expected_position[0], places=6);
+            self.assertAlmostEqual(position[1], expected_position[1], places=6);
+
+    def test_empty(self):
+        self.assertEqual(decode_polyline(""), []);
+
+
+class TestGetEdgeShapes(unittest.TestCase):
+
+    def test_edge_shapes(self):
+        # Positions [38.5, -120.2], [40.7, -120.95], [43.252, -126.453] with 5 decimals, read with 6 decimals
+        result = {'shape': '_p~iF~ps|U_ulLnnqC_mqNvxq`@', 'edges': [
+            {'way_id': 1, 'begin_shape_index': 0, 'end_shape_index': 2},
+            {'way_id': 2, 'begin': [55.0, 12.0], 'end': [55.1, 12.1]},
+            {'way_id': 3, 'begin': [55.0, 12.0], 'end': [55.1, 12.1], 'positions': [[55.0, 12.0], [55.05, 12.0], [55.1, 12.1]]},
+            {'way_id': 4}
+        ]};
+
+        res = get_edge_shapes(result);
+        self.assertEqual(len(res), 4);
+        np.testing.assert_allclose(res[0], [[3.85, -12.02], [4.07, -12.095], [4.3252, -12.6453]]);
+        self.assertEqual(res[1], [[55.0, 12.0], [55.1, 12.1]]);
+        self.assertEqual(res[2], [[55.0, 12.0], [55.05, 12.0], [55.1, 12.1]]);
+        self.assertEqual(res[3], None);
@@ -0,0 +1,142 @@
+import json;
+import unittest
+import numpy as np
+from tables.measurements import MEASUREMENT_TYPES, MeasurementColumns, Measurements, SortedGroups, format_measurements, format_for_map_matching;
+from tables.segments import Segment;
+
+
+class TestSortedGroups(unittest.TestCase):
+
+    def test_groups_are_sorted_by_secondary_keys(self):
+        keys = np.array([3, 1, 3, 2, 1, 3]);
+        timestamps = np.array([50, 20, 10, 40, 10, 30]);
+        groups = SortedGroups(keys, timestamps);
+
+        self.assertEqual(groups.keys.tolist(), [1, 2, 3]);
+        self.assertEqual(groups.get_group(1).tolist(), [4, 1]);
+        self.assertEqual(groups.get_group(2).tolist(), [3]);
+        self.assertEqual(groups.get_group(3).tolist(), [2, 5, 0]);
+        self.assertEqual(groups.get_sizes().tolist(), [2, 1, 3]);
+        self.assertEqual(groups.get_firsts().tolist(), [4, 3, 2]);
+        self.assertEqual(groups.get_lasts().tolist(), [1, 3, 0]);
+
+    def test_sort_is_stable(self):
+        groups = SortedGroups(np.array([7, 5, 7, 5, 7]));
+        self.assertEqual(groups.get_group(5).tolist(), [1, 3]);
+        self.assertEqual(groups.get_group(7).tolist(), [0, 2, 4]);
+
+    def test_missing_group_is_empty(self):
+        groups = SortedGroups(np.array([2, 4]));
+        self.assertEqual(len(groups), 2);
+        for key in [0, 3, 5]:
+            self.assertEqual(len(groups.get_group(key)), 0);
+
+    def test_no_keys(self):
+        groups = SortedGroups(np.empty(0, dtype=np.int64));
+        self.assertEqual(len(groups), 0);
+        self.assertEqual(len(groups.get_group(1)), 0);
+        self.assertEqual(len(groups.get_sizes()), 0);
+
+
+def get_columns(n):
+    return MeasurementColumns(np.array(['m' + str(i) for i in range(n)], dtype=object), np.arange(n, dtype=np.int8) % len(MEASUREMENT_TYPES),
+        55.0 + np.arange(n) * 0.001, np.full(n, 12.0), np.arange(n, dtype=np.float64), np.arange(n, dtype=np.int64) * 10,
+        np.full(n, 'trip', dtype=object), np.full(n, None, dtype=object), np.full(n, None, dtype=object));
+
+
+class TestMeasurementColumns(unittest.TestCase):
+
+    def test_views_read_and_write_the_columns(self):
+        columns = get_columns(4);
+        measurement = columns[2];
+        self.assertEqual(measurement.id, 'm2');
+        self.assertEqual(measurement.type, MEASUREMENT_TYPES[2]);
+        self.assertEqual(measurement.value, 2.0);
+        self.assertEqual(measurement.timestamp, 20);
+        self.assertEqual(measurement.position, [55.002, 12.0]);
+        self.assertEqual(measurement.way, None);
+        self.assertEqual(measurement.direction, None);
+        self.assertEqual(measurement.distance_along_segment, None);
+
+        segment = Segment(7, [55.0, 12.0], [55.1, 12.0], 1, 3);
+        measurement.position = [55.5, 12.5];
+        measurement.way = 3;
+        measurement.segment = segment;
+        measurement.distance_along_segment = 1.5;
+        self.assertEqual((columns.lat[2], columns.lon[2], columns.ways[2]), (55.5, 12.5, 3));
+        self.assertEqual(columns.segment_ids.tolist(), [-1, -1, 7, -1]);
+        self.assertIs(columns[2].segment, segment);
+        self.assertEqual(columns[2].distance_along_segment, 1.5);
+        self.assertEqual(columns[2], measurement);
+        self.assertNotEqual(columns[1], measurement);
+
+    def test_slices_share_the_columns(self):
+        columns = get_columns(10);
+        part = columns[3:6];
+        self.assertEqual(len(part), 3);
+        self.assertEqual([measurement.id for measurement in part], ['m3', 'm4', 'm5']);
+        part[1].way = 42;
+        self.assertEqual(columns[4].way, 42);
+        with self.assertRaises(IndexError):
+            part[3];
+
+    def test_from_measurements(self):
+        columns = get_columns(6);
+        self.assertIs(MeasurementColumns.from_measurements(columns), columns);
+        self.assertIs(MeasurementColumns.from_measurements(columns.to_measurements()), columns);
+
+        other = get_columns(3);
+        mixed = [columns[4], other[0], columns[1], other[2]];
+        res = MeasurementColumns.from_measurements(mixed);
+        self.assertEqual(res.ids.tolist(), ['m4', 'm0', 'm1', 'm2']);
+        self.assertEqual(res.timestamps.tolist(), [40, 0, 10, 20]);
+        self.assertEqual(len(MeasurementColumns.from_measurements([])), 0);
+
+
+class TestMeasurements(unittest.TestCase):
+
+    def tearDown(self):
+        Measurements().drop();
+
+    def test_table_stores_only_columns(self):
+        columns = get_columns(8);
+        segments = [Segment(i, [55.0, 12.0], [55.01, 12.0], 1, 1) for i in range(2)];
+        columns.set_segments(np.arange(8), [segments[i // 4] for i in range(8)]);
+
+        table = Measurements();
+        table.generate_dictionaries(columns.to_measurements());
+        table.compute_directions();
+        self.assertIs(table.columns, columns);
+        self.assertFalse(hasattr(table, 'measurements'));
+
+        self.assertEqual(table.get_measurement_by_id('m5'), columns[5]);
+        with self.assertRaises(KeyError):
+            table.get_measurement_by_id('x');
+        self.assertEqual([measurement.id for measurement in table.get_measurements_in_segment(1)], ['m4', 'm5', 'm6', 'm7']);
+        # The car goes towards the second position of both segments
+        self.assertEqual(columns.directions.tolist(), [0] * 8);
+        self.assertEqual(table.get_closest_positions_of_type(np.array([14, 47]), MEASUREMENT_TYPES[1], 5).tolist(), [1, 5]);
+
+
+class TestFormatMeasurements(unittest.TestCase):
+
+    def test_messages_are_decoded_into_columns(self):
+        def get_row(id, type, message, second):
+            return [id, None, type, 55.0 + second * 0.001, 12.0, json.dumps(message), None, 'trip', None, '2022-01-01T00:00:{:02d}Z'.format(second), 'updated'];
+
+        rows = [
+            get_row('a', 'obd.spd_veh', {'obd.spd_veh.value': 50}, 0),
+            get_row('b', 'acc.xyz', {'acc.xyz.x': 0.5, 'acc.xyz.y': 1}, 1),
+            get_row('c', 'obd.spd_veh', {'other': 1}, 2),
+            get_row('d', 'unknown', {}, 3),
+            get_row('e', 'obd.trac_cons', {'obd.trac_cons.value': 120.5}, 4)
+        ];
+        columns = format_measurements(rows);
+
+        self.assertIsInstance(columns, MeasurementColumns);
+        self.assertEqual([measurement.id for measurement in columns], ['a', 'b', 'e']);
+        self.assertEqual([measurement.type for measurement in columns], ['obd.spd_veh', 'acc.xyz.x', 'obd.trac_cons']);
+        self.assertEqual(columns.values.tolist(), [50, 0.5, 120.5]);
+        self.assertEqual((columns.timestamps - columns.timestamps[0]).tolist(), [0, 1, 4]);
+        self.assertEqual(format_for_map_matching(columns)[2], [55.004, 12.0, int(columns.timestamps[2])]);
+        self.assertEqual(len(format_measurements([])), 0);
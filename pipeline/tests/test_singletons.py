@@ -0,0 +1,32 @@
+import threading;
+import unittest
+from auxiliar_modules.http_client import HTTPClient;
+from auxiliar_modules.osm_store import OSMStore;
+from auxiliar_modules.elevation import ElevationCache;
+
+
+class TestSingletons(unittest.TestCase):
+
+    def test_one_instance_across_threads(self):
+        for klass in [HTTPClient, OSMStore, ElevationCache]:
+            previous = klass._instance;
+            klass._instance = None;
+            try:
+                instances = [];
+                barrier = threading.Barrier(16);
+
+                def create():
+                    barrier.wait();
+                    instances.append(klass());
+
+                threads = [threading.Thread(target=create) for _ in range(16)];
+                for thread in threads:
+                    thread.start();
+                for thread in threads:
+                    thread.join();
+
+                self.assertEqual(len(instances), 16);
+                self.assertTrue(all(instance is instances[0] for instance in instances));
+                self.assertTrue(hasattr(instances[0], 'lock'));
+            finally:
+                klass._instance = previous;
@@ -0,0 +1,80 @@
+import unittest
+import unittest.mock
+import numpy as np
+from collections import namedtuple
+from auxiliar_modules.spatial_index import SegmentsIndex;
+
+Segment = namedtuple('Segment', ['id', 'position_a', 'position_b', 'way']);
+
+
+def get_network(rng, ways = 20, nodes_per_way = 30):
+    # Random walks of nodes around Copenhagen, each one a way of consecutive segments
+    segments = [];
+    for way in range(ways):
+        lat = 55.68 + rng.uniform(-0.01, 0.01) + np.cumsum(rng.normal(0, 0.0003, nodes_per_way));
+        lon = 12.57 + rng.uniform(-0.01, 0.01) + np.cumsum(rng.normal(0, 0.0005, nodes_per_way));
+        # Some nodes are repeated, so there are segments of zero length
+        lat[5] = lat[4];
+        lon[5] = lon[4];
+        for k in range(nodes_per_way - 1):
+            segments.append(Segment(1000 * way + k, [lat[k], lon[k]], [lat[k + 1], lon[k + 1]], way));
+    return segments;
+
+
+class TestSegmentsIndex(unittest.TestCase):
+
+    def assert_same_as_brute_force(self, index, segments, lat, lon, way, max_distance):
+        segment_ids, distances, distances_along = index.get_nearest_segments_in_way(lat, lon, way, max_distance);
+
+        x, y = index.project(lat, lon);
+        expected, expected_distances, expected_distances_along = index.get_nearest_segments(x, y, index.segments_per_way[way]);
+        found = expected_distances <= max_distance;
+        np.testing.assert_array_equal(segment_ids, np.where(found, index.ids[expected], -1));
+        np.testing.assert_array_equal(distances, np.where(found, expected_distances, np.nan));
+        np.testing.assert_array_equal(distances_along, np.where(found, expected_distances_along, np.nan));
+        return found;
+
+    def test_grid_matches_brute_force(self):
+        rng = np.random.default_rng(4);
+        segments = get_network(rng);
+        index = SegmentsIndex(segments);
+
+        for way in range(20):
+            way_segments = [segment for segment in segments if segment.way == way];
+            # Points near the segments of the way, on its nodes and far from it
+            t = rng.uniform(0, 1, 300);
+            picked = rng.integers(0, len(way_segments), 300);
+            lat = np.array([way_segments[k].position_a[0] + t[i] * (way_segments[k].position_b[0] - way_segments[k].position_a[0]) for i, k in enumerate(picked)]) + rng.normal(0, 0.0001, 300);
+            lon = np.array([way_segments[k].position_a[1] + t[i] * (way_segments[k].position_b[1] - way_segments[k].position_a[1]) for i, k in enumerate(picked)]) + rng.normal(0, 0.0001, 300);
+            lat = np.concatenate((lat, [segment.position_a[0] for segment in way_segments], rng.uniform(55.6, 55.8, 20)));
+            lon = np.concatenate((lon, [segment.position_a[1] for segment in way_segments], rng.uniform(12.4, 12.7, 20)));
+
+            for max_distance in [5, 10, 30, 120]:
+                found = self.assert_same_as_brute_force(index, segments, lat, lon, way, max_distance);
+                if max_distance >= 10:
+                    self.assertTrue(np.any(found));
+
+    def test_grid_is_used(self):
+        rng = np.random.default_rng(5);
+        segments = get_network(rng, ways=2, nodes_per_way=200);
+        index = SegmentsIndex(segments);
+        lat = np.array([segment.position_a[0] for segment in segments[:199]]) + 0.00002;
+        lon = np.array([segment.position_a[1] for segment in segments[:199]]);
+
+        with unittest.mock.patch.object(SegmentsIndex, 'get_nearest_segments', side_effect=AssertionError('Brute force used')):
+            segment_ids, _, _ = index.get_nearest_segments_in_way(lat, lon, 0, 10);
+        self.assertTrue(np.all(segment_ids >= 0));
+        self.assert_same_as_brute_force(index, segments, lat, lon, 0, 10);
+
+    def test_infinite_distance_and_unknown_way(self):
+        segments = [Segment(7, [55.0, 12.0], [55.0, 12.001], 1), Segment(8, [55.0, 12.001], [55.001, 12.001], 1)];
+        index = SegmentsIndex(segments);
+
+        segment_ids, distances, distances_along = index.get_nearest_segments_in_way(np.array([54.0, 55.0005]), np.array([12.0005, 12.0011]), 1, np.inf);
+        self.assertEqual(segment_ids.tolist(), [7, 8]);
+        self.assertGreater(distances[0], 100000);
+        self.assertAlmostEqual(distances_along[1], 55.6, delta=0.1);
+
+        segment_ids, distances, _ = index.get_nearest_segments_in_way(np.array([55.0]), np.array([12.0]), 2, 10);
+        self.assertEqual(segment_ids.tolist(), [-1]);
+        self.assertTrue(np.isnan(distances[0]));
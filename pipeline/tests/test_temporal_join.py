@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+from auxiliar_modules.temporal_join import get_nearest_in_time;
+
+
+class TestGetNearestInTime(unittest.TestCase):
+
+    def test_nearest_neighbour(self):
+        sorted_timestamps = np.array([10, 20, 40]);
+        res = get_nearest_in_time(sorted_timestamps, np.array([0, 12, 18, 29, 35, 100]));
+        self.assertEqual(res.tolist(), [0, 0, 1, 1, 2, 2]);
+
+    def test_ties_take_the_earlier_neighbour(self):
+        res = get_nearest_in_time(np.array([10, 20]), np.array([15, 20]));
+        self.assertEqual(res.tolist(), [0, 1]);
+
+    def test_max_gap(self):
+        sorted_timestamps = np.array([10, 20]);
+        res = get_nearest_in_time(sorted_timestamps, np.array([8, 13, 15, 30]), 2);
+        self.assertEqual(res.tolist(), [0, -1, -1, -1]);
+        res = get_nearest_in_time(sorted_timestamps, np.array([8, 22]), 2);
+        self.assertEqual(res.tolist(), [0, 1]);
+
+    def test_nothing_to_join(self):
+        res = get_nearest_in_time(np.empty(0, dtype=np.int64), np.array([1, 2]));
+        self.assertEqual(res.tolist(), [-1, -1]);
+
+    def test_matches_pandas_merge_asof(self):
+        import pandas as pd;
+        rng = np.random.default_rng(0);
+        sorted_timestamps = np.sort(rng.integers(0, 1000, 200));
+        sorted_timestamps = np.unique(sorted_timestamps);
+        timestamps = rng.integers(-50, 1050, 500);
+
+        res = get_nearest_in_time(sorted_timestamps, timestamps, 5);
+
+        left = pd.DataFrame({'t': timestamps, 'i': np.arange(len(timestamps))}).sort_values('t');
+        right = pd.DataFrame({'t': sorted_timestamps, 'k': np.arange(len(sorted_timestamps))});
+        merged = pd.merge_asof(left, right, on='t', direction='nearest', tolerance=5).sort_values('i');
+        expected = merged['k'].fillna(-1).astype(np.int64).to_numpy();
+        self.assertEqual(sorted_timestamps[res[res != -1]].tolist(), sorted_timestamps[expected[expected != -1]].tolist());
+        self.assertEqual((res == -1).tolist(), (expected == -1).tolist());
@@ -0,0 +1,90 @@
+import math;
+import unittest
+import numpy as np
+from auxiliar_modules.geodesy import EARTH_RADIUS;
+from auxiliar_modules.trace_simplification import simplify_trace, reproject_dropped_points;
+
+
+def get_arc(n, radius = 200.0, lat = 55.0, lon = 12.0):
+    # Quarter of a circle of the given radius in meters around [lat, lon]
+    angles = np.linspace(0, math.pi / 2, n);
+    lats = lat + np.degrees(radius * np.sin(angles) / EARTH_RADIUS);
+    lons = lon + np.degrees(radius * np.cos(angles) / (EARTH_RADIUS * math.cos(math.radians(lat))));
+    return [[float(lats[i]), float(lons[i])] for i in range(n)];
+
+
+def get_distance_to_center(position, lat = 55.0, lon = 12.0):
+    return EARTH_RADIUS * math.hypot(math.radians(position[0] - lat), math.radians(position[1] - lon) * math.cos(math.radians(lat)));
+
+
+class TestSimplifyTrace(unittest.TestCase):
+
+    def test_straight_line_keeps_the_ends(self):
+        points = [[55.0 + i * 0.0001, 12.0, i] for i in range(20)];
+        self.assertEqual(simplify_trace(points, 1), [0, 19]);
+
+    def test_keeps_corners(self):
+        points = [[55.0 + i * 0.0001, 12.0, i] for i in range(10)] + [[55.0009, 12.0 + i * 0.0001, 10 + i] for i in range(1, 10)];
+        self.assertEqual(simplify_trace(points, 1), [0, 9, 18]);
+
+    def test_tolerance(self):
+        # The middle point is about 11 meters away from the line between the ends
+        points = [[55.0, 12.0, 0], [55.0001, 12.001, 1], [55.0, 12.002, 2]];
+        self.assertEqual(simplify_trace(points, 20), [0, 2]);
+        self.assertEqual(simplify_trace(points, 5), [0, 1, 2]);
+
+    def test_short_traces(self):
+        self.assertEqual(simplify_trace([], 1), []);
+        self.assertEqual(simplify_trace([[55.0, 12.0, 0]], 1), [0]);
+        self.assertEqual(simplify_trace([[55.0, 12.0, 0], [55.0, 12.0, 1]], 1), [0, 1]);
+
+
+class TestReprojectDroppedPoints(unittest.TestCase):
+
+    def test_curved_route_stays_on_the_road(self):
+        # The road is a quarter of a circle, and the trace drives along it with 2 meters of noise outwards
+        shape = get_arc(91);
+        trace = [[lat, lon, i] for i, (lat, lon) in enumerate(get_arc(11, radius=202.0))];
+        kept = [0, 10];
+        matched = [
+            {'type': 'matched', 'lat': shape[0][0], 'lon': shape[0][1], 'edge_index': 0, 'distance_along_edge': 0.0},
+            {'type': 'matched', 'lat': shape[-1][0], 'lon': shape[-1][1], 'edge_index': 0, 'distance_along_edge': 1.0}
+        ];
+
+        res = reproject_dropped_points(trace, kept, matched, [shape]);
+        self.assertEqual(len(res), 11);
+        for i in range(1, 10):
+            self.assertEqual(res[i]['type'], 'interpolated');
+            self.assertEqual(res[i]['edge_index'], 0);
+            # On the road, not on the chord between the ends, which is up to 59 meters inside the circle
+            self.assertAlmostEqual(get_distance_to_center([res[i]['lat'], res[i]['lon']]), 200.0, delta=0.1);
+            self.assertAlmostEqual(res[i]['distance_along_edge'], i / 10, delta=0.01);
+
+        # Without the shape of the edge, the points are placed on the chord
+        res = reproject_dropped_points(trace, kept, matched);
+        self.assertAlmostEqual(get_distance_to_center([res[5]['lat'], res[5]['lon']]), 200.0 * math.cos(math.pi / 4), delta=0.1);
+
+    def test_nearest_edge_between_the_neighbours(self):
+        # Two edges meet at a corner, and the dropped points are projected onto the one they are driven on
+        shapes = [[[55.0, 12.0], [55.001, 12.0]], [[55.001, 12.0], [55.001, 12.002]], [[55.0, 12.0], [55.0, 12.002]]];
+        trace = [[55.0, 12.0, 0], [55.0005, 12.00001, 1], [55.001, 12.0, 2], [55.00101, 12.001, 3], [55.001, 12.002, 4]];
+        matched = [
+            {'type': 'matched', 'lat': 55.0, 'lon': 12.0, 'edge_index': 0, 'distance_along_edge': 0.0},
+            {'type': 'matched', 'lat': 55.001, 'lon': 12.002, 'edge_index': 1, 'distance_along_edge': 1.0}
+        ];
+
+        res = reproject_dropped_points(trace, [0, 4], matched, shapes);
+        self.assertEqual([res[i]['edge_index'] for i in range(1, 4)], [0, 0, 1]);
+        self.assertAlmostEqual(res[1]['distance_along_edge'], 0.5, delta=0.01);
+        self.assertAlmostEqual(res[1]['lon'], 12.0, places=9);
+        self.assertAlmostEqual(res[3]['distance_along_edge'], 0.5, delta=0.01);
+        self.assertAlmostEqual(res[3]['lat'], 55.001, places=9);
+
+    def test_unmatched_neighbour(self):
+        trace = [[55.0, 12.0, 0], [55.0001, 12.0, 1], [55.0002, 12.0, 2]];
+        matched = [{'type': 'matched', 'lat': 55.0, 'lon': 12.0, 'edge_index': 0, 'distance_along_edge': 0.0}, {'type': 'unmatched'}];
+
+        res = reproject_dropped_points(trace, [0, 2], matched, [[[55.0, 12.0], [55.001, 12.0]]]);
+        self.assertEqual(res[0], matched[0]);
+        self.assertEqual(res[1], {'type': 'unmatched'});
+        self.assertEqual(res[2], matched[1]);